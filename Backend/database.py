@@ -1,13 +1,122 @@
-from sqlalchemy import create_engine
+import os
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./mission_vitale.db"
+DATABASE_URL = os.getenv("MV_DATABASE_URL", "sqlite:///./mission_vitale.db")
+
+
+# -------- Profil moteur SQLite --------
+# Réglable par variables d'environnement (MV_DB_*) ; None = pragma laissé par défaut.
+@dataclass(frozen=True)
+class EngineProfile:
+    journal_mode: Optional[str] = "WAL"      # lecteurs et écrivain ne se bloquent plus
+    synchronous: Optional[str] = "NORMAL"    # sûr en WAL, un fsync par checkpoint
+    busy_timeout_ms: Optional[int] = 5000
+    cache_size_kib: Optional[int] = 64_000   # PRAGMA cache_size = -N (Kio)
+    mmap_size: Optional[int] = 256 * 1024 * 1024
+    pool_size: int = 5
+    max_overflow: int = 10
+    read_pool_size: int = 8
+
+    @classmethod
+    def legacy(cls) -> "EngineProfile":
+        # comportement historique : journal rollback, pragmas SQLite par défaut
+        return cls(journal_mode=None, synchronous=None, busy_timeout_ms=None,
+                   cache_size_kib=None, mmap_size=None)
+
+    @classmethod
+    def from_env(cls) -> "EngineProfile":
+        base = cls.legacy() if os.getenv("MV_DB_PROFILE", "tuned") == "default" else cls()
+        overrides = {}
+        for field, env, cast in (
+            ("journal_mode", "MV_DB_JOURNAL_MODE", str),
+            ("synchronous", "MV_DB_SYNCHRONOUS", str),
+            ("busy_timeout_ms", "MV_DB_BUSY_TIMEOUT_MS", int),
+            ("cache_size_kib", "MV_DB_CACHE_SIZE_KIB", int),
+            ("mmap_size", "MV_DB_MMAP_SIZE", int),
+            ("pool_size", "MV_DB_POOL_SIZE", int),
+            ("max_overflow", "MV_DB_MAX_OVERFLOW", int),
+            ("read_pool_size", "MV_DB_READ_POOL_SIZE", int),
+        ):
+            value = os.getenv(env)
+            if value is not None:
+                overrides[field] = cast(value)
+        return replace(base, **overrides)
+
+    def pragmas(self) -> list[str]:
+        out = []
+        if self.journal_mode:
+            out.append(f"PRAGMA journal_mode={self.journal_mode}")
+        if self.synchronous:
+            out.append(f"PRAGMA synchronous={self.synchronous}")
+        if self.busy_timeout_ms is not None:
+            out.append(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        if self.cache_size_kib is not None:
+            out.append(f"PRAGMA cache_size={-int(self.cache_size_kib)}")
+        if self.mmap_size is not None:
+            out.append(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        return out
+
+
+def _install_pragmas(engine, profile: EngineProfile, readonly: bool) -> None:
+    pragmas = profile.pragmas()
+    if readonly:
+        pragmas.append("PRAGMA query_only=ON")
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        for pragma in pragmas:
+            cur.execute(pragma)
+        cur.close()
+
+
+def make_engine(url: str, profile: EngineProfile, readonly: bool = False):
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=profile.read_pool_size if readonly else profile.pool_size,
+        max_overflow=profile.max_overflow,
+    )
+    _install_pragmas(engine, profile, readonly)
+    return engine
+
+
+def async_url(url: str) -> str:
+    # sqlite:///x.db -> sqlite+aiosqlite:///x.db
+    return url.replace("sqlite://", "sqlite+aiosqlite://", 1) if url.startswith("sqlite://") else url
+
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def make_async_engine(url: str, profile: EngineProfile, readonly: bool = False):
+    engine = create_async_engine(
+        async_url(url),
+        pool_size=profile.read_pool_size if readonly else profile.pool_size,
+        max_overflow=profile.max_overflow,
+    )
+    _install_pragmas(engine.sync_engine, profile, readonly)
+    return engine
+
+
+PROFILE = EngineProfile.from_env()
+
+engine = make_engine(DATABASE_URL, PROFILE)
+# Pool séparé, en lecture seule, pour les routes GET
+read_engine = make_engine(DATABASE_URL, PROFILE, readonly=True)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Couche async (aiosqlite) pour les routes chaudes : ne bloque pas la boucle.
+# Le chemin sync ci-dessus reste disponible pour les scripts.
+async_engine = make_async_engine(DATABASE_URL, PROFILE)
+async_read_engine = make_async_engine(DATABASE_URL, PROFILE, readonly=True)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 # Dépendance pour obtenir une session de base de données
@@ -17,3 +126,20 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Idem, sur le pool lecture seule
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Versions async
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
@@ -0,0 +1,369 @@
+# Backend/game/grading.py
+# Moteur de correction : chaque Puzzle est "compilé" une seule fois en un
+# correcteur immuable (frozenset / tuples pré-calculés), mis en cache LRU.
+# Un constructeur par PuzzleType dans REGISTRY (@register) ; chaque
+# correcteur a grade() pour une réponse et grade_many() (NumPy) pour
+# toutes les réponses d'une classe au même puzzle.
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Protocol, Sequence
+
+import numpy as np
+
+GRADER_CACHE_SIZE = 256
+
+GradeResult = tuple[bool, int, str]
+# grade_many : (réussites, scores), tableaux NumPy alignés sur les réponses
+BatchResult = tuple[np.ndarray, np.ndarray]
+
+
+def _load_solution(raw: Any) -> dict:
+    # game.py stocke un dict, gameplay.py une chaîne JSON (json.dumps)
+    if raw is None:
+        return {}
+    if isinstance(raw, (str, bytes)):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return {}
+    return raw if isinstance(raw, dict) else {}
+
+
+def _ratio(good: int, total: int) -> float:
+    return good / max(1, total)
+
+
+# -------- Encodage vectoriel (grade_many) --------
+# Chaque valeur de réponse est remplacée par un code entier (livre de codes
+# construit à partir de la solution) ; -1 = valeur hors solution.
+def _key(value: Any):
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return json.dumps(value, sort_keys=True, default=str)
+
+
+def _codebook(values) -> dict:
+    return {_key(v): i for i, v in enumerate(values)}
+
+
+# Réponses venues du client : une forme inattendue compte comme fausse,
+# jamais comme une erreur (grade et grade_many la lisent de la même façon).
+def _items(value: Any) -> tuple:
+    # liste attendue : None -> vide, valeur isolée -> un seul élément
+    if value is None:
+        return ()
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    return (value,)
+
+
+def _mapping(value: Any) -> dict:
+    return value if isinstance(value, dict) else {}
+
+
+def _selection(value: Any) -> frozenset:
+    return frozenset(_key(v) for v in _items(value))
+
+
+def _trunc(x: np.ndarray) -> np.ndarray:
+    # même arrondi que int() (vers zéro)
+    return np.trunc(x).astype(np.int64)
+
+
+def _partial(max_score: int, good: np.ndarray, total: int) -> np.ndarray:
+    return _trunc(max_score * (good / max(1, total)))
+
+
+# -------- Correcteurs compilés --------
+@dataclass(frozen=True, slots=True)
+class QuizGrader:
+    # QUIZ / IMG_QUIZ — solution: {"correct": [0,2]} ; answer: {"selected": [...]}
+    max_score: int
+    correct: frozenset
+
+    def grade(self, answer: dict) -> GradeResult:
+        selected = _selection(answer.get("selected"))
+        total = len(self.correct)
+        good = len(self.correct & selected)
+        bad = len(selected - self.correct)
+        score = max(0, int(self.max_score * _ratio(good, total) - bad * (self.max_score * 0.2)))
+        return selected == self.correct, score, f"Bonne(s) réponse(s): {good}/{total}"
+
+    def grade_many(self, answers: Sequence[dict]) -> BatchResult:
+        # matrice n x |correct| des bonnes options cochées + nombre d'options distinctes
+        book = _codebook(self.correct)
+        total = len(self.correct)
+        hits = np.zeros((len(answers), total), dtype=bool)
+        picked = np.zeros(len(answers), dtype=np.int64)
+        for i, a in enumerate(answers):
+            selected = _selection(a.get("selected"))
+            picked[i] = len(selected)
+            for v in selected:
+                j = book.get(v)
+                if j is not None:
+                    hits[i, j] = True
+        good = hits.sum(axis=1)
+        bad = picked - good
+        raw = self.max_score * (good / max(1, total)) - bad * (self.max_score * 0.2)
+        return (good == total) & (bad == 0), np.maximum(0, _trunc(raw))
+
+
+def _norm_text(text: Any, case_sensitive: bool, strip: bool) -> str:
+    text = str(text)
+    if strip:
+        text = text.strip()
+    if not case_sensitive:
+        text = text.lower()
+    return text
+
+
+@dataclass(frozen=True, slots=True)
+class CodeGrader:
+    # solution: {"text": "180", "accepted": [...], "case_insensitive": true}
+    #        ou {"expected": "HELLO", "case_sensitive": false, "strip": true}
+    max_score: int
+    accepted: frozenset
+    case_sensitive: bool
+    strip: bool
+
+    def grade(self, answer: dict) -> GradeResult:
+        got = _norm_text(answer.get("text", ""), self.case_sensitive, self.strip)
+        ok = got in self.accepted
+        return ok, (self.max_score if ok else 0), ("Code juste" if ok else "Code incorrect")
+
+    def grade_many(self, answers: Sequence[dict]) -> BatchResult:
+        got = np.array([_norm_text(a.get("text", ""), self.case_sensitive, self.strip) for a in answers], dtype=object)
+        ok = np.isin(got, list(self.accepted)) if len(got) else np.zeros(0, dtype=bool)
+        return ok, np.where(ok, self.max_score, 0).astype(np.int64)
+
+
+@dataclass(frozen=True, slots=True)
+class DndGrader:
+    # solution: {"mapping"|"targets": {"slot1": "cardA"}} ; answer: {"targets": {...}}
+    max_score: int
+    targets: tuple[tuple[str, Any], ...]
+
+    def grade(self, answer: dict) -> GradeResult:
+        ans = _mapping(answer.get("targets"))
+        total = len(self.targets)
+        good = sum(1 for k, v in self.targets if ans.get(k) == v)
+        score = int(self.max_score * _ratio(good, total))
+        return good == total, score, f"Placements corrects: {good}/{total}"
+
+    def grade_many(self, answers: Sequence[dict]) -> BatchResult:
+        # matrice n x slots des cartes posées (codes), comparée à la ligne attendue
+        book = _codebook(v for _, v in self.targets)
+        expected = np.array([book[_key(v)] for _, v in self.targets], dtype=np.int64)
+        placed = np.full((len(answers), len(self.targets)), -1, dtype=np.int64)
+        for i, a in enumerate(answers):
+            ans = _mapping(a.get("targets"))
+            for j, (slot, _) in enumerate(self.targets):
+                if slot in ans:
+                    placed[i, j] = book.get(_key(ans[slot]), -1)
+        good = (placed == expected).sum(axis=1)
+        total = len(self.targets)
+        return good == total, _partial(self.max_score, good, total)
+
+
+def _norm_edges(edges) -> frozenset:
+    out = set()
+    for e in _items(edges):
+        if not isinstance(e, (list, tuple)):
+            continue
+        try:
+            out.add(tuple(sorted(_key(v) for v in e)))
+        except TypeError:
+            continue  # sommets non comparables entre eux : connexion ignorée
+    return frozenset(out)
+
+
+@dataclass(frozen=True, slots=True)
+class SchemaGrader:
+    # solution: {"edges": [["A","B"],["B","C"]]} — connexions non orientées
+    max_score: int
+    edges: frozenset
+
+    def grade(self, answer: dict) -> GradeResult:
+        ans = _norm_edges(answer.get("edges"))
+        total = len(self.edges)
+        good = len(self.edges & ans)
+        score = int(self.max_score * _ratio(good, total))
+        return good == total, score, f"Connexions correctes: {good}/{total}"
+
+    def grade_many(self, answers: Sequence[dict]) -> BatchResult:
+        book = _codebook(self.edges)
+        total = len(self.edges)
+        hits = np.zeros((len(answers), total), dtype=bool)
+        for i, a in enumerate(answers):
+            for e in _norm_edges(a.get("edges")):
+                j = book.get(e)
+                if j is not None:
+                    hits[i, j] = True
+        good = hits.sum(axis=1)
+        return good == total, _partial(self.max_score, good, total)
+
+
+@dataclass(frozen=True, slots=True)
+class ReconGrader:
+    # IMG_RECON — solution: {"order": [0..n-1]} ; answer: {"order": [...]}
+    max_score: int
+    order: tuple
+
+    def grade(self, answer: dict) -> GradeResult:
+        ans = _items(answer.get("order"))
+        total = len(self.order)
+        good = sum(1 for a, b in zip(self.order, ans) if a == b)
+        ok = ans == self.order
+        score = self.max_score if ok else int(self.max_score * _ratio(good, total))
+        return ok, score, f"Pièces bien placées: {good}/{total}"
+
+    def grade_many(self, answers: Sequence[dict]) -> BatchResult:
+        # positions encodées (-1 = vide / inconnue) ; une réponse plus longue n'est jamais exacte
+        total = len(self.order)
+        book: dict = {}
+        for v in self.order:
+            book.setdefault(_key(v), len(book))
+        expected = np.array([book[_key(v)] for v in self.order], dtype=np.int64)
+        placed = np.full((len(answers), total), -1, dtype=np.int64)
+        lengths = np.zeros(len(answers), dtype=np.int64)
+        for i, a in enumerate(answers):
+            ans = _items(a.get("order"))
+            lengths[i] = len(ans)
+            for j, v in enumerate(ans[:total]):
+                placed[i, j] = book.get(_key(v), -1)
+        good = (placed == expected).sum(axis=1)
+        ok = (good == total) & (lengths == total)
+        return ok, np.where(ok, self.max_score, _partial(self.max_score, good, total))
+
+
+class Grader(Protocol):
+    max_score: int
+
+    def grade(self, answer: dict) -> GradeResult: ...
+
+    def grade_many(self, answers: Sequence[dict]) -> BatchResult: ...
+
+
+# -------- Registre : un constructeur par PuzzleType --------
+GraderFactory = Callable[[dict, int], Grader]
+REGISTRY: dict[str, GraderFactory] = {}
+
+
+def register(*puzzle_types: str):
+    """Déclare le constructeur de correcteur de un ou plusieurs types."""
+    def deco(factory: GraderFactory) -> GraderFactory:
+        for t in puzzle_types:
+            REGISTRY[t] = factory
+        return factory
+    return deco
+
+
+@register("QUIZ", "IMG_QUIZ")
+def _quiz(sol: dict, max_score: int) -> Grader:
+    return QuizGrader(max_score, _selection(sol.get("correct")))
+
+
+@register("CODE")
+def _code(sol: dict, max_score: int) -> Grader:
+    if "case_sensitive" in sol:
+        case_sensitive = bool(sol["case_sensitive"])
+    else:
+        case_sensitive = not sol.get("case_insensitive", True)
+    strip = bool(sol.get("strip", True))
+    expected = sol.get("expected", sol.get("text", ""))
+    accepted = frozenset(
+        _norm_text(a, case_sensitive, strip) for a in [expected or "", *(sol.get("accepted") or [])]
+    )
+    return CodeGrader(max_score, accepted, case_sensitive, strip)
+
+
+@register("DND")
+def _dnd(sol: dict, max_score: int) -> Grader:
+    mapping = _mapping(sol.get("mapping", sol.get("targets")))
+    return DndGrader(max_score, tuple(mapping.items()))
+
+
+@register("SCHEMA")
+def _schema(sol: dict, max_score: int) -> Grader:
+    return SchemaGrader(max_score, _norm_edges(sol.get("edges")))
+
+
+@register("IMG_RECON")
+def _recon(sol: dict, max_score: int) -> Grader:
+    return ReconGrader(max_score, _items(sol.get("order")))
+
+
+def compile_grader(puzzle) -> Optional[Grader]:
+    """Construit le correcteur d'un Puzzle (None si le type est inconnu)."""
+    factory = REGISTRY.get(puzzle.type)
+    if factory is None:
+        return None
+    max_score = puzzle.max_score if puzzle.max_score is not None else 100
+    return factory(_load_solution(puzzle.solution), max_score)
+
+
+# -------- Cache LRU des correcteurs --------
+class GraderCache:
+    """LRU borné clé (puzzle_id, révision) ; la révision est celle de la ligne
+    puzzles (incrémentée par chaque édition), donc cohérente entre workers."""
+
+    def __init__(self, maxsize: int = GRADER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: OrderedDict[tuple[int, int], Grader] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, puzzle) -> Optional[Grader]:
+        with self._lock:
+            key = (puzzle.id, getattr(puzzle, "revision", None) or 0)
+            grader = self._data.get(key)
+            if grader is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return grader
+            self.misses += 1
+
+        grader = compile_grader(puzzle)
+        if grader is None:
+            return None
+        with self._lock:
+            # révisions plus anciennes du même puzzle : inutiles désormais
+            for old in [k for k in self._data if k[0] == key[0] and k[1] < key[1]]:
+                del self._data[old]
+            self._data[key] = grader
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return grader
+
+    def invalidate(self, puzzle_id: int) -> None:
+        # libère tout de suite la mémoire locale (les autres workers suivent la révision)
+        with self._lock:
+            for key in [k for k in self._data if k[0] == puzzle_id]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+graders = GraderCache()
+
+
+def get_grader(puzzle) -> Optional[Grader]:
+    return graders.get(puzzle)
+
+
+def invalidate_grader(puzzle_id: int) -> None:
+    graders.invalidate(puzzle_id)
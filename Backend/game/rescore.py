@@ -0,0 +1,265 @@
+# Backend/game/rescore.py
+# Re-correction en masse après modification de la solution / du max_score
+# d'un puzzle : relit les réponses enregistrées (puzzle_answers), les corrige
+# en lot (grade_many) et ne réécrit que les lignes dont le score change.
+# Le job est persisté (rescore_jobs) : progression, annulation, reprise
+# après redémarrage. Chaque lot est une transaction courte dans un thread,
+# suivie d'une pause : le trafic normal garde la main sur l'écrivain SQLite.
+#   python -m Backend.game.rescore PUZZLE_ID
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import bindparam, distinct, func, select, update
+
+from .. import models
+from .grading import compile_grader
+
+RESCORE_CHUNK = int(os.getenv("MV_RESCORE_CHUNK", "500"))           # joueurs par lot
+RESCORE_PAUSE = float(os.getenv("MV_RESCORE_PAUSE_MS", "20")) / 1000  # entre deux lots
+RESCORE_POLL = 5.0  # jobs créés hors du process (CLI) : relevés au plus tard après
+
+ACTIVE = ("queued", "running")
+
+_jobs = models.RescoreJob.__table__
+_answers = models.PuzzleAnswer.__table__
+_progress = models.PlayerMission.__table__
+
+_update_answer = (
+    update(_answers)
+    .where(_answers.c.id == bindparam("b_id"))
+    .values(score=bindparam("b_score"), completed=bindparam("b_completed"))
+)
+# progression enregistrée comme "mission" = id du puzzle (cf. gameplay.submit)
+_update_progress = (
+    update(_progress)
+    .where(_progress.c.user_id == bindparam("b_user"), _progress.c.mission_id == bindparam("b_puzzle"))
+    .values(score=bindparam("b_score"), completed=bindparam("b_completed"))
+)
+
+
+def job_dict(row) -> dict:
+    d = dict(row._mapping)
+    d["percent"] = round(100.0 * d["processed"] / d["total"], 1) if d["total"] else (100.0 if d["status"] == "done" else 0.0)
+    return d
+
+
+# -------- Opérations sur les jobs (sync, appelées via to_thread) --------
+def create_job(engine, puzzle_id: int) -> int:
+    with engine.begin() as conn:
+        # une nouvelle modif remplace le job en cours sur le même puzzle
+        conn.execute(
+            update(_jobs)
+            .where(_jobs.c.puzzle_id == puzzle_id, _jobs.c.status.in_(ACTIVE))
+            .values(status="cancelled", updated_at=datetime.now(timezone.utc))
+        )
+        total = conn.execute(
+            select(func.count(distinct(_answers.c.user_id))).where(_answers.c.puzzle_id == puzzle_id)
+        ).scalar_one()
+        return conn.execute(_jobs.insert().values(puzzle_id=puzzle_id, status="queued", total=total)).inserted_primary_key[0]
+
+
+def get_job(engine, job_id: int) -> Optional[dict]:
+    with engine.connect() as conn:
+        row = conn.execute(select(_jobs).where(_jobs.c.id == job_id)).first()
+    return job_dict(row) if row else None
+
+
+def set_status(engine, job_id: int, status: str, allowed: tuple) -> Optional[dict]:
+    with engine.begin() as conn:
+        conn.execute(
+            update(_jobs)
+            .where(_jobs.c.id == job_id, _jobs.c.status.in_(allowed))
+            .values(status=status, updated_at=datetime.now(timezone.utc))
+        )
+    return get_job(engine, job_id)
+
+
+def next_job(engine) -> Optional[int]:
+    with engine.connect() as conn:
+        return conn.execute(
+            select(_jobs.c.id).where(_jobs.c.status.in_(ACTIVE)).order_by(_jobs.c.id).limit(1)
+        ).scalar()
+
+
+@contextmanager
+def _write_tx(engine):
+    # lectures puis écritures dans la même transaction : sous SQLite, verrou
+    # d'écriture pris dès le BEGIN (IMMEDIATE, qui attend busy_timeout). En
+    # différé, le passage lecture -> écriture échoue en SQLITE_BUSY dès qu'un
+    # autre écrivain WAL a commité entre-temps, sans attente possible.
+    with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def run_chunk(engine, job_id: int, chunk: int = RESCORE_CHUNK) -> bool:
+    """Re-corrige le lot suivant ; False quand le job est terminé ou arrêté."""
+    with _write_tx(engine) as conn:
+        job = conn.execute(select(_jobs).where(_jobs.c.id == job_id)).first()
+        if job is None or job.status not in ACTIVE:
+            return False
+        puzzle = conn.execute(
+            select(models.Puzzle.__table__).where(models.Puzzle.id == job.puzzle_id)
+        ).first()
+        grader = compile_grader(puzzle) if puzzle is not None else None
+        if grader is None:
+            conn.execute(update(_jobs).where(_jobs.c.id == job_id).values(
+                status="failed", error="puzzle absent ou type inconnu", updated_at=datetime.now(timezone.utc)))
+            return False
+
+        users = conn.execute(
+            select(distinct(_answers.c.user_id))
+            .where(_answers.c.puzzle_id == job.puzzle_id, _answers.c.user_id > job.cursor)
+            .order_by(_answers.c.user_id)
+            .limit(chunk)
+        ).scalars().all()
+        if not users:
+            conn.execute(update(_jobs).where(_jobs.c.id == job_id).values(
+                status="done", updated_at=datetime.now(timezone.utc)))
+            return False
+
+        rows = conn.execute(
+            select(_answers.c.id, _answers.c.user_id, _answers.c.answer, _answers.c.score, _answers.c.completed)
+            .where(_answers.c.puzzle_id == job.puzzle_id, _answers.c.user_id.in_(users))
+        ).all()
+        ok, scores = grader.grade_many([r.answer or {} for r in rows])
+
+        answer_updates = []
+        best: dict[int, tuple[int, int]] = {}  # user_id -> (score, completed)
+        for r, good, score in zip(rows, ok.tolist(), scores.tolist()):
+            done = 1 if good else 0
+            if (r.score, r.completed) != (score, done):
+                answer_updates.append({"b_id": r.id, "b_score": score, "b_completed": done})
+            prev_score, prev_done = best.get(r.user_id, (0, 0))
+            best[r.user_id] = (max(prev_score, score), max(prev_done, done))
+
+        current = conn.execute(
+            select(_progress.c.user_id, _progress.c.score, _progress.c.completed)
+            .where(_progress.c.mission_id == job.puzzle_id, _progress.c.user_id.in_(users))
+        ).all()
+        progress_updates = [
+            {"b_user": uid, "b_puzzle": job.puzzle_id, "b_score": best[uid][0], "b_completed": best[uid][1]}
+            for uid, score, completed in current
+            if uid in best and (score or 0, completed or 0) != best[uid]
+        ]
+        # executemany ; user_totals suit par trigger
+        if answer_updates:
+            conn.execute(_update_answer, answer_updates)
+        if progress_updates:
+            conn.execute(_update_progress, progress_updates)
+        conn.execute(update(_jobs).where(_jobs.c.id == job_id).values(
+            status="running",
+            cursor=users[-1],
+            processed=_jobs.c.processed + len(users),
+            changed=_jobs.c.changed + len(progress_updates),
+            updated_at=datetime.now(timezone.utc),
+        ))
+    return True
+
+
+# -------- Worker de fond --------
+class RescoreWorker:
+    def __init__(self, engine, chunk: int = RESCORE_CHUNK, pause: float = RESCORE_PAUSE):
+        self.engine = engine
+        self.chunk = chunk
+        self.pause = pause
+        self._wakeup = asyncio.Event()
+        self._loop_ref: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        # les jobs queued/running d'un arrêt précédent reprennent à leur curseur
+        if self._task is None:
+            self._loop_ref = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._loop())
+
+    def notify(self) -> None:
+        # appelable depuis une route sync (threadpool)
+        if self._loop_ref is not None:
+            self._loop_ref.call_soon_threadsafe(self._wakeup.set)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def enqueue(self, puzzle_id: int) -> int:
+        job_id = await asyncio.to_thread(create_job, self.engine, puzzle_id)
+        self._wakeup.set()
+        return job_id
+
+    async def cancel(self, job_id: int) -> Optional[dict]:
+        return await asyncio.to_thread(set_status, self.engine, job_id, "cancelled", ACTIVE)
+
+    async def resume(self, job_id: int) -> Optional[dict]:
+        job = await asyncio.to_thread(set_status, self.engine, job_id, "queued", ("cancelled", "failed"))
+        self._wakeup.set()
+        return job
+
+    async def status(self, job_id: int) -> Optional[dict]:
+        return await asyncio.to_thread(get_job, self.engine, job_id)
+
+    async def _loop(self) -> None:
+        while True:
+            job_id = await asyncio.to_thread(next_job, self.engine)
+            if job_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), RESCORE_POLL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                while await asyncio.to_thread(run_chunk, self.engine, job_id, self.chunk):
+                    await asyncio.sleep(self.pause)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await asyncio.to_thread(_fail, self.engine, job_id, repr(e))
+
+
+def _fail(engine, job_id: int, error: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(update(_jobs).where(_jobs.c.id == job_id).values(
+            status="failed", error=error, updated_at=datetime.now(timezone.utc)))
+
+
+def main(argv: list[str] | None = None) -> int:
+    from ..database import Base, engine
+    from .. import migrations
+
+    parser = argparse.ArgumentParser(description="Re-correction des réponses enregistrées d'un puzzle")
+    parser.add_argument("puzzle_id", type=int)
+    parser.add_argument("--chunk", type=int, default=RESCORE_CHUNK, help="joueurs par lot")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    job_id = create_job(engine, args.puzzle_id)
+    while run_chunk(engine, job_id, args.chunk):
+        job = get_job(engine, job_id)
+        print(f"\r{job['processed']}/{job['total']} joueurs ({job['percent']}%), {job['changed']} modifiés", end="")
+    job = get_job(engine, job_id)
+    print(f"\njob {job_id}: {job['status']} — {job['processed']} joueurs, {job['changed']} progressions modifiées")
+    return 0 if job["status"] == "done" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
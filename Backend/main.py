@@ -1,7 +1,14 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .database import Base, engine
-from .routes import users, missions, game
+from fastapi.responses import Response
+from .database import Base, SessionLocal, engine, read_engine, async_engine, async_read_engine
+from . import migrations
+from .routes import users, missions, game, gameplay
+from .utils import leaderboard
+from .utils import metrics
+from .utils.security import revocations, shutdown_hasher
 
 # Ces imports sont optionnels : ils seront inclus seulement s'ils existent
 
@@ -11,7 +18,32 @@ try:
 except Exception:
     HAS_COLLAB = False
 
-app = FastAPI(title="Mission Vitale API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # bus pub/sub des salles collab (poll inter-workers éventuel)
+    if HAS_COLLAB:
+        await collab.manager.start()
+        await collab.room_states.start(collab.manager.broadcast)
+        await collab.reaper.start()
+    # re-corrections en attente (reprennent à leur curseur)
+    await game.rescore.start()
+    # logouts des autres workers + purge des tokens expirés
+    await revocations.start()
+    yield
+    await revocations.close()
+    await game.rescore.close()
+    if HAS_COLLAB:
+        await collab.reaper.close()
+        await collab.locks.close()
+        await collab.history.close()
+        await collab.room_states.close()
+        await collab.manager.close()
+    shutdown_hasher()
+    # ferme les connexions aiosqlite (leurs threads bloqueraient l'arrêt du process)
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+app = FastAPI(title="Mission Vitale API", lifespan=lifespan)
 
 # CORS : accepte localhost / 127.0.0.1 sur n'importe quel port (Vite etc.)
 app.add_middleware(
@@ -24,16 +56,49 @@ app.add_middleware(
     max_age=600,
 )
 
+# Latence par route, requêtes SQL / temps DB par requête (+ Server-Timing)
+app.add_middleware(metrics.MetricsMiddleware)
+for _label, _engine in (("write", engine), ("read", read_engine),
+                        ("async_write", async_engine.sync_engine), ("async_read", async_read_engine.sync_engine)):
+    metrics.install_sql_hooks(_engine, _label)
+
 # Création des tables SQLite
 Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
+
+# Bases existantes : crée les totaux manquants du classement matérialisé
+with SessionLocal() as _db:
+    leaderboard.backfill_missing(_db)
 
 # Routes
 app.include_router(users.router)
 app.include_router(missions.router, prefix="/missions", tags=["Missions"])
 app.include_router(game.router, prefix="/game", tags=["Game"])
+# session/timer, soumission (unitaire et groupée) et progression ; les doublons /game/puzzles restent servis par game.router
+app.include_router(gameplay.router)
 app.include_router(missions.router)
 if HAS_COLLAB:
     app.include_router(collab.router)
+    metrics.register_ws_manager(collab.manager)
+    metrics.register_reaper(collab.reaper)
+    metrics.register_chat_history(collab.history)
+
+# Caches exposés dans /metrics
+from .game.grading import graders
+from .utils.catalog_cache import catalog
+from .utils.session_cache import active_sessions
+from .utils.token_cache import verified_tokens
+for _name, _cache in (("grader", graders), ("catalog", catalog),
+                      ("session", active_sessions), ("token", verified_tokens)):
+    metrics.register_cache(_name, _cache.stats)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(request: Request):
+    # MV_METRICS_TOKEN (Bearer) ; sans token, loopback seulement
+    if not metrics.scrape_allowed(request.client.host if request.client else None,
+                                  request.headers.get("authorization")):
+        raise HTTPException(status_code=403, detail="Accès aux métriques refusé")
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,259 @@
+# Backend/migrations.py
+# Mises à niveau versionnées des bases SQLite existantes (create_all ne
+# modifie jamais une table déjà créée). La version appliquée est stockée dans
+# PRAGMA user_version ; chaque migration est idempotente, pour qu'une base
+# toute neuve (déjà créée par create_all avec la version 0) passe aussi.
+#   python -m Backend.migrations [--check-plans]
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+from datetime import datetime
+
+from sqlalchemy import text
+
+
+def _columns(conn, table: str) -> set[str]:
+    return {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+
+
+def _iso_to_epoch(value: str):
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+# -------- Migrations --------
+def add_game_session_expiry(conn) -> None:
+    # expires_at (ISO) -> expires_epoch indexé avec user_id : l'accès à la
+    # session active devient une recherche d'index, sans tri ni parsing
+    if "expires_epoch" not in _columns(conn, "game_sessions"):
+        conn.execute(text("ALTER TABLE game_sessions ADD COLUMN expires_epoch FLOAT"))
+    rows = conn.execute(text("SELECT id, expires_at FROM game_sessions WHERE expires_epoch IS NULL")).all()
+    updates = [{"id": sid, "e": _iso_to_epoch(exp)} for sid, exp in rows]
+    updates = [u for u in updates if u["e"] is not None]
+    if updates:
+        conn.execute(text("UPDATE game_sessions SET expires_epoch = :e WHERE id = :id"), updates)
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_game_sessions_user_expiry ON game_sessions (user_id, expires_epoch)"
+    ))
+
+
+def add_hot_path_indexes(conn) -> None:
+    # doublons de progression (soumissions concurrentes) : on garde une
+    # ligne par (user_id, mission_id) avec le meilleur score
+    conn.execute(text("""
+        UPDATE player_missions SET
+            score = (SELECT MAX(score) FROM player_missions p
+                     WHERE p.user_id = player_missions.user_id AND p.mission_id = player_missions.mission_id),
+            completed = (SELECT MAX(completed) FROM player_missions p
+                         WHERE p.user_id = player_missions.user_id AND p.mission_id = player_missions.mission_id)
+        WHERE (user_id, mission_id) IN (
+            SELECT user_id, mission_id FROM player_missions GROUP BY user_id, mission_id HAVING COUNT(*) > 1
+        )
+    """))
+    removed = conn.execute(text("""
+        DELETE FROM player_missions WHERE id NOT IN (
+            SELECT MIN(id) FROM player_missions GROUP BY user_id, mission_id
+        )
+    """)).rowcount
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uix_player_mission ON player_missions (user_id, mission_id)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_puzzles_mission_id ON puzzles (mission_id)"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_user_totals_total_score"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_user_totals_rank ON user_totals (total_score DESC, user_id)"
+    ))
+    # collab_members(room_id) est déjà couvert par uix_room_user (room_id, user_id)
+    if removed:
+        conn.execute(text("""
+            UPDATE user_totals SET total_score = (
+                SELECT COALESCE(SUM(score), 0) FROM player_missions p WHERE p.user_id = user_totals.user_id
+            )
+        """))
+
+
+def add_user_totals_triggers(conn) -> None:
+    # user_totals suit player_missions dans la même transaction, quel que soit
+    # l'auteur de l'écriture (upsert du submit, rescore, import...)
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS trg_player_missions_total_ins
+        AFTER INSERT ON player_missions
+        BEGIN
+            INSERT INTO user_totals (user_id, total_score, updated_at)
+            VALUES (NEW.user_id, COALESCE(NEW.score, 0), CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id) DO UPDATE SET
+                total_score = total_score + excluded.total_score,
+                updated_at = excluded.updated_at;
+        END
+    """))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS trg_player_missions_total_upd
+        AFTER UPDATE OF score ON player_missions
+        WHEN COALESCE(NEW.score, 0) != COALESCE(OLD.score, 0)
+        BEGIN
+            UPDATE user_totals
+            SET total_score = total_score + COALESCE(NEW.score, 0) - COALESCE(OLD.score, 0),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = NEW.user_id;
+        END
+    """))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS trg_player_missions_total_del
+        AFTER DELETE ON player_missions
+        BEGIN
+            UPDATE user_totals
+            SET total_score = total_score - COALESCE(OLD.score, 0),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = OLD.user_id;
+        END
+    """))
+
+
+def add_content_keys(conn) -> None:
+    # clé de contenu des packs importés (cf. utils/content_pack.py)
+    for table in ("missions", "puzzles"):
+        if "content_key" not in _columns(conn, table):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN content_key VARCHAR"))
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS uix_{table}_content_key ON {table} (content_key)"
+        ))
+
+
+def add_room_rate_limits(conn) -> None:
+    # limites de débit WebSocket propres à une salle (NULL = défauts)
+    if "rate_limits" not in _columns(conn, "collab_rooms"):
+        conn.execute(text("ALTER TABLE collab_rooms ADD COLUMN rate_limits JSON"))
+
+
+def add_puzzle_revision(conn) -> None:
+    # révision de puzzle (cache des correcteurs partagé entre workers)
+    if "revision" not in _columns(conn, "puzzles"):
+        conn.execute(text("ALTER TABLE puzzles ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"))
+
+
+def revoked_tokens_autoincrement(conn) -> None:
+    # table créée sans AUTOINCREMENT : les rowids purgés étaient réutilisés,
+    # sous le curseur de synchronisation des workers (cf. utils/token_cache)
+    sql = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'revoked_tokens'"
+    )).scalar()
+    if sql is None or "AUTOINCREMENT" in sql.upper():
+        return
+    conn.execute(text("ALTER TABLE revoked_tokens RENAME TO revoked_tokens_old"))
+    conn.execute(text(
+        "CREATE TABLE revoked_tokens ("
+        " id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, digest VARCHAR NOT NULL, exp FLOAT NOT NULL)"
+    ))
+    conn.execute(text(
+        "INSERT INTO revoked_tokens (id, digest, exp) SELECT id, digest, exp FROM revoked_tokens_old"
+    ))
+    conn.execute(text("DROP TABLE revoked_tokens_old"))
+    conn.execute(text("CREATE UNIQUE INDEX uix_revoked_tokens_digest ON revoked_tokens (digest)"))
+    conn.execute(text("CREATE INDEX ix_revoked_tokens_exp ON revoked_tokens (exp)"))
+
+
+MIGRATIONS = [
+    (1, "game_sessions.expires_epoch", add_game_session_expiry),
+    (2, "index des requêtes chaudes + unicité player_missions", add_hot_path_indexes),
+    (3, "triggers player_missions -> user_totals", add_user_totals_triggers),
+    (4, "missions/puzzles.content_key", add_content_keys),
+    (5, "collab_rooms.rate_limits", add_room_rate_limits),
+    (6, "puzzles.revision", add_puzzle_revision),
+    (7, "revoked_tokens AUTOINCREMENT", revoked_tokens_autoincrement),
+]
+
+
+def current_version(conn) -> int:
+    return conn.execute(text("PRAGMA user_version")).scalar() or 0
+
+
+def upgrade(engine) -> list[int]:
+    """Applique les migrations en attente, chacune dans sa transaction."""
+    applied = []
+    for version, _name, migrate in MIGRATIONS:
+        with engine.begin() as conn:
+            if current_version(conn) >= version:
+                continue
+            migrate(conn)
+            conn.execute(text(f"PRAGMA user_version = {int(version)}"))
+        applied.append(version)
+    return applied
+
+
+# -------- Contrôle des plans de requête --------
+# Requêtes chaudes : aucune ne doit revenir à un parcours complet de table
+# ni à un tri temporaire.
+HOT_QUERIES = {
+    "progression (submit)":
+        "SELECT * FROM player_missions WHERE user_id = 1 AND mission_id = 1",
+    "progression (batch)":
+        "SELECT * FROM player_missions WHERE user_id = 1 AND mission_id IN (1, 2, 3)",
+    "score total":
+        "SELECT SUM(score) FROM player_missions WHERE user_id = 1",
+    "session active":
+        "SELECT * FROM game_sessions WHERE user_id = 1 AND expires_epoch > 0 ORDER BY expires_epoch DESC, id DESC LIMIT 1",
+    "membres d'une salle":
+        "SELECT * FROM collab_members JOIN users ON users.id = collab_members.user_id WHERE collab_members.room_id = 1",
+    "salle par code":
+        "SELECT * FROM collab_rooms WHERE code = 'ABC123'",
+    "puzzles d'une mission":
+        "SELECT * FROM puzzles WHERE mission_id = 1 ORDER BY id",
+    "puzzles (batch)":
+        "SELECT * FROM puzzles WHERE id IN (1, 2, 3)",
+    "login":
+        "SELECT * FROM users WHERE username = 'alex'",
+    "classement":
+        "SELECT users.username, user_totals.total_score FROM user_totals JOIN users ON users.id = user_totals.user_id"
+        " ORDER BY user_totals.total_score DESC, user_totals.user_id ASC LIMIT 50",
+    "classement (page suivante)":
+        "SELECT users.username, user_totals.total_score FROM user_totals JOIN users ON users.id = user_totals.user_id"
+        " WHERE user_totals.total_score <= 40 AND (user_totals.total_score < 40 OR user_totals.user_id > 7)"
+        " ORDER BY user_totals.total_score DESC, user_totals.user_id ASC LIMIT 50",
+    "utilisateurs (page)":
+        "SELECT * FROM users WHERE id < 500 ORDER BY id DESC LIMIT 100",
+    "historique du chat":
+        "SELECT * FROM collab_messages WHERE room_code = 'ABC123' AND msg_id < 1000 ORDER BY msg_id DESC LIMIT 50",
+}
+
+_FULL_SCAN = re.compile(r"^SCAN (\w+)$|TEMP B-TREE")
+
+
+def check_query_plans(engine) -> list[str]:
+    """Retourne les requêtes chaudes dont le plan est un scan complet ou un tri."""
+    failures = []
+    with engine.connect() as conn:
+        for name, sql in HOT_QUERIES.items():
+            details = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+            bad = [d for d in details if _FULL_SCAN.search(d)]
+            if bad:
+                failures.append(f"{name}: {' | '.join(bad)}")
+    return failures
+
+
+def main(argv: list[str] | None = None) -> int:
+    from .database import Base, engine
+    from . import models  # noqa: F401  (enregistre les tables)
+
+    parser = argparse.ArgumentParser(description="Migrations SQLite de Mission Vitale")
+    parser.add_argument("--check-plans", action="store_true", help="échoue si une requête chaude scanne une table")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    applied = upgrade(engine)
+    with engine.connect() as conn:
+        print(f"version {current_version(conn)} (appliquées: {applied or 'aucune'})")
+    if args.check_plans:
+        failures = check_query_plans(engine)
+        for f in failures:
+            print(f"SCAN  {f}")
+        print("plans OK" if not failures else f"{len(failures)} requête(s) en scan complet")
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,10 @@ from __future__ import annotations
 from datetime import datetime
 
 from sqlalchemy import (
+    BigInteger,
     Column,
+    Float,
+    Index,
     Integer,
     String,
     Text,
@@ -44,6 +47,35 @@ class Score(Base):
     user = relationship("User", back_populates="scores")
 
 
+class UserTotal(Base):
+    # total matérialisé (somme des PlayerMission.score), maintenu par le submit
+    __tablename__ = "user_totals"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_score = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # ordre exact du classement (total desc, user_id asc) : top-K sans tri
+    __table_args__ = (Index("ix_user_totals_rank", total_score.desc(), user_id),)
+
+
+class RevokedToken(Base):
+    # tokens révoqués (logout), relus par tous les workers (cf. utils/token_cache)
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True)        # curseur de synchronisation
+    digest = Column(String, nullable=False)       # empreinte hex du token
+    exp = Column(Float, nullable=False)           # epoch : purgé au-delà
+
+    # AUTOINCREMENT : un id purgé n'est jamais réattribué (sinon une révocation
+    # reçoit un id <= curseur des autres workers et n'est jamais relue)
+    __table_args__ = (
+        Index("uix_revoked_tokens_digest", "digest", unique=True),
+        Index("ix_revoked_tokens_exp", "exp"),
+        {"sqlite_autoincrement": True},
+    )
+
+
 # -------------------------
 # Progression par mission
 # -------------------------
@@ -60,6 +92,9 @@ class PlayerMission(Base):
     user = relationship("User", back_populates="missions_progress")
     mission = relationship("Mission", back_populates="players")
 
+    # une seule ligne de progression par joueur et par mission
+    __table_args__ = (Index("uix_player_mission", "user_id", "mission_id", unique=True),)
+
 
 # -------------------------
 # Session de jeu (timer)
@@ -72,6 +107,10 @@ class GameSession(Base):
     started_at = Column(DateTime, default=datetime.utcnow)
     # ISO8601 (simple à manipuler côté front)
     expires_at = Column(String, nullable=False)
+    # même instant en epoch (s) : comparé sans parsing, indexé avec user_id
+    expires_epoch = Column(Float, nullable=True)
+
+    __table_args__ = (Index("ix_game_sessions_user_expiry", "user_id", "expires_epoch"),)
 
 
 # -------------------------
@@ -86,6 +125,7 @@ class CollabRoom(Base):
     status = Column(String, default="waiting")        # waiting | running | finished
     started_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(String, nullable=True)        # ISO8601
+    rate_limits = Column(JSON, nullable=True)         # {type: {rate, burst}} (cf. utils/rate_limit)
 
 
 class CollabMember(Base):
@@ -100,6 +140,22 @@ class CollabMember(Base):
     __table_args__ = (UniqueConstraint("room_id", "user_id", name="uix_room_user"),)
 
 
+class CollabMessage(Base):
+    # messages de chat des salles, écrits par lots (cf. utils/chat_history)
+    __tablename__ = "collab_messages"
+
+    id = Column(Integer, primary_key=True)
+    msg_id = Column(BigInteger, nullable=False)   # id diffusé aux clients (ms epoch * 1000 + séquence)
+    room_code = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    username = Column(String, nullable=True)
+    role = Column(String, nullable=True)
+    text = Column(Text, nullable=False)
+    ts = Column(BigInteger, nullable=False)       # ms epoch
+
+    __table_args__ = (Index("ix_collab_messages_room_msg", "room_code", "msg_id"),)
+
+
 # -------------------------
 # Missions & Puzzles
 # -------------------------
@@ -112,6 +168,10 @@ class Mission(Base):
     difficulty = Column(String, default="facile")
     max_score = Column(Integer, default=100)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # clé stable du pack de contenu importé (ré-import idempotent)
+    content_key = Column(String, nullable=True)
+
+    __table_args__ = (Index("uix_missions_content_key", "content_key", unique=True),)
 
     # relations
     puzzles = relationship(
@@ -127,7 +187,7 @@ class Puzzle(Base):
     __tablename__ = "puzzles"
 
     id = Column(Integer, primary_key=True, index=True)
-    mission_id = Column(Integer, ForeignKey("missions.id"), nullable=False)
+    mission_id = Column(Integer, ForeignKey("missions.id"), nullable=False, index=True)
     title = Column(String, nullable=False)
     # String pour accepter aussi IMG_QUIZ / IMG_RECON sans migration d'Enum
     type = Column(String, nullable=False)
@@ -135,5 +195,49 @@ class Puzzle(Base):
     solution = Column(JSON, nullable=True)
     max_score = Column(Integer, default=100)
     created_at = Column(DateTime, default=datetime.utcnow)
+    content_key = Column(String, nullable=True)
+    # incrémentée par chaque édition : clé du cache des correcteurs, sur tous les workers
+    revision = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (Index("uix_puzzles_content_key", "content_key", unique=True),)
 
     mission = relationship("Mission", back_populates="puzzles")
+
+
+# -------------------------
+# Réponses enregistrées & re-correction
+# -------------------------
+class PuzzleAnswer(Base):
+    # une ligne par réponse distincte d'un joueur à un puzzle (empreinte de
+    # la réponse) : permet de re-corriger quand la solution change
+    __tablename__ = "puzzle_answers"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    puzzle_id = Column(Integer, ForeignKey("puzzles.id"), nullable=False)
+    answer_hash = Column(String, nullable=False)
+    answer = Column(JSON, nullable=False)
+    score = Column(Integer, default=0, nullable=False)
+    completed = Column(Integer, default=0, nullable=False)
+    submitted_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("uix_puzzle_answers_key", "puzzle_id", "user_id", "answer_hash", unique=True),
+    )
+
+
+class RescoreJob(Base):
+    __tablename__ = "rescore_jobs"
+
+    id = Column(Integer, primary_key=True)
+    puzzle_id = Column(Integer, ForeignKey("puzzles.id"), nullable=False)
+    status = Column(String, default="queued", nullable=False)  # queued | running | cancelled | done | failed
+    cursor = Column(Integer, default=0, nullable=False)        # dernier user_id traité
+    total = Column(Integer, default=0, nullable=False)         # joueurs à re-corriger
+    processed = Column(Integer, default=0, nullable=False)
+    changed = Column(Integer, default=0, nullable=False)       # lignes de progression modifiées
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (Index("ix_rescore_jobs_status", "status", "id"),)
@@ -1,18 +1,38 @@
 # Backend/routes/collab.py
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, Query
+from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select
 from datetime import datetime, timedelta, timezone
-import secrets, string, json, jwt
+from collections import Counter
+from typing import Optional
+import os, secrets, string
 
-from ..database import get_db
+from ..database import get_db, get_read_db, get_async_db, get_async_read_db, AsyncReadSessionLocal, async_engine, async_read_engine
 from .. import models
 from ..schemas import CollabRoomCreate, CollabRoomRead, JoinRoomIn, MemberRead
-from ..utils.security import get_current_user, SECRET_KEY, ALGORITHM
+from ..utils.security import get_current_user, authenticate_token, InvalidToken
 from ..utils.ws_manager import ConnectionManager
+from ..utils.room_state import RoomStateStore, PatchError
+from ..utils.room_reaper import RoomReaper, CLOSE_ROOM_FINISHED
+from ..utils.lock_manager import LockManager, Lease
+from ..utils.ws_codec import CLOSE_INVALID_PAYLOAD, CodecError, negotiate, now_ms, iso_from_ms
+from ..utils.rate_limit import RateLimiter
+from ..utils.chat_history import ChatHistory
+from ..utils.pagination import set_next_cursor
 
 router = APIRouter(prefix="/collab", tags=["collaboration"])
 manager = ConnectionManager()
+# état autoritaire des puzzles par salle (snapshot versionné, diffusion au tick)
+room_states = RoomStateStore()
+# seaux à jetons par (salle, joueur, type de message)
+limiter = RateLimiter()
+WS_BATCH_MAX = int(os.getenv("MV_WS_BATCH_MAX", "32"))
+# derniers chat/présences par salle (rejoués à la connexion), chat persisté par lots
+history = ChatHistory(async_engine, async_read_engine)
+manager.observers.append(history.observe)
+# salles expirées, sockets muettes, verrous orphelins (démarré par le lifespan)
+reaper = RoomReaper(async_engine, manager, room_states, limiter=limiter, history=history)
 
 ROLES = ["diagnostic", "labo", "pharmacie", "it"]
 
@@ -20,12 +40,32 @@ def _gen_code(n: int = 6) -> str:
     alphabet = string.ascii_uppercase + string.digits
     return "".join(secrets.choice(alphabet) for _ in range(n))
 
+# messages portant un puzzle_id (entier, ou chaîne de chiffres comme avant)
+PUZZLE_MESSAGES = {"state", "state_patch", "lock", "unlock"}
+
+def _puzzle_id(msg: dict) -> Optional[int]:
+    pid = msg.get("puzzle_id", 0)
+    if isinstance(pid, bool):
+        return None
+    try:
+        return int(pid)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
 def _iso_utc(dt: datetime) -> str:
     return dt.replace(tzinfo=timezone.utc).isoformat().replace("+00:00", "Z")
 
-# --- In-memory locks d'énigmes par room ---
-# key: (room_code, puzzle_id) -> user_id
-ROOM_LOCKS: dict[tuple[str,int], int] = {}
+# --- Locks d'énigmes par room ---
+# baux portés par le broker (manager.broker) : partagés entre workers si MV_WS_BROKER=sqlite.
+# TTL prolongé par "ping", libérés à la déconnexion, expirés par le LockManager ;
+# le reaper purge ce qui resterait (salles terminées)
+async def _lock_expired(lease: Lease):
+    await manager.broadcast(lease.room_code, {
+        "type": "lock_released", "puzzle_id": lease.puzzle_id, "token": lease.token,
+        "reason": "expired", "ts": now_ms()
+    })
+
+locks = LockManager(manager.broker, on_expire=_lock_expired)
 
 # ---------- Endpoints HTTP ----------
 @router.post("/rooms", response_model=CollabRoomRead, status_code=status.HTTP_201_CREATED)
@@ -39,6 +79,7 @@ def create_room(payload: CollabRoomCreate, db: Session = Depends(get_db), curren
         status="running",
         started_at=now.replace(tzinfo=None),
         expires_at=_iso_utc(expires),
+        rate_limits=payload.model_dump()["rate_limits"],
     )
     db.add(room)
     db.commit()
@@ -46,15 +87,27 @@ def create_room(payload: CollabRoomCreate, db: Session = Depends(get_db), curren
     return room
 
 @router.get("/rooms/{code}", response_model=CollabRoomRead)
-def get_room(code: str, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+def get_room(code: str, db: Session = Depends(get_read_db), current_user: dict = Depends(get_current_user)):
     room = db.query(models.CollabRoom).filter(models.CollabRoom.code == code).first()
     if not room:
         raise HTTPException(404, "Salle introuvable")
     return room
 
+async def _room_by_code(db: AsyncSession, code: str):
+    res = await db.execute(select(models.CollabRoom).where(models.CollabRoom.code == code))
+    return res.scalars().first()
+
+async def _members(db: AsyncSession, room_id: int) -> list[MemberRead]:
+    res = await db.execute(
+        select(models.CollabMember, models.User)
+        .join(models.User, models.User.id == models.CollabMember.user_id)
+        .where(models.CollabMember.room_id == room_id)
+    )
+    return [MemberRead(user_id=u.id, username=u.username, role=m.role) for (m, u) in res.all()]
+
 @router.post("/rooms/{code}/join", response_model=list[MemberRead])
-def join_room(code: str, payload: JoinRoomIn, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    room = db.query(models.CollabRoom).filter(models.CollabRoom.code == code).first()
+async def join_room(code: str, payload: JoinRoomIn, db: AsyncSession = Depends(get_async_db), current_user: dict = Depends(get_current_user)):
+    room = await _room_by_code(db, code)
     if not room:
         raise HTTPException(404, "Salle introuvable")
     if room.status == "finished":
@@ -65,7 +118,9 @@ def join_room(code: str, payload: JoinRoomIn, db: Session = Depends(get_db), cur
     if desired and desired not in ROLES:
         raise HTTPException(400, f"Rôle invalide. Choix: {ROLES}")
 
-    taken_roles = {m.role for m in db.query(models.CollabMember).filter(models.CollabMember.room_id == room.id).all() if m.role}
+    res = await db.execute(select(models.CollabMember).where(models.CollabMember.room_id == room.id))
+    room_members = res.scalars().all()
+    taken_roles = {m.role for m in room_members if m.role}
     role = None
     if desired:
         if desired in taken_roles:
@@ -79,136 +134,221 @@ def join_room(code: str, payload: JoinRoomIn, db: Session = Depends(get_db), cur
                 break
 
     # upsert membre
-    member = db.query(models.CollabMember).filter(and_(
-        models.CollabMember.room_id == room.id,
-        models.CollabMember.user_id == current_user["user_id"]
-    )).first()
+    member = next((m for m in room_members if m.user_id == current_user["user_id"]), None)
     if member:
         member.role = role or member.role
     else:
         member = models.CollabMember(room_id=room.id, user_id=current_user["user_id"], role=role)
         db.add(member)
 
-    db.commit()
+    await db.commit()
 
     # retour: liste des membres
-    rows = db.query(models.CollabMember, models.User).join(models.User, models.User.id == models.CollabMember.user_id).filter(
-        models.CollabMember.room_id == room.id
-    ).all()
-    out = [MemberRead(user_id=u.id, username=u.username, role=m.role) for (m,u) in rows]
-    return out
+    return await _members(db, room.id)
 
 @router.get("/rooms/{code}/members", response_model=list[MemberRead])
-def list_members(code: str, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    room = db.query(models.CollabRoom).filter(models.CollabRoom.code == code).first()
+async def list_members(code: str, db: AsyncSession = Depends(get_async_read_db), current_user: dict = Depends(get_current_user)):
+    room = await _room_by_code(db, code)
     if not room:
         raise HTTPException(404, "Salle introuvable")
-    rows = db.query(models.CollabMember, models.User).join(models.User, models.User.id == models.CollabMember.user_id).filter(
-        models.CollabMember.room_id == room.id
-    ).all()
-    return [MemberRead(user_id=u.id, username=u.username, role=m.role) for (m,u) in rows]
+    return await _members(db, room.id)
+
+@router.get("/rooms/{code}/history")
+async def room_history(
+    code: str,
+    response: Response,
+    after_id: Optional[int] = Query(None, ge=1),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: dict = Depends(get_current_user),
+):
+    # chat + présences, du plus récent au plus ancien : tampon mémoire puis base
+    # (au-delà du tampon, seuls les "chat" sont persistés)
+    if not await _room_by_code(db, code):
+        raise HTTPException(404, "Salle introuvable")
+    events = await history.page(code, after_id, limit)
+    set_next_cursor(response, events, limit, lambda e: e["id"])
+    return [{**e, "ts": iso_from_ms(e["ts"])} if isinstance(e.get("ts"), int) else e for e in events]
 
 # ---------- WebSocket ----------
 # Protocole d'événements (JSON):
 # { "type": "chat" , "text": "hello" }
 # { "type": "state", "puzzle_id": 3, "state": {...} }  -- partage d'état (DND/SCHEMA)
-# { "type": "lock" , "puzzle_id": 3 }                   -- verrouiller l'énigme
+# { "type": "state_patch", "puzzle_id": 3, "ops": [{"op": "replace", "path": "/a", "value": 1}] }
+#                                                       -- delta façon JSON Patch (add/replace/remove)
+# { "type": "lock" , "puzzle_id": 3 }                   -- verrouiller l'énigme (bail de MV_LOCK_TTL s,
+#                                                         lock_acquired porte "token" = jeton de fencing)
 # { "type": "unlock", "puzzle_id": 3 }
-# { "type": "ping" }
+# { "type": "ping" }                                   -- le serveur répond "pong" et prolonge les baux
+# { "type": "pong" }                                   -- réponse au "ping" envoyé par le serveur
+#                                                         après MV_WS_IDLE s de silence
+# { "type": "batch", "events": [{...}, {...}] }        -- plusieurs événements en une trame (MV_WS_BATCH_MAX)
+# Débit limité par joueur et par type (utils/rate_limit, surchargeable par salle) :
+# au-delà, le message est ignoré et l'émetteur reçoit
+# { "type": "rate_limited", "message_type": "chat", "dropped": 1, "retry_after_ms": 200 }
 # Broadcast serveur inclut: type, from_user, role, timestamp, etc.
+# "chat", "presence_join" et "presence_leave" portent un "id" croissant ; juste après
+# presence_join la socket reçoit les MV_CHAT_REPLAY derniers, dans l'ordre :
+# { "type": "history", "events": [{ "type": "chat", "id": ..., ... }, ...] }
+# (plus ancien : GET /collab/rooms/{code}/history?after_id=<id>)
+# Encodage négocié par sous-protocole (cf. utils/ws_codec) : JSON texte par défaut,
+# "mv.msgpack.v1" = MessagePack binaire, type en entier, ts en ms epoch.
+# Trame indécodable ou non ré-encodable (MV_WS_MAX_FRAME, MV_WS_MAX_DEPTH, bytes) :
+# { "type": "error", ... } puis fermeture 1007. Message mal formé (type inconnu,
+# puzzle_id non entier...) : { "type": "error", ... }, la socket reste ouverte.
+# À la connexion : { "type": "state_snapshot", "puzzles": {"3": {"version": 4, "state": {...}}} }
+# Les "state" sortants portent "version" et sont regroupés au tick (MV_ROOM_STATE_HZ).
 
 @router.websocket("/ws/{code}")
 async def ws_room(websocket: WebSocket, code: str, token: str = Query(...)):
     # Auth manuelle via token JWT en query (token=BearerToken). Côté front, mets le token brut (sans "Bearer ").
+    # (même cache de tokens vérifiés que les routes HTTP)
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        user_id = payload.get("uid")
-        if not username or not user_id:
-            await websocket.close(code=4401)
-            return
-    except Exception:
+        user = authenticate_token(token)
+    except InvalidToken:
         await websocket.close(code=4401)
         return
+    username, user_id = user["username"], user["user_id"]
 
-    # vérifie que la salle existe
-    from ..database import SessionLocal
-    db = SessionLocal()
-    room = db.query(models.CollabRoom).filter(models.CollabRoom.code == code).first()
-    if not room:
-        await websocket.close(code=4404)
-        db.close()
-        return
+    # vérifie que la salle existe (session async : ne bloque pas les autres salles)
+    async with AsyncReadSessionLocal() as db:
+        room = await _room_by_code(db, code)
+        if not room:
+            await websocket.close(code=4404)
+            return
+        if room.status == "finished":
+            await websocket.close(code=CLOSE_ROOM_FINISHED)
+            return
 
-    # rôle éventuel du membre
-    m = db.query(models.CollabMember).filter(
-        and_(models.CollabMember.room_id == room.id, models.CollabMember.user_id == user_id)
-    ).first()
-    role = m.role if m else None
-    db.close()
+        # rôle éventuel du membre
+        res = await db.execute(select(models.CollabMember.role).where(
+            and_(models.CollabMember.room_id == room.id, models.CollabMember.user_id == user_id)
+        ))
+        role = res.scalars().first()
 
-    await manager.connect(code, websocket, {"user_id": user_id, "username": username, "role": role})
-    await manager.broadcast(code, {"type": "presence_join", "user": username, "role": role, "ts": datetime.utcnow().isoformat()+"Z"})
+    author = {"user_id": user_id, "username": username, "role": role}
+    limiter.configure(code, room.rate_limits)
+    codec = negotiate(websocket.scope.get("subprotocols") or ())
+    await manager.connect(code, websocket, author, codec)
 
-    try:
-        while True:
-            data = await websocket.receive_text()
-            try:
-                msg = json.loads(data)
-            except Exception:
-                await manager.send_personal(websocket, {"type": "error", "message": "JSON invalide"})
-                continue
+    async def handle(msg: dict, mtype: str):
+        ts = now_ms()
+        if mtype in PUZZLE_MESSAGES:
+            pid = _puzzle_id(msg)
+            if pid is None:
+                # "abc", null, [] ... : erreur au client, la socket reste ouverte
+                await manager.send_personal(websocket, {"type": "error", "message": "puzzle_id invalide"})
+                return
 
-            mtype = msg.get("type")
-            nowz = datetime.utcnow().isoformat() + "Z"
-
-            if mtype == "chat":
-                txt = msg.get("text", "")
-                await manager.broadcast(code, {
-                    "type": "chat",
-                    "from": username,
-                    "role": role,
-                    "text": txt,
-                    "ts": nowz
-                })
+        if mtype == "chat":
+            txt = msg.get("text", "")
+            event = {
+                "type": "chat",
+                "id": history.next_id(),
+                "from": username,
+                "role": role,
+                "text": txt,
+                "ts": ts
+            }
+            history.persist(code, event, user_id)
+            await manager.broadcast(code, event)
 
-            elif mtype == "state":
-                # partage d'état d'un puzzle (ex: positions DnD, edges SCHEMA)
-                pid = int(msg.get("puzzle_id", 0))
-                st = msg.get("state", {})
-                await manager.broadcast(code, {
-                    "type": "state",
-                    "from": username,
-                    "role": role,
-                    "puzzle_id": pid,
-                    "state": st,
-                    "ts": nowz
+        elif mtype == "state":
+            # partage d'état d'un puzzle (ex: positions DnD, edges SCHEMA)
+            await room_states.replace(code, pid, msg.get("state", {}), author)
+
+        elif mtype == "state_patch":
+            try:
+                await room_states.patch(code, pid, msg.get("ops") or [], author)
+            except PatchError as e:
+                # on renvoie l'état courant pour que le client se resynchronise
+                st = room_states.get(code, pid)
+                await manager.send_personal(websocket, {
+                    "type": "state_resync", "puzzle_id": pid, "version": st.version,
+                    "state": st.state, "message": str(e)
                 })
 
-            elif mtype == "lock":
-                pid = int(msg.get("puzzle_id", 0))
-                key = (code, pid)
-                if key in ROOM_LOCKS and ROOM_LOCKS[key] != user_id:
-                    await manager.send_personal(websocket, {"type":"lock_denied", "puzzle_id": pid, "locked_by": ROOM_LOCKS[key]})
-                else:
-                    ROOM_LOCKS[key] = user_id
-                    await manager.broadcast(code, {"type":"lock_acquired", "puzzle_id": pid, "by_user": username, "ts": nowz})
-
-            elif mtype == "unlock":
-                pid = int(msg.get("puzzle_id", 0))
-                key = (code, pid)
-                owner = ROOM_LOCKS.get(key)
-                if owner in (None, user_id):
-                    ROOM_LOCKS.pop(key, None)
-                    await manager.broadcast(code, {"type":"lock_released", "puzzle_id": pid, "by_user": username, "ts": nowz})
-                else:
-                    await manager.send_personal(websocket, {"type":"unlock_denied", "puzzle_id": pid})
-
-            elif mtype == "ping":
-                await manager.send_personal(websocket, {"type":"pong", "ts": nowz})
+        elif mtype == "lock":
+            lease = await locks.acquire(websocket, code, pid, user_id)
+            if lease.user_id != user_id:
+                await manager.send_personal(websocket, {"type":"lock_denied", "puzzle_id": pid, "locked_by": lease.user_id})
+            else:
+                await manager.broadcast(code, {"type":"lock_acquired", "puzzle_id": pid, "by_user": username,
+                                               "token": lease.token, "ttl": locks.ttl, "ts": ts})
 
+        elif mtype == "unlock":
+            if await locks.release(websocket, code, pid, user_id):
+                await manager.broadcast(code, {"type":"lock_released", "puzzle_id": pid, "by_user": username, "ts": ts})
             else:
+                await manager.send_personal(websocket, {"type":"unlock_denied", "puzzle_id": pid})
+
+        elif mtype == "ping":
+            await locks.renew(websocket)
+            await manager.send_personal(websocket, {"type":"pong", "ts": ts})
+
+        elif mtype == "pong":
+            pass  # signe de vie déjà noté par manager.received
+
+        else:
+            await manager.send_personal(websocket, {"type":"error", "message":"type inconnu"})
+
+    try:
+        # dès la connexion acceptée : toute erreur passe par le finally (socket, verrous, présence)
+        await room_states.start(manager.broadcast)
+        backlog = await history.replay(code)
+        await manager.broadcast(code, {"type": "presence_join", "id": history.next_id(), "user": username, "role": role, "ts": now_ms()})
+        if backlog:
+            await manager.send_personal(websocket, {"type": "history", "events": backlog})
+        await manager.send_personal(websocket, {"type": "state_snapshot", "puzzles": room_states.snapshot(code)})
+
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            manager.received(websocket)
+            try:
+                msg = codec.decode(frame["text"] if frame.get("text") is not None else frame.get("bytes") or b"")
+            except CodecError as e:
+                # trame non ré-encodable (profondeur, taille, bytes...) : on coupe
+                await manager.close_with_error(websocket, {"type": "error", "message": f"{codec.label} invalide : {e}"},
+                                               CLOSE_INVALID_PAYLOAD)
+                break
+
+            mtype = msg.get("type")
+            if not isinstance(mtype, str):
                 await manager.send_personal(websocket, {"type":"error", "message":"type inconnu"})
+                continue
+
+            if mtype == "batch":
+                # plusieurs événements dans une trame : jetons pris par type pour tout le lot
+                events = msg.get("events")
+                if not isinstance(events, list) or len(events) > WS_BATCH_MAX:
+                    await manager.send_personal(websocket, {"type":"error", "message": f"batch : liste de {WS_BATCH_MAX} événements max"})
+                    continue
+                events = [e for e in events if isinstance(e, dict) and isinstance(e.get("type"), str) and e["type"] != "batch"]
+                allowed = {}
+                for t, n in Counter(e["type"] for e in events).items():
+                    allowed[t], reply = limiter.allow(code, user_id, t, n)
+                    if reply:
+                        await manager.send_personal(websocket, reply)
+                for e in events:
+                    if allowed[e["type"]] > 0:
+                        allowed[e["type"]] -= 1
+                        await handle(e, e["type"])
+                continue
+
+            granted, reply = limiter.allow(code, user_id, mtype)
+            if reply:
+                await manager.send_personal(websocket, reply)
+            if granted:
+                await handle(msg, mtype)
     except WebSocketDisconnect:
+        pass
+    finally:
+        # toute sortie (déconnexion, erreur, fermeture par le reaper) libère la socket
         await manager.disconnect(code, websocket)
-        await manager.broadcast(code, {"type": "presence_leave", "user": username, "ts": datetime.utcnow().isoformat()+"Z"})
+        ts = now_ms()
+        for lease in await locks.release_all(websocket):
+            await manager.broadcast(code, {"type":"lock_released", "puzzle_id": lease.puzzle_id, "by_user": username,
+                                           "token": lease.token, "reason": "disconnect", "ts": ts})
+        await manager.broadcast(code, {"type": "presence_leave", "id": history.next_id(), "user": username, "ts": ts})
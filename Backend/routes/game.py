@@ -3,14 +3,23 @@ from __future__ import annotations
 
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
-from ..database import get_db
+from ..database import engine, get_db, get_read_db, get_async_read_db
+from ..game.grading import invalidate_grader
+from ..game.rescore import RescoreWorker, create_job
+from ..utils import catalog_cache
+from ..utils.pagination import PAGE_MAX, keyset, ndjson_response, page_limit, wants_ndjson
 
 router = APIRouter()
 
+# re-correction de fond (démarrée par le lifespan de main.py)
+rescore = RescoreWorker(engine)
+
 
 # ============== CRUD Puzzles ==============
 
@@ -27,77 +36,97 @@ def create_puzzle(p: schemas.PuzzleCreate, db: Session = Depends(get_db)):
     db.add(obj)
     db.commit()
     db.refresh(obj)
+    invalidate_grader(obj.id)
+    catalog_cache.invalidate_puzzles([obj.id], [obj.mission_id])
     return obj
 
 
+@router.put("/puzzles/{puzzle_id}", response_model=schemas.PuzzleOut)
+def update_puzzle(puzzle_id: int, p: schemas.PuzzleCreate, response: Response, db: Session = Depends(get_db)):
+    obj = db.get(models.Puzzle, puzzle_id)
+    if not obj:
+        raise HTTPException(status_code=404, detail="Puzzle introuvable")
+    old_mission_id = obj.mission_id
+    regrade = (obj.type, obj.solution, obj.max_score) != (p.type, p.solution, p.max_score)
+    obj.mission_id = p.mission_id
+    obj.title = p.title
+    obj.type = p.type
+    obj.payload = p.payload
+    obj.solution = p.solution
+    obj.max_score = p.max_score
+    # les autres workers voient la nouvelle révision et recompilent leur correcteur
+    obj.revision = models.Puzzle.revision + 1
+    db.commit()
+    db.refresh(obj)
+    invalidate_grader(obj.id)
+    catalog_cache.invalidate_puzzles([obj.id], [old_mission_id, obj.mission_id])
+    if regrade:
+        # les scores déjà obtenus sont recalculés en tâche de fond
+        response.headers["X-Rescore-Job"] = str(create_job(engine, obj.id))
+        rescore.notify()
+    return obj
+
+
+# ============== Re-correction ==============
+
+@router.post("/puzzles/{puzzle_id}/rescore", status_code=status.HTTP_202_ACCEPTED)
+async def rescore_puzzle(puzzle_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    if not await db.get(models.Puzzle, puzzle_id):
+        raise HTTPException(status_code=404, detail="Puzzle introuvable")
+    return await rescore.status(await rescore.enqueue(puzzle_id))
+
+
+@router.get("/rescore/{job_id}")
+async def rescore_status(job_id: int):
+    return _job_or_404(await rescore.status(job_id))
+
+
+@router.post("/rescore/{job_id}/cancel")
+async def rescore_cancel(job_id: int):
+    return _job_or_404(await rescore.cancel(job_id))
+
+
+@router.post("/rescore/{job_id}/resume")
+async def rescore_resume(job_id: int):
+    return _job_or_404(await rescore.resume(job_id))
+
+
+def _job_or_404(job):
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job introuvable")
+    return job
+
+
 @router.get("/puzzles", response_model=list[schemas.PuzzleOut])
-def list_puzzles(mission_id: Optional[int] = None, db: Session = Depends(get_db)):
-    q = db.query(models.Puzzle)
+def list_puzzles(
+    request: Request,
+    mission_id: Optional[int] = None,
+    after_id: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX),
+    db: Session = Depends(get_read_db),
+):
+    stmt = select(models.Puzzle)
     if mission_id is not None:
-        q = q.filter(models.Puzzle.mission_id == mission_id)
-    return q.order_by(models.Puzzle.created_at.desc()).all()
+        stmt = stmt.where(models.Puzzle.mission_id == mission_id)
+    if wants_ndjson(request):
+        return ndjson_response(keyset(stmt, models.Puzzle.id, after_id, limit), schemas.PuzzleOut.model_validate)
+    limit = page_limit(limit, after_id)
+    return catalog_cache.cached_response(
+        request, catalog_cache.puzzles_key(mission_id) + (after_id, limit), list[schemas.PuzzleOut],
+        lambda: db.scalars(keyset(stmt, models.Puzzle.id, after_id, limit)).all(),
+        limit,
+    )
 
 
 @router.get("/puzzles/{puzzle_id}", response_model=schemas.PuzzleOut)
-def get_puzzle(puzzle_id: int, db: Session = Depends(get_db)):
-    p = db.query(models.Puzzle).get(puzzle_id)  # OK pour SQLAlchemy 1.4
-    # (si tu es en SQLAlchemy 2.x: p = db.get(models.Puzzle, puzzle_id))
-    if not p:
-        raise HTTPException(status_code=404, detail="Puzzle introuvable")
-    return p
-
-
-# ============== Soumission d'une réponse ==============
-
-@router.post("/submit", response_model=schemas.SubmissionOut)
-def submit_answer(sub: schemas.SubmissionIn, db: Session = Depends(get_db)):
-    """
-    body attendu:
-    {
-      "puzzle_id": 123,
-      "answer": { ... }   # selon le type du puzzle
-    }
-    """
-    puzzle = db.query(models.Puzzle).get(sub.puzzle_id)
-    if not puzzle:
-        raise HTTPException(status_code=404, detail="Puzzle not found")
-
-    answer = sub.answer or {}
-    sol = puzzle.solution or {}
-    correct = False
-    feedback = ""
-
-    if puzzle.type in ("QUIZ", "IMG_QUIZ"):
-        # solution.correct = [indices]
-        expected = set(sol.get("correct", []))
-        got = set(answer.get("selected", []))
-        correct = expected == got
-
-    elif puzzle.type == "CODE":
-        exp = (sol.get("text") or "").strip()
-        acc = [exp] + [*(sol.get("accepted") or [])]
-        got = str(answer.get("text", "")).strip()
-        if sol.get("case_insensitive", True):
-            acc = [a.lower() for a in acc]
-            got = got.lower()
-        correct = got in acc
-
-    elif puzzle.type == "DND":
-        # mapping exact attendu
-        correct = (sol.get("mapping") or {}) == (answer.get("targets") or {})
-
-    elif puzzle.type == "SCHEMA":
-        # edges = liste de paires ordonnées
-        correct = (sol.get("edges") or []) == (answer.get("edges") or [])
-
-    elif puzzle.type == "IMG_RECON":
-        # ordre final (ex: [0..n-1])
-        correct = (sol.get("order") or []) == (answer.get("order") or [])
-
-    earned = puzzle.max_score if correct else 0
-    return schemas.SubmissionOut(
-        puzzle_id=sub.puzzle_id,
-        correct=correct,
-        earned_score=earned,
-        feedback=feedback,
+def get_puzzle(puzzle_id: int, request: Request, db: Session = Depends(get_read_db)):
+    def load():
+        p = db.query(models.Puzzle).get(puzzle_id)  # OK pour SQLAlchemy 1.4
+        # (si tu es en SQLAlchemy 2.x: p = db.get(models.Puzzle, puzzle_id))
+        if not p:
+            raise HTTPException(status_code=404, detail="Puzzle introuvable")
+        return p
+    return catalog_cache.cached_response(
+        request, catalog_cache.puzzle_key(puzzle_id), schemas.PuzzleOut, load
     )
+
@@ -1,10 +1,15 @@
 # Backend/routes/missions.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from ..database import get_db
+from ..database import engine, get_db, get_read_db
 from .. import models, schemas
+from ..utils import catalog_cache, content_pack
+from ..utils.security import get_current_user
+from ..utils.pagination import PAGE_MAX, keyset, ndjson_response, page_limit, wants_ndjson
 
 router = APIRouter()
 
@@ -14,20 +19,57 @@ def create_mission(payload: schemas.MissionCreate, db: Session = Depends(get_db)
     db.add(m)
     db.commit()
     db.refresh(m)
+    catalog_cache.catalog.invalidate(catalog_cache.MISSIONS)
     return m
 
+# Import en masse d'un pack (JSON ou JSONL), cf. utils/content_pack.py
+@router.post("/import")
+async def import_content_pack(
+    request: Request,
+    dry_run: bool = False,
+    chunk_size: int = Query(content_pack.CHUNK_SIZE, ge=1, le=10_000),
+    current_user: dict = Depends(get_current_user),
+):
+    try:
+        raw = content_pack.parse_pack((await request.body()).decode("utf-8"))
+        report = await run_in_threadpool(content_pack.import_pack, engine, raw, dry_run, chunk_size)
+    except content_pack.PackError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Pack non UTF-8")
+    if not dry_run and (report.missions_inserted or report.puzzles_inserted):
+        catalog_cache.catalog.clear()
+    return report.as_dict()
+
 @router.get("/", response_model=List[schemas.MissionOut])
-def list_missions(db: Session = Depends(get_db)):
-    return db.query(models.Mission).order_by(models.Mission.created_at.desc()).all()
+def list_missions(
+    request: Request,
+    after_id: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX),
+    db: Session = Depends(get_read_db),
+):
+    stmt = select(models.Mission)
+    if wants_ndjson(request):
+        return ndjson_response(keyset(stmt, models.Mission.id, after_id, limit), schemas.MissionOut.model_validate)
+    limit = page_limit(limit, after_id)
+    return catalog_cache.cached_response(
+        request, catalog_cache.MISSIONS + (after_id, limit), List[schemas.MissionOut],
+        lambda: db.scalars(keyset(stmt, models.Mission.id, after_id, limit)).all(),
+        limit,
+    )
 
 @router.get("/{mission_id}/puzzles", response_model=List[schemas.PuzzleOut])
-def list_puzzles_for_mission(mission_id: int, db: Session = Depends(get_db)):
-    mission = db.query(models.Mission).get(mission_id)
-    if not mission:
-        raise HTTPException(status_code=404, detail="Mission introuvable")
-    return (
-        db.query(models.Puzzle)
-        .filter(models.Puzzle.mission_id == mission_id)
-        .order_by(models.Puzzle.id.asc())
-        .all()
+def list_puzzles_for_mission(mission_id: int, request: Request, db: Session = Depends(get_read_db)):
+    def load():
+        mission = db.query(models.Mission).get(mission_id)
+        if not mission:
+            raise HTTPException(status_code=404, detail="Mission introuvable")
+        return (
+            db.query(models.Puzzle)
+            .filter(models.Puzzle.mission_id == mission_id)
+            .order_by(models.Puzzle.id.asc())
+            .all()
+        )
+    return catalog_cache.cached_response(
+        request, catalog_cache.mission_puzzles_key(mission_id), List[schemas.PuzzleOut], load
     )
@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func
-from ..database import get_db
+from typing import Optional
+from ..database import get_read_db, get_async_db, get_async_read_db
 from .. import models
+from ..utils import leaderboard
+from ..utils.pagination import PAGE_MAX, keyset, ndjson_response, page_limit, set_next_cursor, wants_ndjson
 from ..utils.security import (
-    hash_password,
-    verify_password,
+    hash_password_async,
+    verify_and_update_password_async,
     create_access_token,
     get_current_user,
+    oauth2_scheme,
+    revoke_token,
 )
 from ..schemas import UserCreate, UserLogin, UserRead, Token
 
@@ -16,34 +22,61 @@ router = APIRouter(prefix="/users", tags=["users"])
 
 # Enregistrement d'un nouvel utilisateur
 @router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
-def register(payload: UserCreate, db: Session = Depends(get_db)):
-    user = models.User(username=payload.username, password_hash=hash_password(payload.password))
+async def register(payload: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    # bcrypt tourne dans le pool dédié : la boucle reste libre
+    user = models.User(username=payload.username, password_hash=await hash_password_async(payload.password))
     try:
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.flush()
+        await db.run_sync(leaderboard.ensure_user_row, user.id)
+        await db.commit()
+        await db.refresh(user)
         return user
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Ce nom d'utilisateur existe déjà.")
 
 # Connexion utilisateur et génération du token
 @router.post("/login", response_model=Token)
-def login(payload: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == payload.username).first()
-    if not user or not verify_password(payload.password, user.password_hash):
+async def login(payload: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(models.User).where(models.User.username == payload.username))).scalars().first()
+    if not user:
+        raise HTTPException(status_code=401, detail="Identifiants invalides.")
+    ok, new_hash = await verify_and_update_password_async(payload.password, user.password_hash)
+    if not ok:
         raise HTTPException(status_code=401, detail="Identifiants invalides.")
+    if new_hash:
+        # coût bcrypt modifié (MV_BCRYPT_ROUNDS) : rehash transparent
+        user.password_hash = new_hash
+        await db.commit()
     token = create_access_token({"sub": user.username, "uid": user.id})
     return {"access_token": token, "token_type": "bearer"}
 
+# Déconnexion : le token est révoqué jusqu'à son expiration
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(token: str = Depends(oauth2_scheme), current_user: dict = Depends(get_current_user)):
+    revoke_token(token)
+
 # Liste de tous les utilisateurs
 @router.get("", response_model=list[UserRead])
-def list_users(db: Session = Depends(get_db)):
-    return db.query(models.User).order_by(models.User.created_at.desc()).all()
+def list_users(
+    request: Request,
+    response: Response,
+    after_id: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX),
+    db: Session = Depends(get_read_db),
+):
+    # page par curseur (id décroissant) ; export complet en NDJSON
+    if wants_ndjson(request):
+        return ndjson_response(keyset(select(models.User), models.User.id, after_id, limit), UserRead.model_validate)
+    limit = page_limit(limit, after_id, 100)
+    users = db.scalars(keyset(select(models.User), models.User.id, after_id, limit)).all()
+    set_next_cursor(response, users, limit, lambda u: u.id)
+    return users
 
 # Route protégée : profil utilisateur courant
 @router.get("/me", response_model=UserRead)
-def read_current_user(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def read_current_user(current_user: dict = Depends(get_current_user), db: Session = Depends(get_read_db)):
     user = db.query(models.User).filter(models.User.id == current_user["user_id"]).first()
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable.")
@@ -53,25 +86,29 @@ def read_current_user(current_user: dict = Depends(get_current_user), db: Sessio
 
 # 🧩 Route : obtenir le score total du joueur connecté
 @router.get("/score_total")
-def get_user_total_score(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    total_score = db.query(func.sum(models.PlayerMission.score)).filter(
-        models.PlayerMission.user_id == current_user["user_id"]
-    ).scalar() or 0
+def get_user_total_score(current_user: dict = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    row = db.get(models.UserTotal, current_user["user_id"])
+    total_score = row.total_score if row else 0
     return {"user_id": current_user["user_id"], "username": current_user["username"], "total_score": total_score}
 
 
-# 🏆 Route : classement global des joueurs
+# 🏆 Route : classement global des joueurs (top-K depuis user_totals)
 @router.get("/leaderboard")
-def get_leaderboard(db: Session = Depends(get_db)):
-    leaderboard = (
-        db.query(
-            models.User.username,
-            func.coalesce(func.sum(models.PlayerMission.score), 0).label("total_score")
-        )
-        .outerjoin(models.PlayerMission, models.User.id == models.PlayerMission.user_id)
-        .group_by(models.User.username)
-        .order_by(func.sum(models.PlayerMission.score).desc())
-        .all()
-    )
+async def get_leaderboard(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX),
+    offset: int = Query(0, ge=0),
+    after_id: Optional[int] = Query(None, ge=1, description="user_id de la dernière ligne reçue"),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    if wants_ndjson(request):
+        return ndjson_response(leaderboard.top_stmt(limit, offset, after_id), _leaderboard_row, scalars=False)
+    limit = page_limit(limit, after_id, 100)
+    rows = await db.run_sync(leaderboard.top, limit, offset, after_id)
+    set_next_cursor(response, rows, limit, lambda r: r.user_id)
+    return [_leaderboard_row(row) for row in rows]
+
 
-    return [{"username": row.username, "total_score": row.total_score or 0} for row in leaderboard]
+def _leaderboard_row(row) -> dict:
+    return {"user_id": row.user_id, "username": row.username, "total_score": row.total_score}
@@ -126,8 +126,14 @@ class SubmissionOut(BaseModel):
 # =========================
 # Collaboration / Salles
 # =========================
+class RateLimitIn(BaseModel):
+    rate: float = Field(..., gt=0, description="messages/s")
+    burst: Optional[float] = Field(None, ge=1, description="rafale (défaut: rate)")
+
 class CollabRoomCreate(BaseModel):
     duration_seconds: int = 1200  # 20 min
+    # limites de débit WebSocket par type de message ("*" = autres), ex: {"chat": {"rate": 2, "burst": 5}}
+    rate_limits: Optional[Dict[str, RateLimitIn]] = None
 
 class CollabRoomRead(BaseModel):
     id: int
@@ -135,6 +141,7 @@ class CollabRoomRead(BaseModel):
     status: str
     started_at: datetime
     expires_at: Optional[str] = None
+    rate_limits: Optional[Dict[str, Any]] = None
     model_config = {"from_attributes": True}
 
 class JoinRoomIn(BaseModel):
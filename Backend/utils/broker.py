@@ -0,0 +1,328 @@
+# Backend/utils/broker.py
+# Bus pub/sub des salles collab + table des baux (leases) de verrous d'énigmes.
+# Un bail = (détenteur, jeton de fencing croissant, échéance time.time()) ;
+# un bail échu est libre pour le suivant (cf. lock_manager pour l'expiration).
+#  - InMemoryBroker : un seul process (comportement historique)
+#  - SqliteBroker   : partagé entre N workers uvicorn d'une même machine
+# Choix par MV_WS_BROKER=memory|sqlite (fichier : MV_WS_BUS_PATH).
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+Deliver = Callable[[str, dict], Awaitable[None]]
+LeaseRow = tuple[int, int, float]  # (user_id, token, expires)
+
+log = logging.getLogger("mission_vitale.collab")
+
+
+class Broker:
+    """Interface : publish() diffuse à tous les workers, deliver() livre localement."""
+
+    async def start(self, deliver: Deliver) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    async def publish(self, room_code: str, message: dict) -> None:
+        raise NotImplementedError
+
+    async def acquire_lock(self, room_code: str, puzzle_id: int, user_id: int, ttl: float) -> LeaseRow:
+        """Tente de verrouiller pour ttl s ; retourne le bail en cours
+        (détenteur == user_id si obtenu ; même jeton si déjà détenu, prolongé)."""
+        raise NotImplementedError
+
+    async def release_lock(self, room_code: str, puzzle_id: int, user_id: int) -> bool:
+        """Libère si user_id détient le verrou (ou s'il est libre)."""
+        raise NotImplementedError
+
+    async def renew_locks(self, leases: list[tuple[str, int, int]], ttl: float) -> list[Optional[float]]:
+        """Prolonge les baux (room, puzzle_id, token) ; None pour un bail perdu."""
+        raise NotImplementedError
+
+    async def drop_lock(self, room_code: str, puzzle_id: int, token: int, expired_only: bool = False) -> bool:
+        """Supprime le bail s'il porte encore ce jeton (et est échu si expired_only)."""
+        raise NotImplementedError
+
+    async def purge_locks(self, finished: set[str], live: dict[str, set[int]]) -> int:
+        """Supprime les verrous orphelins ; retourne leur nombre."""
+        return 0
+
+
+class InMemoryBroker(Broker):
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+        # key: (room_code, puzzle_id) -> (user_id, token, expires)
+        self.locks: dict[tuple[str, int], LeaseRow] = {}
+        self._tokens = itertools.count(1)
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def publish(self, room_code: str, message: dict) -> None:
+        if self._deliver is not None:
+            await self._deliver(room_code, message)
+
+    async def acquire_lock(self, room_code: str, puzzle_id: int, user_id: int, ttl: float) -> LeaseRow:
+        key = (room_code, puzzle_id)
+        now = time.time()
+        cur = self.locks.get(key)
+        if cur is None or cur[2] <= now:
+            cur = self.locks[key] = (user_id, next(self._tokens), now + ttl)
+        elif cur[0] == user_id:
+            cur = self.locks[key] = (user_id, cur[1], now + ttl)
+        return cur
+
+    async def release_lock(self, room_code: str, puzzle_id: int, user_id: int) -> bool:
+        key = (room_code, puzzle_id)
+        cur = self.locks.get(key)
+        if cur is None or cur[0] == user_id or cur[2] <= time.time():
+            self.locks.pop(key, None)
+            return True
+        return False
+
+    async def renew_locks(self, leases: list[tuple[str, int, int]], ttl: float) -> list[Optional[float]]:
+        now = time.time()
+        out: list[Optional[float]] = []
+        for room_code, puzzle_id, token in leases:
+            cur = self.locks.get((room_code, puzzle_id))
+            if cur is None or cur[1] != token or cur[2] <= now:
+                out.append(None)
+                continue
+            self.locks[(room_code, puzzle_id)] = (cur[0], token, now + ttl)
+            out.append(now + ttl)
+        return out
+
+    async def drop_lock(self, room_code: str, puzzle_id: int, token: int, expired_only: bool = False) -> bool:
+        key = (room_code, puzzle_id)
+        cur = self.locks.get(key)
+        if cur is None or cur[1] != token or (expired_only and cur[2] > time.time()):
+            return False
+        del self.locks[key]
+        return True
+
+    async def purge_locks(self, finished: set[str], live: dict[str, set[int]]) -> int:
+        # un seul process : tout détenteur absent de la salle est parti
+        orphans = [
+            key for key, (holder, _, _) in self.locks.items()
+            if key[0] in finished or holder not in live.get(key[0], ())
+        ]
+        for key in orphans:
+            del self.locks[key]
+        return len(orphans)
+
+
+class SqliteBroker(Broker):
+    """Bus inter-process adossé à un fichier SQLite (WAL) : chaque worker insère
+    ses messages et relit ceux des autres par id croissant."""
+
+    def __init__(self, path: str, poll_interval: float = 0.02, retention: float = 60.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.origin = uuid.uuid4().hex
+        self._deliver: Optional[Deliver] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._last_id = 0
+
+    # -- accès SQLite (exécuté dans un thread) --
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")  # bus éphémère, pas besoin de durabilité
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ws_bus ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, room TEXT NOT NULL,"
+            " origin TEXT NOT NULL, payload TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ws_leases ("
+            " room TEXT NOT NULL, puzzle_id INTEGER NOT NULL, user_id INTEGER NOT NULL,"
+            " token INTEGER NOT NULL, expires REAL NOT NULL, PRIMARY KEY (room, puzzle_id))"
+        )
+        # AUTOINCREMENT : jetons jamais réutilisés, même après DELETE
+        conn.execute("CREATE TABLE IF NOT EXISTS ws_lock_tokens (id INTEGER PRIMARY KEY AUTOINCREMENT)")
+        return conn
+
+    def _run(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _tx(self, fn):
+        # transaction d'écriture (BEGIN IMMEDIATE : sérialisée entre workers)
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return result
+
+    def _acquire(self, room_code: str, puzzle_id: int, user_id: int, ttl: float) -> LeaseRow:
+        def run(c):
+            now = time.time()
+            key = (room_code, puzzle_id)
+            c.execute("DELETE FROM ws_leases WHERE room = ? AND puzzle_id = ? AND expires <= ?", (*key, now))
+            row = c.execute(
+                "SELECT user_id, token, expires FROM ws_leases WHERE room = ? AND puzzle_id = ?", key
+            ).fetchone()
+            if row is None:
+                token = c.execute("INSERT INTO ws_lock_tokens DEFAULT VALUES").lastrowid
+                c.execute("DELETE FROM ws_lock_tokens WHERE id < ?", (token,))
+                row = (user_id, token, now + ttl)
+                c.execute("INSERT INTO ws_leases (room, puzzle_id, user_id, token, expires) VALUES (?, ?, ?, ?, ?)",
+                          (*key, *row))
+            elif row[0] == user_id:
+                row = (user_id, row[1], now + ttl)
+                c.execute("UPDATE ws_leases SET expires = ? WHERE room = ? AND puzzle_id = ?", (row[2], *key))
+            return tuple(row)
+        return self._tx(run)
+
+    def _purge_rooms(self, rooms: list[str]) -> int:
+        with self._db_lock:
+            cur = self._conn.execute(
+                f"DELETE FROM ws_leases WHERE room IN ({','.join('?' * len(rooms))})", rooms
+            )
+        return cur.rowcount
+
+    def _release(self, room_code: str, puzzle_id: int, user_id: int) -> bool:
+        with self._db_lock:
+            self._conn.execute(
+                "DELETE FROM ws_leases WHERE room = ? AND puzzle_id = ? AND (user_id = ? OR expires <= ?)",
+                (room_code, puzzle_id, user_id, time.time()),
+            )
+            row = self._conn.execute(
+                "SELECT 1 FROM ws_leases WHERE room = ? AND puzzle_id = ?", (room_code, puzzle_id)
+            ).fetchone()
+        return row is None
+
+    def _renew(self, leases: list[tuple[str, int, int]], ttl: float) -> list[Optional[float]]:
+        def run(c):
+            now = time.time()
+            out: list[Optional[float]] = []
+            for room_code, puzzle_id, token in leases:
+                cur = c.execute(
+                    "UPDATE ws_leases SET expires = ? WHERE room = ? AND puzzle_id = ? AND token = ? AND expires > ?",
+                    (now + ttl, room_code, puzzle_id, token, now),
+                )
+                out.append(now + ttl if cur.rowcount else None)
+            return out
+        return self._tx(run)
+
+    def _drop(self, room_code: str, puzzle_id: int, token: int, expired_only: bool) -> bool:
+        with self._db_lock:
+            cur = self._conn.execute(
+                "DELETE FROM ws_leases WHERE room = ? AND puzzle_id = ? AND token = ? AND expires <= ?",
+                (room_code, puzzle_id, token, time.time() if expired_only else float("inf")),
+            )
+        return cur.rowcount > 0
+
+    # -- API async --
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+        if self._task is not None:
+            return
+        self._conn = await asyncio.to_thread(self._open)
+        rows = await asyncio.to_thread(self._run, "SELECT COALESCE(MAX(id), 0) FROM ws_bus")
+        self._last_id = rows[0][0]
+        self._task = asyncio.create_task(self._poll_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def publish(self, room_code: str, message: dict) -> None:
+        payload = json.dumps(message, ensure_ascii=False)
+        await asyncio.to_thread(
+            self._run,
+            "INSERT INTO ws_bus (room, origin, payload, created) VALUES (?, ?, ?, ?)",
+            (room_code, self.origin, payload, time.time()),
+        )
+        # livraison locale immédiate ; les autres workers la liront au prochain poll
+        if self._deliver is not None:
+            await self._deliver(room_code, message)
+
+    async def acquire_lock(self, room_code: str, puzzle_id: int, user_id: int, ttl: float) -> LeaseRow:
+        return await asyncio.to_thread(self._acquire, room_code, puzzle_id, user_id, ttl)
+
+    async def release_lock(self, room_code: str, puzzle_id: int, user_id: int) -> bool:
+        return await asyncio.to_thread(self._release, room_code, puzzle_id, user_id)
+
+    async def renew_locks(self, leases: list[tuple[str, int, int]], ttl: float) -> list[Optional[float]]:
+        return await asyncio.to_thread(self._renew, leases, ttl)
+
+    async def drop_lock(self, room_code: str, puzzle_id: int, token: int, expired_only: bool = False) -> bool:
+        return await asyncio.to_thread(self._drop, room_code, puzzle_id, token, expired_only)
+
+    async def purge_locks(self, finished: set[str], live: dict[str, set[int]]) -> int:
+        # les détenteurs peuvent être connectés à un autre worker : seules les
+        # salles terminées sont purgées ici
+        if not finished:
+            return 0
+        return await asyncio.to_thread(self._purge_rooms, sorted(finished))
+
+    async def _poll_loop(self) -> None:
+        last_purge = time.monotonic()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                rows = await asyncio.to_thread(
+                    self._run,
+                    "SELECT id, room, origin, payload FROM ws_bus WHERE id > ? ORDER BY id",
+                    (self._last_id,),
+                )
+                for row_id, room_code, origin, payload in rows:
+                    self._last_id = row_id  # avancé avant : un message fautif est sauté
+                    if origin != self.origin and self._deliver is not None:
+                        try:
+                            await self._deliver(room_code, json.loads(payload))
+                        except asyncio.CancelledError:
+                            raise
+                        except Exception:
+                            log.exception("livraison du message %s (salle %s) impossible", row_id, room_code)
+                if time.monotonic() - last_purge > self.retention:
+                    last_purge = time.monotonic()
+                    await asyncio.to_thread(
+                        self._run, "DELETE FROM ws_bus WHERE created < ?", (time.time() - self.retention,)
+                    )
+            except sqlite3.OperationalError:
+                # base momentanément verrouillée : on retentera au prochain tour
+                continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # la diffusion inter-workers ne doit jamais s'arrêter
+                log.exception("lecture du bus ws_bus")
+
+
+def broker_from_env() -> Broker:
+    kind = os.getenv("MV_WS_BROKER", "memory")
+    if kind == "sqlite":
+        return SqliteBroker(
+            os.getenv("MV_WS_BUS_PATH", "./ws_bus.db"),
+            poll_interval=float(os.getenv("MV_WS_BUS_POLL_MS", "20")) / 1000,
+        )
+    if kind != "memory":
+        raise ValueError(f"MV_WS_BROKER inconnu: {kind!r} (memory | sqlite)")
+    return InMemoryBroker()
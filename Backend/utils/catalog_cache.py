@@ -0,0 +1,158 @@
+# Backend/utils/catalog_cache.py
+# Cache des lectures du catalogue (missions, puzzles) : on garde les octets
+# JSON déjà sérialisés et un ETag fort par ressource. If-None-Match -> 304.
+# Invalidation ciblée par les routes d'écriture (create/update) ; LRU borné
+# (MV_CATALOG_CACHE_SIZE entrées, les pages after_id/limit comprises) et TTL
+# (MV_CATALOG_TTL s).
+# Cache par process : une écriture n'invalide que le worker qui l'a servie
+# (de même un import CLI, utils/content_pack, n'en invalide aucun). Les autres
+# workers servent l'ancien corps, et un 304 à qui présente l'ancien ETag,
+# jusqu'à MV_CATALOG_TTL s au plus. MV_CATALOG_TTL=0 : ETag recalculé depuis
+# la base à chaque lecture (304 toujours exact, plus de cache des octets).
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from .pagination import NEXT_HEADER
+
+# max-age côté navigateur ; 0 = revalidation à chaque lecture (304 bon marché)
+CATALOG_MAX_AGE = int(os.getenv("MV_CATALOG_MAX_AGE", "0"))
+CACHE_CONTROL = f"public, max-age={CATALOG_MAX_AGE}, must-revalidate"
+CATALOG_CACHE_SIZE = int(os.getenv("MV_CATALOG_CACHE_SIZE", "512"))
+CATALOG_TTL = float(os.getenv("MV_CATALOG_TTL", "5"))
+
+Entry = Tuple[bytes, str, dict]  # (corps JSON, ETag, en-têtes)
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # comparaison faible (RFC 9110 §13.1.2) : on ignore un éventuel W/
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class CatalogCache:
+    def __init__(self, maxsize: int = CATALOG_CACHE_SIZE, ttl: float = CATALOG_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # clé -> (entrée, échéance monotonic)
+        self._data: OrderedDict[tuple, Tuple[Entry, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        # incrémenté à chaque invalidation : une lecture commencée avant
+        # n'écrase pas le cache avec un état périmé
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: tuple) -> Optional[Entry]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] <= time.monotonic():
+                del self._data[key]  # expirée : relue en base
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: tuple, body: bytes, generation: int, headers: Optional[dict] = None) -> Entry:
+        entry = (body, make_etag(body), headers or {})
+        with self._lock:
+            if generation == self.generation:
+                self._data[key] = (entry, time.monotonic() + self.ttl)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return entry
+
+    def invalidate(self, *keys: tuple) -> None:
+        # une clé couvre aussi ses pages : ("missions",) -> ("missions", after_id, limit)
+        with self._lock:
+            self.generation += 1
+            for key in [k for k in self._data if any(k[:len(p)] == p for p in keys)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits,
+                    "misses": self.misses, "not_modified": self.not_modified}
+
+
+catalog = CatalogCache()
+
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def _adapter(schema) -> TypeAdapter:
+    adapter = _adapters.get(schema)
+    if adapter is None:
+        adapter = _adapters[schema] = TypeAdapter(schema)
+    return adapter
+
+
+def cached_response(request: Request, key: tuple, schema, load: Callable[[], Any], limit: Optional[int] = None) -> Response:
+    """Réponse JSON servie depuis le cache ; load() n'est appelé qu'en cas de miss.
+    Avec limit, une page pleine porte le curseur suivant (X-Next-After-Id).
+    L'ETag est celui du cache de ce worker (péremption bornée par MV_CATALOG_TTL)."""
+    entry = catalog.get(key)
+    if entry is None:
+        generation = catalog.generation
+        adapter = _adapter(schema)
+        data = adapter.validate_python(load(), from_attributes=True)
+        extra = {}
+        if limit is not None and data and len(data) == limit:
+            extra[NEXT_HEADER] = str(data[-1].id)
+        entry = catalog.put(key, adapter.dump_json(data), generation, extra)
+    body, etag, extra = entry
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, **extra}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        catalog.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# -------- Clés --------
+MISSIONS = ("missions",)
+
+
+def mission_puzzles_key(mission_id: int) -> tuple:
+    return ("mission_puzzles", mission_id)
+
+
+def puzzles_key(mission_id: Optional[int] = None) -> tuple:
+    return ("puzzles", mission_id)
+
+
+def puzzle_key(puzzle_id: int) -> tuple:
+    return ("puzzle", puzzle_id)
+
+
+def invalidate_puzzles(puzzle_ids: Iterable[int] = (), mission_ids: Iterable[Optional[int]] = ()) -> None:
+    keys = [puzzles_key(None)]
+    for mid in set(mission_ids):
+        if mid is not None:
+            keys += [puzzles_key(mid), mission_puzzles_key(mid)]
+    keys += [puzzle_key(pid) for pid in puzzle_ids]
+    catalog.invalidate(*keys)
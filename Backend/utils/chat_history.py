@@ -0,0 +1,182 @@
+# Backend/utils/chat_history.py
+# Historique du chat des salles collab :
+#   - tampon circulaire par salle (MV_CHAT_BUFFER derniers "chat" /
+#     "presence_join" / "presence_leave"), alimenté par le fan-out du
+#     ConnectionManager : chaque worker voit toutes les diffusions (broker) ;
+#   - rejoué à la connexion (MV_CHAT_REPLAY derniers événements) ;
+#   - persistance des "chat" par commit groupé : un INSERT multi-lignes toutes
+#     les MV_CHAT_FLUSH_EVERY lignes ou MV_CHAT_FLUSH_MS ms, par une seule tâche ;
+#     au plus MV_CHAT_PENDING_MAX lignes en attente (base indisponible : les
+#     plus anciennes sont abandonnées) ;
+#   - pagination par id décroissant : le tampon d'abord, la base (collab_messages)
+#     pour ce qui est plus ancien que le tampon.
+# Les ids (ms epoch * 1000 + séquence) sont croissants et servent de curseur.
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+import os
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy import insert, select
+
+from .. import models
+from .ws_codec import now_ms
+
+CHAT_BUFFER = int(os.getenv("MV_CHAT_BUFFER", "200"))
+CHAT_REPLAY = int(os.getenv("MV_CHAT_REPLAY", "50"))
+CHAT_FLUSH_EVERY = int(os.getenv("MV_CHAT_FLUSH_EVERY", "50"))
+CHAT_FLUSH_MS = float(os.getenv("MV_CHAT_FLUSH_MS", "200"))
+CHAT_PENDING_MAX = int(os.getenv("MV_CHAT_PENDING_MAX", "5000"))
+
+HISTORY_TYPES = {"chat", "presence_join", "presence_leave"}
+
+_messages = models.CollabMessage.__table__
+
+
+def _event_from_row(row) -> dict:
+    return {"type": "chat", "id": row.msg_id, "from": row.username, "role": row.role,
+            "text": row.text, "ts": row.ts}
+
+
+class ChatHistory:
+    def __init__(self, engine, read_engine, size: int = CHAT_BUFFER,
+                 flush_every: int = CHAT_FLUSH_EVERY, flush_ms: float = CHAT_FLUSH_MS,
+                 pending_max: int = CHAT_PENDING_MAX):
+        self.engine = engine
+        self.read_engine = read_engine
+        self.size = size
+        self.flush_every = flush_every
+        self.flush_ms = flush_ms
+        self.pending_max = pending_max
+        self.buffers: Dict[str, Deque[dict]] = {}
+        self._last_id = 0
+        # lignes en attente d'écriture + réveils de la tâche d'écriture
+        self._pending: List[dict] = []
+        self._has_pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"written": 0, "batches": 0, "errors": 0, "dropped": 0, "db_reads": 0}
+
+    def next_id(self) -> int:
+        self._last_id = max(self._last_id + 1, now_ms() * 1000)
+        return self._last_id
+
+    # -------- tampon --------
+    def observe(self, room_code: str, message: dict) -> None:
+        # observateur du ConnectionManager : appelé pour chaque diffusion livrée ici
+        if message.get("type") not in HISTORY_TYPES:
+            return
+        if "id" not in message:
+            message = {**message, "id": self.next_id()}
+        buf = self.buffers.get(room_code)
+        if buf is None:
+            buf = self.buffers[room_code] = deque(maxlen=self.size)
+        buf.append(message)
+
+    def drop_room(self, room_code: str) -> None:
+        self.buffers.pop(room_code, None)
+
+    async def page(self, room_code: str, after_id: Optional[int], limit: int) -> List[dict]:
+        """Événements d'id < after_id, du plus récent au plus ancien."""
+        buf = self.buffers.get(room_code) or ()
+        # lecture du tampon sans await : rien de diffusé entre-temps n'y manque
+        items = []
+        for event in reversed(buf):
+            if after_id is None or event["id"] < after_id:
+                items.append(event)
+                if len(items) == limit:
+                    return items
+        # au-delà du tampon : la base, sous le plus ancien id déjà couvert
+        floor = buf[0]["id"] if buf else None
+        if after_id is not None:
+            floor = after_id if floor is None else min(floor, after_id)
+        stmt = select(_messages).where(_messages.c.room_code == room_code)
+        if floor is not None:
+            stmt = stmt.where(_messages.c.msg_id < floor)
+        stmt = stmt.order_by(_messages.c.msg_id.desc()).limit(limit - len(items))
+        self.stats["db_reads"] += 1
+        async with self.read_engine.connect() as conn:
+            rows = (await conn.execute(stmt)).all()
+        return items + [_event_from_row(r) for r in rows]
+
+    async def replay(self, room_code: str, limit: int = CHAT_REPLAY) -> List[dict]:
+        # ordre chronologique ; ce qui sera diffusé après cet appel arrive en direct
+        if limit <= 0:
+            return []
+        return (await self.page(room_code, self.next_id(), limit))[::-1]
+
+    # -------- persistance groupée --------
+    def persist(self, room_code: str, message: dict, user_id: Optional[int]) -> None:
+        # appelé par le worker émetteur seulement (une ligne par message)
+        self._pending.append({
+            "msg_id": message["id"], "room_code": room_code, "user_id": user_id,
+            "username": message.get("from"), "role": message.get("role"),
+            "text": str(message.get("text", "")), "ts": message["ts"],
+        })
+        self._trim()
+        self._has_pending.set()
+        if len(self._pending) >= self.flush_every:
+            self._full.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._writer())
+
+    async def flush(self) -> int:
+        batch, self._pending = self._pending, []
+        self._has_pending.clear()
+        self._full.clear()
+        if not batch:
+            return 0
+        try:
+            async with self.engine.begin() as conn:
+                await conn.execute(insert(_messages), batch)
+        except BaseException as e:
+            # remis en tête de file (échec ou annulation) : retenté au lot suivant
+            self._pending[:0] = batch
+            self._trim()
+            self._has_pending.set()
+            if isinstance(e, Exception):
+                self.stats["errors"] += 1
+            raise
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+        return len(batch)
+
+    def _trim(self) -> None:
+        # file bornée : on abandonne les plus anciens (ils restent dans le tampon)
+        excess = len(self._pending) - self.pending_max
+        if excess > 0:
+            del self._pending[:excess]
+            self.stats["dropped"] += excess
+
+    async def _writer(self) -> None:
+        while True:
+            await self._has_pending.wait()
+            # lot complet ou échéance du plus ancien en attente
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await asyncio.sleep(self.flush_ms / 1000)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # dernier lot (arrêt propre)
+        try:
+            await self.flush()
+        except Exception:
+            pass
+
+    def pending(self) -> int:
+        return len(self._pending)
@@ -0,0 +1,221 @@
+# Backend/utils/content_pack.py
+# Import en masse d'un pack de contenu (missions + puzzles imbriqués) :
+# validation MissionCreate/PuzzleCreate de tout le pack d'abord, puis
+# insertions executemany par transactions de CHUNK_SIZE lignes.
+# Ré-import idempotent : chaque ligne porte une content_key unique
+# (clé "key" du pack, sinon le titre), les clés déjà présentes sont ignorées.
+#   python -m Backend.utils.content_pack pack.json|pack.jsonl [--dry-run] [--chunk-size N]
+# Un serveur déjà lancé garde son cache catalogue : préférer alors
+# POST /missions/import, qui l'invalide.
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterable, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .. import models
+from ..schemas import MissionCreate, PuzzleCreate
+
+CHUNK_SIZE = 500
+
+
+class PackError(ValueError):
+    def __init__(self, errors: List[str]):
+        super().__init__(f"{len(errors)} erreur(s) dans le pack")
+        self.errors = errors
+
+
+@dataclass
+class ImportReport:
+    dry_run: bool = False
+    missions_inserted: int = 0
+    missions_skipped: int = 0
+    puzzles_inserted: int = 0
+    puzzles_skipped: int = 0
+    seconds: float = 0.0
+    rows_per_s: float = 0.0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class _PackMission:
+    key: str
+    row: dict
+    puzzles: List[Tuple[str, dict]] = field(default_factory=list)
+
+
+# -------- Lecture / validation --------
+def parse_pack(text: str) -> List[dict]:
+    """JSON ({"missions": [...]}, [...] ou une seule mission) ou JSONL (une
+    mission par ligne) ; PackError si le pack ne contient aucune mission."""
+    missions = _parse(text)
+    if not missions:
+        raise PackError(["pack vide : aucune mission"])
+    return missions
+
+
+def _parse(text: str) -> List[dict]:
+    stripped = text.lstrip()
+    if stripped.startswith("{") or stripped.startswith("["):
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            data = None  # JSONL dont chaque ligne est un objet
+        if isinstance(data, dict):
+            # {"missions": [...]} ; sinon JSONL d'une seule ligne = une mission
+            return list(data["missions"] or []) if "missions" in data else [data]
+        if isinstance(data, list):
+            return data
+    missions = []
+    for n, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            missions.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise PackError([f"ligne {n}: JSON invalide ({e.msg})"])
+    return missions
+
+
+def _errors(where: str, exc: ValidationError) -> List[str]:
+    return [f"{where}.{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors()]
+
+
+def validate_pack(raw: Iterable[Any]) -> List[_PackMission]:
+    missions: List[_PackMission] = []
+    errors: List[str] = []
+    seen: set[str] = set()
+    for i, item in enumerate(raw):
+        where = f"missions[{i}]"
+        if not isinstance(item, dict):
+            errors.append(f"{where}: objet attendu")
+            continue
+        try:
+            mission = MissionCreate.model_validate(item)
+        except ValidationError as e:
+            errors.extend(_errors(where, e))
+            continue
+        key = str(item.get("key") or mission.title)
+        if key in seen:
+            errors.append(f"{where}: clé en double {key!r}")
+            continue
+        seen.add(key)
+        pm = _PackMission(key=key, row={**mission.model_dump(), "content_key": key})
+        for j, p in enumerate(item.get("puzzles") or []):
+            pwhere = f"{where}.puzzles[{j}]"
+            if not isinstance(p, dict):
+                errors.append(f"{pwhere}: objet attendu")
+                continue
+            try:
+                # mission_id est connu après insertion de la mission
+                puzzle = PuzzleCreate.model_validate({**p, "mission_id": 0})
+            except ValidationError as e:
+                errors.extend(_errors(pwhere, e))
+                continue
+            pkey = f"{key}/{p.get('key') or puzzle.title}"
+            if pkey in seen:
+                errors.append(f"{pwhere}: clé en double {pkey!r}")
+                continue
+            seen.add(pkey)
+            pm.puzzles.append((pkey, {**puzzle.model_dump(exclude={"mission_id"}), "content_key": pkey}))
+        missions.append(pm)
+    if errors:
+        raise PackError(errors)
+    return missions
+
+
+# -------- Insertion --------
+def _chunks(missions: List[_PackMission], size: int) -> Iterable[List[_PackMission]]:
+    # une transaction ~ size lignes (missions + puzzles), sans couper une mission
+    chunk, rows = [], 0
+    for m in missions:
+        chunk.append(m)
+        rows += 1 + len(m.puzzles)
+        if rows >= size:
+            yield chunk
+            chunk, rows = [], 0
+    if chunk:
+        yield chunk
+
+
+def _existing(conn, model, keys: List[str]) -> dict:
+    if not keys:
+        return {}
+    rows = conn.execute(select(model.content_key, model.id).where(model.content_key.in_(keys)))
+    return dict(rows.all())
+
+
+def import_pack(engine, raw: Iterable[Any], dry_run: bool = False, chunk_size: int = CHUNK_SIZE) -> ImportReport:
+    """Valide tout le pack (PackError sinon) puis l'insère par lots."""
+    missions = validate_pack(raw)
+    report = ImportReport(dry_run=dry_run)
+    t0 = time.perf_counter()
+    mission_insert = sqlite_insert(models.Mission).on_conflict_do_nothing(index_elements=["content_key"])
+    puzzle_insert = sqlite_insert(models.Puzzle).on_conflict_do_nothing(index_elements=["content_key"])
+    for chunk in _chunks(missions, chunk_size):
+        with engine.begin() as conn:
+            known = _existing(conn, models.Mission, [m.key for m in chunk])
+            new_missions = [m.row for m in chunk if m.key not in known]
+            report.missions_inserted += len(new_missions)
+            report.missions_skipped += len(chunk) - len(new_missions)
+            pkeys = [k for m in chunk for k, _ in m.puzzles]
+            known_puzzles = _existing(conn, models.Puzzle, pkeys)
+            if dry_run:
+                report.puzzles_inserted += len(pkeys) - len(known_puzzles)
+                report.puzzles_skipped += len(known_puzzles)
+                continue
+            if new_missions:
+                conn.execute(mission_insert, new_missions)  # executemany
+                known = _existing(conn, models.Mission, [m.key for m in chunk])
+            new_puzzles = [
+                {**row, "mission_id": known[m.key]}
+                for m in chunk for k, row in m.puzzles if k not in known_puzzles
+            ]
+            if new_puzzles:
+                conn.execute(puzzle_insert, new_puzzles)
+            report.puzzles_inserted += len(new_puzzles)
+            report.puzzles_skipped += len(known_puzzles)
+    report.seconds = time.perf_counter() - t0
+    rows = report.missions_inserted + report.puzzles_inserted
+    report.rows_per_s = rows / report.seconds if report.seconds > 0 else 0.0
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    from ..database import Base, engine
+    from .. import migrations
+
+    parser = argparse.ArgumentParser(description="Import d'un pack de contenu (missions + puzzles)")
+    parser.add_argument("pack", help="fichier .json ou .jsonl (- pour stdin)")
+    parser.add_argument("--dry-run", action="store_true", help="valide et compte sans rien écrire")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="lignes par transaction")
+    args = parser.parse_args(argv)
+
+    text = sys.stdin.read() if args.pack == "-" else open(args.pack, encoding="utf-8").read()
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    try:
+        report = import_pack(engine, parse_pack(text), dry_run=args.dry_run, chunk_size=args.chunk_size)
+    except PackError as e:
+        for err in e.errors:
+            print(err, file=sys.stderr)
+        print(e, file=sys.stderr)
+        return 1
+    prefix = "[dry-run] " if report.dry_run else ""
+    print(f"{prefix}missions: {report.missions_inserted} insérées, {report.missions_skipped} déjà présentes")
+    print(f"{prefix}puzzles:  {report.puzzles_inserted} insérés, {report.puzzles_skipped} déjà présents")
+    print(f"{prefix}{report.seconds:.2f} s, {report.rows_per_s:,.0f} lignes/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# Backend/utils/leaderboard.py
+# Classement matérialisé : user_totals est mis à jour dans la même transaction
+# que l'écriture PlayerMission (triggers SQLite, cf. migrations.py), le GET ne
+# fait plus qu'un parcours d'index.
+#   python -m Backend.utils.leaderboard --rebuild --verify
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Optional
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .. import models
+
+
+def ensure_user_row(db: Session, user_id: int) -> None:
+    # un joueur sans progression apparaît quand même (à 0) dans le classement
+    stmt = sqlite_insert(models.UserTotal).values(user_id=user_id, total_score=0)
+    db.execute(stmt.on_conflict_do_nothing(index_elements=[models.UserTotal.user_id]))
+
+
+def _computed_totals(db: Session) -> dict[int, int]:
+    rows = db.execute(
+        select(models.User.id, func.coalesce(func.sum(models.PlayerMission.score), 0))
+        .outerjoin(models.PlayerMission, models.User.id == models.PlayerMission.user_id)
+        .group_by(models.User.id)
+    ).all()
+    return {uid: int(total) for uid, total in rows}
+
+
+def backfill_missing(db: Session) -> int:
+    """Crée les lignes absentes (base antérieure à user_totals). Retourne le nombre ajouté."""
+    known = set(db.scalars(select(models.UserTotal.user_id)))
+    missing = {uid: t for uid, t in _computed_totals(db).items() if uid not in known}
+    if missing:
+        db.add_all(models.UserTotal(user_id=uid, total_score=t) for uid, t in missing.items())
+        db.commit()
+    return len(missing)
+
+
+def rebuild(db: Session) -> int:
+    """Recalcule tous les totaux depuis player_missions."""
+    totals = _computed_totals(db)
+    db.query(models.UserTotal).delete()
+    db.add_all(models.UserTotal(user_id=uid, total_score=t) for uid, t in totals.items())
+    db.commit()
+    return len(totals)
+
+
+def verify(db: Session) -> list[tuple[int, int | None, int]]:
+    """Compare les totaux matérialisés au recalcul : [(user_id, stocké, attendu)]."""
+    stored = dict(db.execute(select(models.UserTotal.user_id, models.UserTotal.total_score)).all())
+    return [
+        (uid, stored.get(uid), expected)
+        for uid, expected in sorted(_computed_totals(db).items())
+        if stored.get(uid) != expected
+    ]
+
+
+def top_stmt(limit: Optional[int], offset: int = 0, after_id: Optional[int] = None):
+    stmt = (
+        select(models.UserTotal.user_id, models.User.username, models.UserTotal.total_score)
+        .join(models.User, models.User.id == models.UserTotal.user_id)
+        .order_by(models.UserTotal.total_score.desc(), models.UserTotal.user_id.asc())
+    )
+    if after_id is not None:
+        # keyset sur (total_score desc, user_id) : reprend juste après after_id
+        score = (
+            select(models.UserTotal.total_score)
+            .where(models.UserTotal.user_id == after_id)
+            .scalar_subquery()
+        )
+        stmt = stmt.where(
+            models.UserTotal.total_score <= score,
+            or_(models.UserTotal.total_score < score, models.UserTotal.user_id > after_id),
+        )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt.offset(offset) if offset else stmt
+
+
+def top(db: Session, limit: Optional[int], offset: int = 0, after_id: Optional[int] = None):
+    return db.execute(top_stmt(limit, offset, after_id)).all()
+
+
+def main(argv: list[str] | None = None) -> int:
+    from ..database import Base, SessionLocal, engine
+    from .. import migrations
+
+    parser = argparse.ArgumentParser(description="Maintenance du classement matérialisé")
+    parser.add_argument("--rebuild", action="store_true", help="recalcule user_totals depuis zéro")
+    parser.add_argument("--verify", action="store_true", help="vérifie user_totals contre player_missions")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            print(f"{rebuild(db)} totaux recalculés")
+        if args.verify or not args.rebuild:
+            diffs = verify(db)
+            for uid, stored, expected in diffs:
+                print(f"user {uid}: stocké={stored} attendu={expected}")
+            print("OK" if not diffs else f"{len(diffs)} écart(s)")
+            return 1 if diffs else 0
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# Backend/utils/lock_manager.py
+# Verrous d'énigmes à bail (lease) au-dessus du broker :
+#   - TTL (MV_LOCK_TTL s), prolongé par le "ping" de la connexion détentrice ;
+#   - jeton de fencing croissant par acquisition (diffusé dans lock_acquired) ;
+#   - index par connexion : une déconnexion libère ses verrous en O(détenus) ;
+#   - expiration par tas d'échéances + une seule tâche qui dort jusqu'à la
+#     prochaine (pas de polling). Les entrées périmées du tas (bail libéré ou
+#     prolongé) sont ignorées quand elles sortent.
+from __future__ import annotations
+
+import asyncio
+import heapq
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from .broker import Broker
+
+LOCK_TTL = float(os.getenv("MV_LOCK_TTL", "30"))
+
+Key = Tuple[str, int]  # (room_code, puzzle_id)
+
+
+@dataclass
+class Lease:
+    room_code: str
+    puzzle_id: int
+    user_id: int
+    token: int
+    expires: float  # time.time()
+
+    @property
+    def key(self) -> Key:
+        return (self.room_code, self.puzzle_id)
+
+
+OnExpire = Callable[[Lease], Awaitable[None]]
+
+
+class LockManager:
+    def __init__(self, broker: Broker, on_expire: Optional[OnExpire] = None, ttl: float = LOCK_TTL):
+        self.broker = broker
+        self.on_expire = on_expire
+        self.ttl = ttl
+        # baux obtenus via les connexions de CE worker
+        self.leases: Dict[Key, Lease] = {}
+        self.owner: Dict[Key, Hashable] = {}
+        self.by_conn: Dict[Hashable, Set[Key]] = {}
+        self._heap: List[Tuple[float, int, Key]] = []  # (échéance, jeton, clé)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"acquired": 0, "denied": 0, "renewed": 0, "expired": 0, "released_on_disconnect": 0}
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # -------- API --------
+    async def acquire(self, conn: Hashable, room_code: str, puzzle_id: int, user_id: int) -> Lease:
+        """Retourne le bail en cours : lease.user_id != user_id si refusé."""
+        holder, token, expires = await self.broker.acquire_lock(room_code, puzzle_id, user_id, self.ttl)
+        lease = Lease(room_code, puzzle_id, holder, token, expires)
+        if holder != user_id:
+            self.stats["denied"] += 1
+            return lease
+        self.stats["acquired"] += 1
+        self._track(conn, lease)
+        return lease
+
+    async def release(self, conn: Hashable, room_code: str, puzzle_id: int, user_id: int) -> bool:
+        ok = await self.broker.release_lock(room_code, puzzle_id, user_id)
+        if ok:
+            self._untrack((room_code, puzzle_id))
+        return ok
+
+    async def renew(self, conn: Hashable) -> int:
+        """Prolonge tous les baux de la connexion ; retourne le nombre prolongé."""
+        keys = list(self.by_conn.get(conn, ()))
+        if not keys:
+            return 0
+        leases = [self.leases[k] for k in keys]
+        expiries = await self.broker.renew_locks([(l.room_code, l.puzzle_id, l.token) for l in leases], self.ttl)
+        renewed = 0
+        for lease, expires in zip(leases, expiries):
+            if self.leases.get(lease.key) is not lease:
+                continue  # libéré pendant l'appel
+            if expires is None:
+                self._untrack(lease.key)  # perdu (échu, purgé)
+                continue
+            lease.expires = expires
+            self._push(lease)
+            renewed += 1
+        self.stats["renewed"] += renewed
+        return renewed
+
+    async def release_all(self, conn: Hashable) -> List[Lease]:
+        """Libère les verrous de la connexion (déconnexion) ; retourne ceux libérés."""
+        released = []
+        for key in self.by_conn.pop(conn, ()):
+            lease = self.leases.pop(key, None)
+            self.owner.pop(key, None)
+            if lease is not None and await self.broker.drop_lock(lease.room_code, lease.puzzle_id, lease.token):
+                released.append(lease)
+        self.stats["released_on_disconnect"] += len(released)
+        return released
+
+    def held(self, conn: Hashable) -> List[Lease]:
+        return [self.leases[k] for k in self.by_conn.get(conn, ())]
+
+    # -------- index --------
+    def _track(self, conn: Hashable, lease: Lease) -> None:
+        key = lease.key
+        prev = self.owner.get(key)
+        if prev is not None and prev != conn:
+            self.by_conn.get(prev, set()).discard(key)
+        self.leases[key] = lease
+        self.owner[key] = conn
+        self.by_conn.setdefault(conn, set()).add(key)
+        self._push(lease)
+
+    def _untrack(self, key: Key) -> Optional[Lease]:
+        lease = self.leases.pop(key, None)
+        conn = self.owner.pop(key, None)
+        if conn is not None:
+            keys = self.by_conn.get(conn)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_conn[conn]
+        return lease
+
+    # -------- expiration --------
+    def _push(self, lease: Lease) -> None:
+        entry = (lease.expires, lease.token, lease.key)
+        heapq.heappush(self._heap, entry)
+        if self._task is None:
+            self._task = asyncio.create_task(self._timer())
+        elif self._heap[0] is entry:
+            self._wakeup.set()  # nouvelle échéance la plus proche
+
+    async def _timer(self) -> None:
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            expires, token, key = self._heap[0]
+            delay = expires - time.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            lease = self.leases.get(key)
+            if lease is None or lease.token != token or lease.expires > expires:
+                continue  # entrée périmée
+            self._untrack(key)
+            try:
+                if not await self.broker.drop_lock(lease.room_code, lease.puzzle_id, token, expired_only=True):
+                    continue
+                self.stats["expired"] += 1
+                if self.on_expire is not None:
+                    await self.on_expire(lease)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                continue
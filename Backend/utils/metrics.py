@@ -0,0 +1,337 @@
+# Backend/utils/metrics.py
+# Métriques au format texte Prometheus, sans dépendance externe :
+#   - middleware ASGI : latence par route (histogramme), requêtes SQL et
+#     temps DB par requête (événements before/after_cursor_execute) ;
+#   - compteurs/jauges WebSocket et caches, lus au moment du scrape ;
+#   - journal des requêtes lentes avec leur SQL (MV_SLOW_REQUEST_MS, vide = off).
+# /metrics exige "Authorization: Bearer $MV_METRICS_TOKEN" ; sans token
+# configuré, seules les connexions locales (loopback) sont servies. Pas de
+# label par salle : les codes de salle sont joignables et non bornés.
+from __future__ import annotations
+
+import bisect
+import contextvars
+import hmac
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+SLOW_REQUEST_MS = float(os.getenv("MV_SLOW_REQUEST_MS", "0") or 0)
+SLOW_LOG_MAX_STATEMENTS = 50
+METRICS_TOKEN = os.getenv("MV_METRICS_TOKEN", "")
+LOOPBACK = {"127.0.0.1", "::1", "localhost"}
+
+slow_log = logging.getLogger("mission_vitale.slow")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 32, 64)
+
+Labels = Tuple[str, ...]
+
+
+def _fmt_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# -------- Types de métriques --------
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(buckets)
+        self._data: Dict[Labels, list] = {}  # labels -> [comptes par bucket..., somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            d = self._data.get(labels)
+            if d is None:
+                d = self._data[labels] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                d[i] += 1
+            d[-2] += value
+            d[-1] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._data.items()]
+        out = []
+        for labels, d in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, d):
+                cumulative += n
+                le = _fmt_labels(self.labelnames, labels, 'le="%s"' % _num(bound))
+                out.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _fmt_labels(self.labelnames, labels, 'le="+Inf"')
+            out.append(f"{self.name}_bucket{le} {d[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labelnames, labels)} {_num(d[-2])}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labelnames, labels)} {d[-1]}")
+        return out
+
+
+class Gauge:
+    # valeur(s) lue(s) au scrape : fn() -> {labels: valeur}
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...], fn: Callable[[], Dict[Labels, float]], kind: str = "gauge"):
+        self.name, self.help, self.labelnames, self.fn = name, help, labelnames, fn
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_num(v)}" for k, v in self.fn().items()]
+
+
+class RateMeter:
+    """Événements par seconde sur une fenêtre glissante (jauge "par seconde")."""
+
+    def __init__(self, window: float = 10.0):
+        self.window = window
+        self._events: deque = deque()  # (seconde entière, nombre)
+        self._lock = threading.Lock()
+
+    def mark(self, n: int = 1) -> None:
+        now = int(time.monotonic())
+        with self._lock:
+            if self._events and self._events[-1][0] == now:
+                self._events[-1] = (now, self._events[-1][1] + n)
+            else:
+                self._events.append((now, n))
+
+    def rate(self) -> float:
+        horizon = time.monotonic() - self.window
+        with self._lock:
+            while self._events and self._events[0][0] < horizon:
+                self._events.popleft()
+            return sum(n for _, n in self._events) / self.window
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for m in self.metrics:
+            try:
+                samples = m.samples()
+            except Exception:
+                continue  # un collecteur en erreur ne casse pas le scrape
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+http_requests = registry.register(Counter(
+    "mv_http_requests_total", "Requêtes HTTP servies", ("method", "route", "status")))
+http_latency = registry.register(Histogram(
+    "mv_http_request_duration_seconds", "Durée des requêtes HTTP", ("method", "route")))
+http_queries = registry.register(Histogram(
+    "mv_http_request_db_queries", "Requêtes SQL par requête HTTP", ("route",), QUERY_BUCKETS))
+http_db_time = registry.register(Histogram(
+    "mv_http_request_db_seconds", "Temps passé en SQL par requête HTTP", ("route",)))
+db_queries = registry.register(Counter(
+    "mv_db_queries_total", "Requêtes SQL exécutées (toutes origines)", ("engine",)))
+db_seconds = registry.register(Counter(
+    "mv_db_seconds_total", "Temps SQL cumulé (toutes origines)", ("engine",)))
+ws_broadcast = registry.register(Histogram(
+    "mv_ws_broadcast_seconds", "Durée d'un fan-out WebSocket (sérialisation + mise en file)"))
+ws_in_rate = RateMeter()
+ws_out_rate = RateMeter()
+
+
+# -------- Comptabilité SQL par requête --------
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_time: float = 0.0
+    statements: Optional[List[Tuple[str, float]]] = None
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("mv_request_stats", default=None)
+
+
+def install_sql_hooks(engine, label: str) -> None:
+    """Compte les requêtes et le temps SQL d'un moteur sync (async: .sync_engine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("mv_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("mv_t0")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        db_queries.inc((label,))
+        db_seconds.inc((label,), elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+            if stats.statements is not None and len(stats.statements) < SLOW_LOG_MAX_STATEMENTS:
+                stats.statements.append((statement, elapsed))
+
+
+# -------- Middleware ASGI --------
+class MetricsMiddleware:
+    def __init__(self, app, slow_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(statements=[] if self.slow_ms > 0 else None)
+        token = _current.set(stats)
+        status = [500]
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = list(message.get("headers") or [])
+                headers.append((b"server-timing",
+                                f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries"'.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _current.reset(token)
+            route = scope.get("route")
+            # gabarit de la route (/game/puzzles/{puzzle_id}) : cardinalité bornée
+            label = getattr(route, "path_format", None) or getattr(route, "path", None) or "<unmatched>"
+            method = scope.get("method", "")
+            http_requests.inc((method, label, str(status[0])))
+            http_latency.observe((method, label), elapsed)
+            http_queries.observe((label,), stats.queries)
+            http_db_time.observe((label,), stats.db_time)
+            if self.slow_ms > 0 and elapsed * 1000 >= self.slow_ms:
+                _log_slow(method, scope.get("path", ""), label, status[0], elapsed, stats)
+
+
+def _log_slow(method: str, path: str, label: str, status: int, elapsed: float, stats: RequestStats) -> None:
+    lines = [f"{method} {path} ({label}) -> {status} en {elapsed * 1000:.1f} ms, "
+             f"{stats.queries} requête(s) SQL, {stats.db_time * 1000:.1f} ms en base"]
+    for sql, dt in stats.statements or []:
+        lines.append(f"  [{dt * 1000:7.2f} ms] {' '.join(sql.split())}")
+    slow_log.warning("\n".join(lines))
+
+
+# -------- Collecteurs lus au scrape --------
+def gauge(name: str, help: str, fn: Callable[[], Dict[Labels, float]], labelnames: Tuple[str, ...] = (), kind: str = "gauge"):
+    return registry.register(Gauge(name, help, labelnames, fn, kind))
+
+
+def scrape_allowed(client_host: Optional[str], authorization: Optional[str]) -> bool:
+    if METRICS_TOKEN:
+        return hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}")
+    return client_host in LOOPBACK
+
+
+def register_ws_manager(manager) -> None:
+    gauge("mv_ws_connections", "Connexions WebSocket ouvertes",
+          lambda: {(): len(manager.outboxes)})
+    gauge("mv_ws_rooms", "Salles avec au moins une connexion",
+          lambda: {(): sum(1 for sockets in manager.rooms.values() if sockets)})
+    gauge("mv_ws_queue_depth", "Trames en attente d'envoi (toutes connexions)",
+          lambda: {(): manager.queue_depth()[0]})
+    gauge("mv_ws_queue_depth_max", "File d'envoi la plus longue",
+          lambda: {(): manager.queue_depth()[1]})
+    gauge("mv_ws_messages_in_per_second", "Messages reçus par seconde (fenêtre 10 s)",
+          lambda: {(): ws_in_rate.rate()})
+    gauge("mv_ws_messages_out_per_second", "Trames envoyées par seconde (fenêtre 10 s)",
+          lambda: {(): ws_out_rate.rate()})
+    for key, help in (
+        ("frames_received", "Messages WebSocket reçus"),
+        ("frames_sent", "Trames WebSocket envoyées"),
+        ("frames_dropped", "Trames 'state' abandonnées (file pleine)"),
+        ("slow_disconnects", "Clients lents déconnectés"),
+    ):
+        gauge(f"mv_ws_{key}_total", help, lambda key=key: {(): manager.stats.get(key, 0)}, kind="counter")
+
+
+def register_reaper(reaper) -> None:
+    for key, help in (
+        ("sweeps", "Passes du reaper"),
+        ("rooms_finished", "Salles expirées passées à finished"),
+        ("sockets_closed", "Sockets fermées (salle terminée)"),
+        ("rooms_purged", "Ensembles de sockets vides purgés"),
+        ("states_dropped", "États de salles terminées supprimés"),
+        ("locks_purged", "Verrous orphelins supprimés"),
+        ("pings_sent", "Pings envoyés aux connexions muettes"),
+        ("idle_dropped", "Connexions coupées faute de réponse au ping"),
+        ("buckets_purged", "Seaux de limitation de débit inactifs oubliés"),
+    ):
+        gauge(f"mv_reaper_{key}_total", help, lambda key=key: {(): reaper.stats[key]}, kind="counter")
+
+
+def register_chat_history(history) -> None:
+    gauge("mv_chat_pending", "Messages de chat en attente d'écriture", lambda: {(): history.pending()})
+    gauge("mv_chat_buffered_rooms", "Salles avec un tampon d'historique", lambda: {(): len(history.buffers)})
+    for key, help in (
+        ("written", "Messages de chat persistés"),
+        ("batches", "Lots d'écriture du chat (commits groupés)"),
+        ("errors", "Lots d'écriture du chat en échec (retentés)"),
+        ("dropped", "Messages de chat abandonnés (file d'écriture pleine)"),
+        ("db_reads", "Pages d'historique lues en base (au-delà du tampon)"),
+    ):
+        gauge(f"mv_chat_{key}_total", help, lambda key=key: {(): history.stats[key]}, kind="counter")
+
+
+def register_cache(name: str, stats: Callable[[], dict]) -> None:
+    # hits / misses / taille de n'importe quel cache exposant ces compteurs
+    gauge(f"mv_{name}_cache_hits_total", f"Cache {name} : hits", lambda: {(): stats()["hits"]}, kind="counter")
+    gauge(f"mv_{name}_cache_misses_total", f"Cache {name} : misses", lambda: {(): stats()["misses"]}, kind="counter")
+    gauge(f"mv_{name}_cache_size", f"Cache {name} : entrées", lambda: {(): stats().get("size", 0)})
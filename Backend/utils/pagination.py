@@ -0,0 +1,65 @@
+# Backend/utils/pagination.py
+# Pagination par curseur (keyset : after_id + limit) et export NDJSON en flux.
+# Sans limit ni after_id, les listes restent complètes (cf. page_limit).
+# En NDJSON les lignes sortent d'un curseur côté serveur (yield_per) : la
+# réponse ne matérialise jamais tout le résultat.
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Iterator, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from ..database import ReadSessionLocal
+
+PAGE_MAX = 1000
+NDJSON = "application/x-ndjson"
+NEXT_HEADER = "X-Next-After-Id"
+STREAM_CHUNK = 500
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON in request.headers.get("accept", "")
+
+
+def page_limit(limit: Optional[int], after_id: Optional[int], default: int = PAGE_MAX) -> Optional[int]:
+    # ni limit ni curseur : liste complète, comme avant la pagination (clients
+    # existants) ; un curseur seul donne une page de `default` lignes
+    if limit is None and after_id is not None:
+        return default
+    return limit
+
+
+def keyset(stmt, id_col, after_id: Optional[int], limit: Optional[int]):
+    # ordre stable : id décroissant (≈ created_at desc, sans tri ni OFFSET)
+    if after_id is not None:
+        stmt = stmt.where(id_col < after_id)
+    stmt = stmt.order_by(id_col.desc())
+    return stmt.limit(limit) if limit is not None else stmt
+
+
+def set_next_cursor(response: Response, rows: list, limit: Optional[int], key: Callable[[Any], int]) -> None:
+    # page pleine : il reste peut-être des lignes après la dernière
+    if limit is not None and rows and len(rows) == limit:
+        response.headers[NEXT_HEADER] = str(key(rows[-1]))
+
+
+def _encode(item: Any) -> str:
+    if isinstance(item, BaseModel):
+        return item.model_dump_json()
+    return json.dumps(item, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def ndjson_response(stmt, to_item: Callable[[Any], Any], scalars: bool = True) -> StreamingResponse:
+    """Diffuse stmt ligne par ligne ; la session est ouverte par le générateur
+    (elle survit à la dépendance de la route)."""
+
+    def rows() -> Iterator[str]:
+        with ReadSessionLocal() as db:
+            result = db.execute(stmt.execution_options(yield_per=STREAM_CHUNK))
+            for row in (result.scalars() if scalars else result):
+                yield _encode(to_item(row)) + "\n"
+
+    return StreamingResponse(rows(), media_type=NDJSON)
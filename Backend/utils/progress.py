@@ -0,0 +1,48 @@
+# Backend/utils/progress.py
+# Écriture de la progression en une seule requête :
+#   INSERT ... ON CONFLICT(user_id, mission_id) DO UPDATE SET score = max(...)
+# Le total du classement (user_totals) suit via les triggers de la migration 3.
+# Les réponses sont gardées (puzzle_answers) pour la re-correction (game/rescore.py).
+from __future__ import annotations
+
+import hashlib
+import json
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .. import models
+
+
+def upsert_progress_stmt(rows: list[dict]):
+    """rows: [{"user_id", "mission_id", "score", "completed"}] ; garde le meilleur."""
+    pm = models.PlayerMission
+    stmt = sqlite_insert(pm).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[pm.user_id, pm.mission_id],
+        set_={
+            "score": func.max(func.coalesce(pm.score, 0), stmt.excluded.score),
+            "completed": func.max(func.coalesce(pm.completed, 0), stmt.excluded.completed),
+        },
+    )
+
+
+def answer_hash(answer) -> str:
+    canonical = json.dumps(answer, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def record_answers_stmt(rows: list[dict]):
+    """rows: [{"user_id", "puzzle_id", "answer", "score", "completed"}] ; une ligne par réponse distincte."""
+    pa = models.PuzzleAnswer
+    # un même INSERT ne peut pas viser deux fois la même clé de conflit
+    distinct = {}
+    for r in rows:
+        h = answer_hash(r["answer"])
+        distinct[(r["puzzle_id"], r["user_id"], h)] = {**r, "answer_hash": h}
+    stmt = sqlite_insert(pa).values(list(distinct.values()))
+    return stmt.on_conflict_do_update(
+        index_elements=[pa.puzzle_id, pa.user_id, pa.answer_hash],
+        set_={"score": stmt.excluded.score, "completed": stmt.excluded.completed,
+              "submitted_at": func.current_timestamp()},
+    )
@@ -0,0 +1,128 @@
+# Backend/utils/rate_limit.py
+# Limitation de débit des messages WebSocket collab : un seau à jetons par
+# (salle, utilisateur, type de message) — partagé entre les onglets d'un même
+# joueur. Limites par défaut MV_WS_RATE_LIMITS ("type=débit/s:rafale,...",
+# "*" = un seau commun à tous les autres types), surchargées par salle
+# (collab_rooms.rate_limits).
+# Un message hors limite n'est pas diffusé : compté "dropped", et l'émetteur
+# reçoit un "rate_limited" au plus une fois tant que son seau est vide
+# (compté "throttled") — la réponse ne doit pas amplifier le flood.
+from __future__ import annotations
+
+import os
+import time
+from typing import Dict, Mapping, Optional, Tuple
+
+from .metrics import Counter, registry
+
+DEFAULT_LIMITS = "chat=5:10,state=30:60,state_patch=30:60,lock=5:10,unlock=5:10,*=20:40"
+
+Limit = Tuple[float, float]  # (jetons/s, rafale)
+
+ws_rate_dropped = registry.register(Counter(
+    "mv_ws_rate_dropped_total", "Messages WebSocket rejetés (limite de débit)", ("type",)))
+ws_rate_throttled = registry.register(Counter(
+    "mv_ws_rate_throttled_total", "Réponses rate_limited envoyées", ("type",)))
+
+
+def parse_limits(spec: str) -> Dict[str, Limit]:
+    limits: Dict[str, Limit] = {}
+    for item in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, value = item.partition("=")
+        rate, _, burst = value.partition(":")
+        limits[name.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+LIMITS = parse_limits(os.getenv("MV_WS_RATE_LIMITS", DEFAULT_LIMITS))
+
+
+def room_limits(overrides: Optional[Mapping[str, Mapping]]) -> Dict[str, Limit]:
+    """Limites par défaut surchargées par celles de la salle ({type: {rate, burst}})."""
+    limits = dict(LIMITS)
+    for name, lim in (overrides or {}).items():
+        limits[name] = (float(lim["rate"]), float(lim.get("burst") or lim["rate"]))
+    return limits
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp", "notified")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate, self.burst = rate, burst
+        self.tokens = burst
+        self.stamp = now
+        self.notified = False  # rate_limited déjà envoyé depuis que le seau est vide
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.notified = False
+
+    def take(self, n: int, now: float) -> int:
+        """Prend jusqu'à n jetons ; retourne le nombre accordé."""
+        self.refill(now)
+        granted = min(n, int(self.tokens))
+        self.tokens -= granted
+        return granted
+
+    def retry_after(self) -> float:
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else float("inf")
+
+
+class RateLimiter:
+    def __init__(self):
+        self.rooms: Dict[str, Dict[str, Limit]] = {}
+        # (salle, user_id) -> {type: seau}
+        self.buckets: Dict[Tuple[str, int], Dict[str, TokenBucket]] = {}
+
+    def configure(self, room_code: str, overrides: Optional[Mapping[str, Mapping]] = None) -> None:
+        if room_code not in self.rooms or overrides is not None:
+            self.rooms[room_code] = room_limits(overrides)
+
+    def allow(self, room_code: str, user_id: int, mtype: str, n: int = 1) -> Tuple[int, Optional[dict]]:
+        """Accorde jusqu'à n messages de ce type ; retourne (accordés, réponse
+        rate_limited à envoyer ou None)."""
+        limits = self.rooms.get(room_code) or LIMITS
+        # types sans limite propre : un seul seau "*" partagé (types arbitraires
+        # envoyés par le client -> nombre de seaux borné)
+        label = mtype if mtype in limits else "*"
+        limit = limits.get(label)
+        if limit is None:
+            return n, None
+        now = time.monotonic()
+        per_type = self.buckets.setdefault((room_code, user_id), {})
+        bucket = per_type.get(label)
+        if bucket is None:
+            bucket = per_type[label] = TokenBucket(limit[0], limit[1], now)
+        granted = bucket.take(n, now)
+        if granted == n:
+            return n, None
+        ws_rate_dropped.inc((label,), n - granted)
+        if bucket.notified:
+            return granted, None
+        bucket.notified = True
+        ws_rate_throttled.inc((label,))
+        return granted, {
+            "type": "rate_limited", "message_type": mtype, "dropped": n - granted,
+            "retry_after_ms": int(bucket.retry_after() * 1000),
+        }
+
+    def purge_idle(self) -> int:
+        # un seau plein équivaut à un seau neuf : inutile de le garder
+        now = time.monotonic()
+        idle = []
+        for key, per_type in self.buckets.items():
+            for bucket in per_type.values():
+                bucket.refill(now)
+            if all(b.tokens >= b.burst for b in per_type.values()):
+                idle.append(key)
+        for key in idle:
+            del self.buckets[key]
+        return len(idle)
+
+    def drop_room(self, room_code: str) -> None:
+        self.rooms.pop(room_code, None)
+        for key in [k for k in self.buckets if k[0] == room_code]:
+            del self.buckets[key]
@@ -0,0 +1,122 @@
+# Backend/utils/room_reaper.py
+# Ménage périodique des salles collab (tâche asyncio gérée par le lifespan) :
+#   - salles expirées passées à "finished" en un seul UPDATE, sockets fermées (4410) ;
+#   - ensembles de sockets vides et états de puzzles des salles terminées purgés ;
+#   - verrous orphelins (salle terminée / détenteur déconnecté) supprimés ;
+#   - connexions muettes pingées, coupées (4408) si rien ne revient ;
+#   - seaux de limitation de débit pleins (inactifs) oubliés ;
+#   - tampons d'historique du chat des salles terminées libérés.
+# Les compteurs cumulés (stats) sont exposés dans /metrics.
+from __future__ import annotations
+
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import select, update
+
+from .. import models
+
+REAPER_INTERVAL = float(os.getenv("MV_REAPER_INTERVAL", "5"))
+WS_IDLE = float(os.getenv("MV_WS_IDLE", "30"))                # ping après N s sans message
+WS_PING_TIMEOUT = float(os.getenv("MV_WS_PING_TIMEOUT", "10"))  # coupe si rien après le ping
+
+CLOSE_ROOM_FINISHED = 4410
+CLOSE_IDLE = 4408
+
+_rooms = models.CollabRoom.__table__
+
+
+def _now_iso() -> str:
+    # même format que collab._iso_utc (comparaison lexicographique sur expires_at)
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class RoomReaper:
+    def __init__(self, engine, manager, room_states, interval: float = REAPER_INTERVAL,
+                 idle_after: float = WS_IDLE, ping_timeout: float = WS_PING_TIMEOUT, limiter=None, history=None):
+        self.engine = engine
+        self.manager = manager
+        self.room_states = room_states
+        self.limiter = limiter
+        self.history = history
+        self.interval = interval
+        self.idle_after = idle_after
+        self.ping_timeout = ping_timeout
+        self.stats = {
+            "sweeps": 0, "rooms_finished": 0, "sockets_closed": 0, "rooms_purged": 0,
+            "states_dropped": 0, "locks_purged": 0, "pings_sent": 0, "idle_dropped": 0,
+            "buckets_purged": 0,
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _finished_rooms(self) -> tuple[set[str], set[str]]:
+        # (expirées à l'instant, toutes les terminées encore tenues par ce worker)
+        local = list(self.manager.rooms.keys() | self.room_states.states.keys())
+        async with self.engine.begin() as conn:
+            res = await conn.execute(
+                update(_rooms)
+                .where(_rooms.c.status != "finished", _rooms.c.expires_at.is_not(None),
+                       _rooms.c.expires_at <= _now_iso())
+                .values(status="finished")
+                .returning(_rooms.c.code)
+            )
+            expired = set(res.scalars().all())
+            # salles terminées ailleurs (autre worker, fin manuelle) encore tenues ici
+            finished = set()
+            if local:
+                res = await conn.execute(
+                    select(_rooms.c.code).where(_rooms.c.code.in_(local), _rooms.c.status == "finished")
+                )
+                finished = set(res.scalars().all())
+        return expired, expired | finished
+
+    async def sweep(self) -> dict:
+        """Une passe de ménage ; retourne ce qui a été récupéré."""
+        done = {key: 0 for key in self.stats if key != "sweeps"}
+        expired, finished = await self._finished_rooms()
+        done["rooms_finished"] = len(expired)
+        for code in finished:
+            done["sockets_closed"] += await self.manager.close_room(code, CLOSE_ROOM_FINISHED, "Salle terminée")
+            if code in self.room_states.states:
+                self.room_states.drop_room(code)
+                done["states_dropped"] += 1
+            if self.limiter is not None:
+                self.limiter.drop_room(code)
+            if self.history is not None:
+                self.history.drop_room(code)
+        done["rooms_purged"] = self.manager.purge_empty()
+        done["locks_purged"] = await self.manager.broker.purge_locks(finished, self.manager.live_users())
+        done["pings_sent"], done["idle_dropped"] = await self.manager.ping_idle(
+            self.idle_after, self.ping_timeout, CLOSE_IDLE)
+        if self.limiter is not None:
+            done["buckets_purged"] = self.limiter.purge_idle()
+        self.stats["sweeps"] += 1
+        for key, n in done.items():
+            self.stats[key] += n
+        return done
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # base verrouillée, etc. : on retentera à la passe suivante
+                continue
@@ -0,0 +1,208 @@
+# Backend/utils/room_state.py
+# État autoritaire des puzzles partagés d'une salle collab (positions DnD,
+# edges SCHEMA...) : snapshot versionné par (room, puzzle), deltas façon
+# JSON Patch, diffusion regroupée à MV_ROOM_STATE_HZ (0 = immédiate).
+from __future__ import annotations
+
+import asyncio
+import copy
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .ws_codec import now_ms
+
+ROOM_STATE_HZ = float(os.getenv("MV_ROOM_STATE_HZ", "20"))
+
+Broadcast = Callable[[str, dict], Awaitable[None]]
+
+log = logging.getLogger("mission_vitale.collab")
+
+
+class PatchError(ValueError):
+    pass
+
+
+@dataclass
+class PuzzleState:
+    version: int = 0
+    state: Any = field(default_factory=dict)
+
+
+# -------- JSON Patch minimal (add / replace / remove) --------
+_MISSING = object()
+
+
+def _split_pointer(path: str) -> list[str]:
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise PatchError(f"chemin invalide: {path!r}")
+    return [p.replace("~1", "/").replace("~0", "~") for p in path[1:].split("/")]
+
+
+def _index(container: list, token: str, allow_end: bool) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit():
+        raise PatchError(f"index invalide: {token!r}")
+    i = int(token)
+    if i > len(container) or (i == len(container) and not allow_end):
+        raise PatchError(f"index hors limites: {i}")
+    return i
+
+
+def _check_ops(ops: Any) -> None:
+    # ops vient du client : liste de dicts {"op": str, "path": str, ...}
+    if not isinstance(ops, list):
+        raise PatchError("ops doit être une liste d'opérations")
+    for i, op in enumerate(ops):
+        if not isinstance(op, dict):
+            raise PatchError(f"opération {i} invalide : objet attendu")
+        if not isinstance(op.get("op"), str) or not isinstance(op.get("path", ""), str):
+            raise PatchError(f"opération {i} invalide : op et path doivent être des chaînes")
+
+
+def apply_patch(doc: Any, ops: list[dict]) -> Any:
+    """Applique les opérations sur une copie de doc et la retourne."""
+    _check_ops(ops)
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        kind = op.get("op")
+        tokens = _split_pointer(op.get("path", ""))
+        if not tokens:
+            if kind in ("add", "replace"):
+                doc = copy.deepcopy(op.get("value"))
+                continue
+            raise PatchError("impossible de supprimer la racine")
+        parent = doc
+        for token in tokens[:-1]:
+            try:
+                parent = parent[_index(parent, token, False)] if isinstance(parent, list) else parent[token]
+            except (KeyError, TypeError):
+                raise PatchError(f"chemin introuvable: {op.get('path')!r}")
+        last = tokens[-1]
+        if isinstance(parent, list):
+            if kind == "add":
+                parent.insert(_index(parent, last, True), copy.deepcopy(op.get("value")))
+            elif kind == "replace":
+                parent[_index(parent, last, False)] = copy.deepcopy(op.get("value"))
+            elif kind == "remove":
+                del parent[_index(parent, last, False)]
+            else:
+                raise PatchError(f"opération inconnue: {kind!r}")
+        elif isinstance(parent, dict):
+            if kind in ("add", "replace"):
+                if kind == "replace" and last not in parent:
+                    raise PatchError(f"clé absente: {last!r}")
+                parent[last] = copy.deepcopy(op.get("value"))
+            elif kind == "remove":
+                if parent.pop(last, _MISSING) is _MISSING:
+                    raise PatchError(f"clé absente: {last!r}")
+            else:
+                raise PatchError(f"opération inconnue: {kind!r}")
+        else:
+            raise PatchError(f"chemin introuvable: {op.get('path')!r}")
+    return doc
+
+
+# -------- Store --------
+class RoomStateStore:
+    def __init__(self, tick_hz: float = ROOM_STATE_HZ):
+        self.tick_hz = tick_hz
+        self.states: Dict[str, Dict[int, PuzzleState]] = {}
+        # (room, puzzle_id) -> auteur de la dernière modif, en attente du prochain tick
+        self._pending: Dict[Tuple[str, int], dict] = {}
+        self._broadcast: Optional[Broadcast] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, broadcast: Broadcast) -> None:
+        self._broadcast = broadcast
+        self._ensure_ticking()
+
+    def _ensure_ticking(self) -> None:
+        # (re)lance la tâche du tick si elle n'existe pas ou s'est arrêtée
+        if self.tick_hz > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._tick_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get(self, room_code: str, puzzle_id: int) -> PuzzleState:
+        return self.states.setdefault(room_code, {}).setdefault(puzzle_id, PuzzleState())
+
+    def snapshot(self, room_code: str) -> dict:
+        return {
+            str(pid): {"version": st.version, "state": st.state}
+            for pid, st in self.states.get(room_code, {}).items()
+        }
+
+    async def replace(self, room_code: str, puzzle_id: int, state: Any, author: dict) -> int:
+        st = self.get(room_code, puzzle_id)
+        st.state = state
+        st.version += 1
+        await self._changed(room_code, puzzle_id, author)
+        return st.version
+
+    async def patch(self, room_code: str, puzzle_id: int, ops: list[dict], author: dict) -> int:
+        st = self.get(room_code, puzzle_id)
+        st.state = apply_patch(st.state, ops)  # PatchError : état inchangé
+        st.version += 1
+        await self._changed(room_code, puzzle_id, author)
+        return st.version
+
+    def drop_room(self, room_code: str) -> None:
+        self.states.pop(room_code, None)
+        for key in [k for k in self._pending if k[0] == room_code]:
+            self._pending.pop(key, None)
+
+    async def _changed(self, room_code: str, puzzle_id: int, author: dict) -> None:
+        self._pending[(room_code, puzzle_id)] = author
+        if self.tick_hz <= 0:
+            await self.flush()
+        elif self._broadcast is not None:
+            self._ensure_ticking()
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        if self._broadcast is None:
+            return
+        ts = now_ms()
+        for (room_code, puzzle_id), author in pending.items():
+            st = self.states.get(room_code, {}).get(puzzle_id)
+            if st is None:
+                continue
+            try:
+                await self._broadcast(room_code, {
+                    "type": "state",
+                    "from": author.get("username"),
+                    "role": author.get("role"),
+                    "puzzle_id": puzzle_id,
+                    "version": st.version,
+                    "state": st.state,
+                    "ts": ts,
+                })
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # un état indiffusable ne doit pas bloquer les autres salles
+                log.exception("diffusion de l'état %s/%s impossible", room_code, puzzle_id)
+
+    async def _tick_loop(self) -> None:
+        interval = 1.0 / self.tick_hz
+        while True:
+            await asyncio.sleep(interval)
+            if self._pending:
+                try:
+                    await self.flush()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    log.exception("tick de l'état des salles")
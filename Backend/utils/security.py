@@ -1,11 +1,20 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+import asyncio
+import multiprocessing
+import os
 import jwt  # PyJWT
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from ..database import engine
+from .token_cache import RevocationSync, VerifiedToken, store_revocation, token_digest, verified_tokens
+
+# Coût bcrypt (log2 des tours) : les hash d'un autre coût sont refaits au login
+BCRYPT_ROUNDS = int(os.getenv("MV_BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 SECRET_KEY = "change-me-in-prod"  # 🔒 change en prod
 ALGORITHM = "HS256"
@@ -19,6 +28,50 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# Vérifie et, si la politique de coût a changé, retourne le nouveau hash
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+# -------- Hashage hors boucle : pool dédié et borné --------
+# MV_HASH_EXECUTOR=process (défaut) | thread ; MV_HASH_WORKERS ; MV_HASH_MAX_PENDING
+HASH_EXECUTOR = os.getenv("MV_HASH_EXECUTOR", "process")
+HASH_WORKERS = int(os.getenv("MV_HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_MAX_PENDING = int(os.getenv("MV_HASH_MAX_PENDING", str(HASH_WORKERS * 4)))
+
+_hash_executor: Optional[Executor] = None
+_hash_slots: Optional[asyncio.Semaphore] = None
+
+def _get_hash_executor() -> Executor:
+    global _hash_executor
+    if _hash_executor is None:
+        if HASH_EXECUTOR == "thread":
+            _hash_executor = ThreadPoolExecutor(HASH_WORKERS, thread_name_prefix="bcrypt")
+        else:
+            # "spawn" : pas de fork d'un process qui fait tourner une boucle asyncio
+            _hash_executor = ProcessPoolExecutor(HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _hash_executor
+
+async def _run_hash(fn, *args):
+    global _hash_slots
+    if _hash_slots is None:
+        _hash_slots = asyncio.Semaphore(HASH_MAX_PENDING)
+    # au-delà de HASH_MAX_PENDING, on attend ici plutôt que d'empiler dans le pool
+    async with _hash_slots:
+        return await asyncio.get_running_loop().run_in_executor(_get_hash_executor(), fn, *args)
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hash(hash_password, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await _run_hash(verify_and_update_password, plain_password, hashed_password)
+
+def shutdown_hasher() -> None:
+    global _hash_executor, _hash_slots
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+    _hash_executor = None
+    _hash_slots = None
+
 # Création du token JWT
 def create_access_token(data: dict, expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES) -> str:
     to_encode = data.copy()
@@ -29,13 +82,45 @@ def create_access_token(data: dict, expires_minutes: int = ACCESS_TOKEN_EXPIRE_M
 # Lecture du token JWT (auth)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+class InvalidToken(Exception):
+    pass
+
+# Vérification commune HTTP / WebSocket : le cache évite de refaire le HMAC
+def authenticate_token(token: str) -> dict:
+    digest = token_digest(token)
+    if verified_tokens.is_revoked(digest):
+        raise InvalidToken("token révoqué")
+    cached = verified_tokens.get(digest)
+    if cached is not None:
+        return cached.as_user()
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        user_id: int = payload.get("uid")
-        if username is None or user_id is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalide.")
-        return {"username": username, "user_id": user_id}
-    except JWTError:
+    except jwt.PyJWTError:
+        raise InvalidToken("token invalide ou expiré")
+    username = payload.get("sub")
+    user_id = payload.get("uid")
+    exp = payload.get("exp")
+    if not username or not user_id or exp is None:
+        raise InvalidToken("token invalide")
+    verified = VerifiedToken(user_id=user_id, username=username, exp=float(exp))
+    verified_tokens.put(digest, verified)
+    return verified.as_user()
+
+# Révocation explicite (logout) : valable jusqu'à l'exp du token, immédiate
+# sur ce worker, vue par les autres au prochain passage de revocations (lifespan)
+revocations = RevocationSync(engine, verified_tokens)
+
+def revoke_token(token: str) -> None:
+    try:
+        exp = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])["exp"]
+    except (jwt.PyJWTError, KeyError):
+        return  # déjà invalide
+    digest = token_digest(token)
+    verified_tokens.revoke(digest, float(exp))
+    store_revocation(engine, digest, float(exp))
+
+def get_current_user(token: str = Depends(oauth2_scheme)):
+    try:
+        return authenticate_token(token)
+    except InvalidToken:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalide ou expiré.")
@@ -0,0 +1,91 @@
+# Backend/utils/session_cache.py
+# Cache en mémoire de la session de jeu active de chaque joueur : le submit
+# n'interroge plus game_sessions, l'expiration est un simple epoch pré-calculé.
+# Cache par process : une entrée ne survit jamais à son expires_epoch (pas de
+# submit accepté sur une session expirée), mais une session créée sur un autre
+# worker n'est vue ici qu'à l'expiration de celle en cache — d'ici là,
+# /game/session/current y renvoie l'ancienne échéance.
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+SESSION_CACHE_SIZE = 10_000
+
+
+@dataclass(frozen=True, slots=True)
+class CachedSession:
+    # mêmes attributs que GameSessionRead (from_attributes)
+    id: int
+    user_id: int
+    started_at: datetime
+    expires_at: str
+    expires_epoch: float
+
+    @property
+    def active(self) -> bool:
+        return time.time() < self.expires_epoch
+
+
+class ActiveSessionCache:
+    def __init__(self, maxsize: int = SESSION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: OrderedDict[int, CachedSession] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[CachedSession]:
+        with self._lock:
+            s = self._data.get(user_id)
+            if s is not None and s.active:
+                self.hits += 1
+                return s
+            if s is not None:
+                # expirée : on l'évince
+                del self._data[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, session) -> CachedSession:
+        cached = session if isinstance(session, CachedSession) else CachedSession(
+            id=session.id,
+            user_id=session.user_id,
+            started_at=session.started_at,
+            expires_at=session.expires_at,
+            expires_epoch=session.expires_epoch,
+        )
+        with self._lock:
+            self._data[cached.user_id] = cached
+            self._data.move_to_end(cached.user_id)
+            if len(self._data) > self.maxsize:
+                self._purge_expired_locked()
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return cached
+
+    def evict(self, user_id: int) -> None:
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._purge_expired_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def _purge_expired_locked(self) -> int:
+        now = time.time()
+        dead = [uid for uid, s in self._data.items() if s.expires_epoch <= now]
+        for uid in dead:
+            del self._data[uid]
+        return len(dead)
+
+
+active_sessions = ActiveSessionCache()
@@ -0,0 +1,187 @@
+# Backend/utils/token_cache.py
+# Cache des JWT déjà vérifiés, partagé par HTTP et WebSocket : un token
+# présenté des milliers de fois n'est décodé/vérifié (HMAC) qu'une fois.
+# Clé = empreinte du token ; chaque entrée meurt à l'exp du token.
+# Révocations (logout) écrites dans revoked_tokens et relues par chaque worker
+# toutes les MV_REVOCATION_SYNC_MS ms (RevocationSync, démarré par le lifespan),
+# qui purge aussi les entrées expirées (cache, liste, table).
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .. import models
+
+TOKEN_CACHE_SIZE = 10_000
+REVOCATION_SYNC = float(os.getenv("MV_REVOCATION_SYNC_MS", "1000")) / 1000
+TOKEN_PURGE_INTERVAL = float(os.getenv("MV_TOKEN_PURGE_S", "60"))
+
+_revoked = models.RevokedToken.__table__
+
+
+@dataclass(frozen=True, slots=True)
+class VerifiedToken:
+    user_id: int
+    username: str
+    exp: float  # epoch
+
+    @property
+    def active(self) -> bool:
+        return time.time() < self.exp
+
+    def as_user(self) -> dict:
+        return {"username": self.username, "user_id": self.user_id}
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+class VerifiedTokenCache:
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: OrderedDict[bytes, VerifiedToken] = OrderedDict()
+        # liste de révocation : empreinte -> exp (inutile de la garder au-delà)
+        self._revoked: Dict[bytes, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revoked_hits = 0
+
+    def get(self, digest: bytes) -> Optional[VerifiedToken]:
+        with self._lock:
+            t = self._data.get(digest)
+            if t is not None and t.active:
+                self._data.move_to_end(digest)
+                self.hits += 1
+                return t
+            if t is not None:
+                del self._data[digest]
+            self.misses += 1
+            return None
+
+    def put(self, digest: bytes, token: VerifiedToken) -> None:
+        with self._lock:
+            if digest in self._revoked:
+                return
+            self._data[digest] = token
+            self._data.move_to_end(digest)
+            if len(self._data) > self.maxsize:
+                self._purge_expired_locked()
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def is_revoked(self, digest: bytes) -> bool:
+        with self._lock:
+            if digest in self._revoked:
+                self.revoked_hits += 1
+                return True
+            return False
+
+    def revoke(self, digest: bytes, exp: float) -> None:
+        with self._lock:
+            self._data.pop(digest, None)
+            self._revoked[digest] = exp
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._purge_expired_locked()
+
+    def _purge_expired_locked(self) -> int:
+        now = time.time()
+        dead = [d for d, t in self._data.items() if t.exp <= now]
+        for d in dead:
+            del self._data[d]
+        for d in [d for d, exp in self._revoked.items() if exp <= now]:
+            del self._revoked[d]
+        return len(dead)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "revoked": len(self._revoked),
+                "hits": self.hits,
+                "misses": self.misses,
+                "revoked_hits": self.revoked_hits,
+            }
+
+
+verified_tokens = VerifiedTokenCache()
+
+
+# -------- Révocations partagées entre workers --------
+def store_revocation(engine, digest: bytes, exp: float) -> None:
+    with engine.begin() as conn:
+        conn.execute(sqlite_insert(_revoked).values(digest=digest.hex(), exp=exp)
+                     .on_conflict_do_nothing(index_elements=["digest"]))
+
+
+class RevocationSync:
+    def __init__(self, engine, cache: VerifiedTokenCache = verified_tokens,
+                 interval: float = REVOCATION_SYNC, purge_interval: float = TOKEN_PURGE_INTERVAL):
+        self.engine = engine
+        self.cache = cache
+        self.interval = interval
+        self.purge_interval = purge_interval
+        self._last_id = 0
+        self._last_purge = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"synced": 0, "purged": 0, "errors": 0}
+
+    async def start(self) -> None:
+        if self._task is None:
+            await asyncio.to_thread(self.sync)  # révocations encore valides, avant la 1re requête
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def sync(self) -> int:
+        """Applique les révocations écrites depuis le dernier passage (tous workers)."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(_revoked.c.id, _revoked.c.digest, _revoked.c.exp)
+                .where(_revoked.c.id > self._last_id, _revoked.c.exp > time.time())
+                .order_by(_revoked.c.id)
+            ).all()
+        for row_id, digest, exp in rows:
+            self.cache.revoke(bytes.fromhex(digest), exp)
+            self._last_id = row_id
+        self.stats["synced"] += len(rows)
+        return len(rows)
+
+    def purge(self) -> int:
+        purged = self.cache.purge_expired()
+        with self.engine.begin() as conn:
+            conn.execute(delete(_revoked).where(_revoked.c.exp <= time.time()))
+        self.stats["purged"] += purged
+        return purged
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.sync)
+                if time.monotonic() - self._last_purge > self.purge_interval:
+                    self._last_purge = time.monotonic()
+                    await asyncio.to_thread(self.purge)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats["errors"] += 1  # base verrouillée... : au prochain tour
@@ -0,0 +1,184 @@
+# Backend/utils/ws_codec.py
+# Encodages du protocole WebSocket collab, choisis à la poignée de main par
+# le sous-protocole (Sec-WebSocket-Protocol) :
+#   - défaut / "mv.json.v1" : texte JSON (orjson si installé), "type" en
+#     toutes lettres, "ts" en ISO 8601 — protocole historique inchangé ;
+#   - "mv.msgpack.v1" : trames binaires MessagePack, "type" interné en
+#     petit entier (MESSAGE_TYPES), "ts" en millisecondes epoch.
+# En interne les messages portent "ts" en ms epoch (now_ms) : la conversion
+# ISO n'est faite qu'une fois par diffusion, et seulement pour le JSON.
+# Un message reçu n'est accepté que s'il est ré-encodable dans les deux
+# formats : taille (MV_WS_MAX_FRAME octets) et profondeur (MV_WS_MAX_DEPTH)
+# bornées, valeurs JSON uniquement (pas de bytes / ext MessagePack).
+from __future__ import annotations
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # encodeur standard, même sortie compacte
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # sous-protocole binaire non proposé
+    msgpack = None
+
+Frame = Union[str, bytes]
+
+# ids stables : ajouter en fin de liste, ne jamais réordonner
+MESSAGE_TYPES = (
+    "error", "ping", "pong", "chat", "state", "state_patch", "state_snapshot", "state_resync",
+    "lock", "unlock", "lock_acquired", "lock_denied", "lock_released", "unlock_denied",
+    "presence_join", "presence_leave", "batch", "rate_limited",
+    "history",
+)
+TYPE_IDS = {name: i for i, name in enumerate(MESSAGE_TYPES)}
+
+MAX_FRAME = int(os.getenv("MV_WS_MAX_FRAME", str(64 * 1024)))
+MAX_DEPTH = int(os.getenv("MV_WS_MAX_DEPTH", "32"))  # orjson n'encode pas au-delà de 254
+_INT_RANGE = (-(2 ** 63), 2 ** 64 - 1)
+CLOSE_INVALID_PAYLOAD = 1007  # trame refusée : erreur envoyée puis fermeture
+
+
+def now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def iso_from_ms(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _check_size(data: Frame) -> None:
+    if len(data) > MAX_FRAME:
+        raise CodecError(f"trame trop grande (max {MAX_FRAME} octets)")
+
+
+def _check_value(msg: dict) -> None:
+    if orjson is not None:
+        # ré-encodage (C) : refuse bytes, ext, clés exotiques, entiers hors 64 bits
+        try:
+            text = orjson.dumps(msg, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError as e:
+            raise CodecError(f"message non ré-encodable ({e})")
+        # profondeur <= nombre de conteneurs : parcours seulement si ça peut déborder
+        if text.count(b"{") + text.count(b"[") <= MAX_DEPTH:
+            return
+    _walk(msg)
+
+
+def _walk(msg: dict) -> None:
+    # parcours itératif : profondeur bornée, types JSON seulement
+    stack = [(msg, 1)]
+    while stack:
+        value, depth = stack.pop()
+        if depth > MAX_DEPTH:
+            raise CodecError(f"imbrication trop profonde (max {MAX_DEPTH})")
+        if isinstance(value, dict):
+            for k, v in value.items():
+                if not isinstance(k, (str, int)) or isinstance(k, bool):
+                    raise CodecError("clé non représentable en JSON")
+                if isinstance(v, (dict, list)):
+                    stack.append((v, depth + 1))
+                else:
+                    _check_scalar(v)
+        else:
+            for v in value:
+                if isinstance(v, (dict, list)):
+                    stack.append((v, depth + 1))
+                else:
+                    _check_scalar(v)
+
+
+def _check_scalar(value) -> None:
+    if value is None or isinstance(value, (str, float, bool)):
+        return
+    if isinstance(value, int) and _INT_RANGE[0] <= value <= _INT_RANGE[1]:
+        return
+    raise CodecError(f"valeur non représentable en JSON ({type(value).__name__})")
+
+
+class JsonCodec:
+    subprotocol: Optional[str] = None
+    label = "JSON"
+    binary = False
+
+    def encode(self, message: dict) -> str:
+        ts = message.get("ts")
+        if isinstance(ts, int):
+            message = {**message, "ts": iso_from_ms(ts)}
+        events = message.get("events")
+        if isinstance(events, list):
+            # trame "history" : mêmes "ts" ISO que les messages en direct
+            message = {**message, "events": [
+                {**e, "ts": iso_from_ms(e["ts"])} if isinstance(e, dict) and isinstance(e.get("ts"), int) else e
+                for e in events
+            ]}
+        if orjson is not None:
+            return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode()
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+    def decode(self, data: Frame) -> dict:
+        _check_size(data)
+        try:
+            msg = orjson.loads(data) if orjson is not None else json.loads(data)
+        except (ValueError, RecursionError) as e:
+            raise CodecError(str(e))
+        if not isinstance(msg, dict):
+            raise CodecError("objet attendu")
+        _check_value(msg)
+        return msg
+
+
+class NamedJsonCodec(JsonCodec):
+    # même encodage, annoncé explicitement par le client
+    subprotocol = "mv.json.v1"
+
+
+class MsgpackCodec:
+    subprotocol = "mv.msgpack.v1"
+    label = "MessagePack"
+    binary = True
+
+    def encode(self, message: dict) -> bytes:
+        mtype = message.get("type")
+        if mtype in TYPE_IDS:
+            message = {**message, "type": TYPE_IDS[mtype]}
+        return msgpack.packb(message, use_bin_type=True)
+
+    def decode(self, data: Frame) -> dict:
+        if isinstance(data, str):
+            return JSON.decode(data)  # trame texte tolérée
+        _check_size(data)
+        try:
+            msg = msgpack.unpackb(data, raw=False, strict_map_key=False)
+        except (ValueError, TypeError, msgpack.UnpackException) as e:
+            raise CodecError(str(e))
+        if not isinstance(msg, dict):
+            raise CodecError("objet attendu")
+        _check_value(msg)
+        mtype = msg.get("type")
+        if isinstance(mtype, int) and 0 <= mtype < len(MESSAGE_TYPES):
+            msg["type"] = MESSAGE_TYPES[mtype]
+        return msg
+
+
+JSON = JsonCodec()
+CODECS = {c.subprotocol: c for c in (NamedJsonCodec(), *((MsgpackCodec(),) if msgpack is not None else ()))}
+
+
+def negotiate(offered: Iterable[str]) -> JsonCodec | MsgpackCodec:
+    """Premier sous-protocole proposé par le client que l'on sait parler ; JSON sinon."""
+    for name in offered:
+        codec = CODECS.get(name.strip())
+        if codec is not None:
+            return codec
+    return JSON
@@ -1,33 +1,230 @@
 # Backend/utils/ws_manager.py
-from typing import Dict, Set, Optional
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Set, Optional, Tuple
 from fastapi import WebSocket
 
+from .broker import Broker, broker_from_env
+from .metrics import ws_broadcast, ws_in_rate, ws_out_rate
+from .ws_codec import JSON, Frame
+
+# File d'envoi bornée par connexion ; au-delà on jette les plus vieux "state",
+# et un client qui reste saturé plus de WS_SLOW_GRACE secondes est déconnecté.
+WS_QUEUE_SIZE = int(os.getenv("MV_WS_QUEUE_SIZE", "64"))
+WS_SLOW_GRACE = float(os.getenv("MV_WS_SLOW_GRACE", "5"))
+DROPPABLE_TYPES = {"state"}
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class _Outbox:
+    __slots__ = ("ws", "room_code", "codec", "queue", "wakeup", "task", "over_since", "last_seen", "ping_sent")
+
+    def __init__(self, ws: WebSocket, room_code: str, codec=JSON):
+        self.ws = ws
+        self.room_code = room_code
+        self.codec = codec  # JSON texte ou MessagePack (sous-protocole négocié)
+        self.queue: Deque[Tuple[Optional[str], Frame]] = deque()  # (type, trame encodée)
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.over_since: Optional[float] = None
+        # dernier message reçu / ping serveur sans réponse (cf. room_reaper)
+        self.last_seen = time.monotonic()
+        self.ping_sent: Optional[float] = None
+
+
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, broker: Optional[Broker] = None, max_queue: int = WS_QUEUE_SIZE, slow_grace: float = WS_SLOW_GRACE):
         self.rooms: Dict[str, Set[WebSocket]] = {}
         self.users: Dict[WebSocket, dict] = {}  # {ws: {"user_id":..., "username":..., "role":...}}
+        self.outboxes: Dict[WebSocket, _Outbox] = {}
+        self.max_queue = max_queue
+        self.slow_grace = slow_grace
+        self.stats = {"frames_received": 0, "frames_sent": 0, "frames_dropped": 0,
+                      "slow_disconnects": 0, "max_queue_depth": 0}
+        # bus pub/sub : broadcast() passe par lui pour atteindre les autres workers
+        self.broker = broker or broker_from_env()
+        # appelés pour chaque diffusion livrée sur ce worker (ex: historique du chat)
+        self.observers: List[Callable[[str, dict], None]] = []
+        self._started = False
+
+    async def start(self):
+        if not self._started:
+            await self.broker.start(self._deliver)
+            self._started = True
 
-    async def connect(self, room_code: str, websocket: WebSocket, user: dict):
-        await websocket.accept()
+    async def close(self):
+        if self._started:
+            await self.broker.close()
+            self._started = False
+
+    async def connect(self, room_code: str, websocket: WebSocket, user: dict, codec=JSON):
+        await self.start()
+        await websocket.accept(subprotocol=codec.subprotocol)
         self.rooms.setdefault(room_code, set()).add(websocket)
         self.users[websocket] = user
+        out = _Outbox(websocket, room_code, codec)
+        out.task = asyncio.create_task(self._writer(out))
+        self.outboxes[websocket] = out
 
     async def disconnect(self, room_code: str, websocket: WebSocket):
         try:
             if room_code in self.rooms:
                 self.rooms[room_code].discard(websocket)
             self.users.pop(websocket, None)
+            out = self.outboxes.pop(websocket, None)
+            if out and out.task and out.task is not asyncio.current_task():
+                out.task.cancel()
         except Exception:
             pass
 
     async def broadcast(self, room_code: str, message: dict):
+        await self.broker.publish(room_code, message)
+
+    async def _deliver(self, room_code: str, message: dict):
+        # fan-out vers les sockets de CE worker : sérialisé une fois par encodage, mis en file
+        t0 = time.perf_counter()
+        frames = {}
+        mtype = message.get("type")
+        for observe in self.observers:
+            observe(room_code, message)
         for ws in list(self.rooms.get(room_code, [])):
-            try:
-                await ws.send_json(message)
-            except Exception:
-                # retire silencieusement les websockets mortes
-                self.rooms[room_code].discard(ws)
-                self.users.pop(ws, None)
+            out = self.outboxes.get(ws)
+            if out is not None:
+                frame = frames.get(out.codec)
+                if frame is None:
+                    frame = frames[out.codec] = out.codec.encode(message)
+                self._enqueue(out, mtype, frame)
+        ws_broadcast.observe((), time.perf_counter() - t0)
+
+    def received(self, websocket: WebSocket):
+        # appelé par la route à chaque message entrant : métriques + signe de vie
+        self.stats["frames_received"] += 1
+        ws_in_rate.mark()
+        out = self.outboxes.get(websocket)
+        if out is not None:
+            out.last_seen = time.monotonic()
+            out.ping_sent = None
 
     async def send_personal(self, websocket: WebSocket, message: dict):
-        await websocket.send_json(message)
+        out = self.outboxes.get(websocket)
+        if out is None:
+            await websocket.send_text(JSON.encode(message))
+        else:
+            self._enqueue(out, message.get("type"), out.codec.encode(message))
+
+    async def close_with_error(self, websocket: WebSocket, message: dict, code: int):
+        # trame d'erreur envoyée directement (la file est abandonnée), puis fermeture
+        out = self.outboxes.get(websocket)
+        codec = out.codec if out is not None else JSON
+        if out is not None:
+            await self.disconnect(out.room_code, websocket)
+        try:
+            frame = codec.encode(message)
+            if codec.binary:
+                await websocket.send_bytes(frame)
+            else:
+                await websocket.send_text(frame)
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    # -------- files d'envoi --------
+    def _enqueue(self, out: _Outbox, mtype: Optional[str], frame: Frame):
+        q = out.queue
+        if len(q) >= self.max_queue:
+            # priorité : jeter le plus vieux "state" (il sera remplacé par le suivant)
+            for i, (kind, _) in enumerate(q):
+                if kind in DROPPABLE_TYPES:
+                    del q[i]
+                    self.stats["frames_dropped"] += 1
+                    break
+            else:
+                if mtype in DROPPABLE_TYPES:
+                    self.stats["frames_dropped"] += 1
+                    return
+                now = time.monotonic()
+                if out.over_since is None:
+                    out.over_since = now
+                if now - out.over_since > self.slow_grace or len(q) >= 2 * self.max_queue:
+                    self.stats["slow_disconnects"] += 1
+                    asyncio.create_task(self._evict(out))
+                    return
+        q.append((mtype, frame))
+        if len(q) > self.stats["max_queue_depth"]:
+            self.stats["max_queue_depth"] = len(q)
+        out.wakeup.set()
+
+    async def _writer(self, out: _Outbox):
+        q = out.queue
+        try:
+            while True:
+                if not q:
+                    out.wakeup.clear()
+                    await out.wakeup.wait()
+                    continue
+                _, frame = q.popleft()
+                if len(q) < self.max_queue:
+                    out.over_since = None
+                if out.codec.binary:
+                    await out.ws.send_bytes(frame)
+                else:
+                    await out.ws.send_text(frame)
+                self.stats["frames_sent"] += 1
+                ws_out_rate.mark()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # retire silencieusement les websockets mortes
+            await self.disconnect(out.room_code, out.ws)
+
+    async def _evict(self, out: _Outbox, code: int = CLOSE_TRY_AGAIN_LATER, reason: str = ""):
+        await self.disconnect(out.room_code, out.ws)
+        try:
+            await out.ws.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    # -------- ménage (appelé par le reaper) --------
+    async def close_room(self, room_code: str, code: int, reason: str = "") -> int:
+        outs = [self.outboxes[ws] for ws in list(self.rooms.get(room_code, ())) if ws in self.outboxes]
+        for out in outs:
+            await self._evict(out, code, reason)
+        self.rooms.pop(room_code, None)
+        return len(outs)
+
+    def purge_empty(self) -> int:
+        empty = [code for code, sockets in self.rooms.items() if not sockets]
+        for code in empty:
+            del self.rooms[code]
+        return len(empty)
+
+    def live_users(self) -> Dict[str, Set[int]]:
+        live: Dict[str, Set[int]] = {}
+        for code, sockets in self.rooms.items():
+            live[code] = {self.users[ws]["user_id"] for ws in sockets if ws in self.users}
+        return live
+
+    async def ping_idle(self, idle_after: float, timeout: float, code: int) -> Tuple[int, int]:
+        """Ping les connexions muettes depuis idle_after s ; coupe celles qui
+        n'ont rien renvoyé timeout s après le ping. Retourne (pings, coupées)."""
+        now = time.monotonic()
+        pings, dropped = 0, []
+        for out in list(self.outboxes.values()):
+            if out.ping_sent is not None:
+                if now - out.ping_sent > timeout:
+                    dropped.append(out)
+            elif now - out.last_seen > idle_after:
+                out.ping_sent = now
+                self._enqueue(out, "ping", out.codec.encode({"type": "ping"}))
+                pings += 1
+        for out in dropped:
+            await self._evict(out, code, "pas de réponse au ping")
+        return pings, len(dropped)
+
+    def queue_depth(self) -> Tuple[int, int]:
+        # (trames en attente au total, plus longue file) : métriques
+        depths = [len(out.queue) for out in self.outboxes.values()]
+        return sum(depths), max(depths, default=0)
+
@@ -40,7 +40,8 @@ export async function api(path: string, opts: ApiOptions = {}) {
       (payload && (payload.detail || payload.message)) ||
       (typeof payload === "string" && payload) ||
       `HTTP ${res.status}`;
-    throw new Error(detail);
+    // statut HTTP conservé : l'appelant distingue 401 / 403 / 404
+    throw Object.assign(new Error(detail), { status: res.status });
   }
 
   return payload;
@@ -116,6 +117,7 @@ export const endpoints = {
   getSessionCurrent: (token: string) =>
     api("/game/session/current", { token }),
 
-  submitAnswer: (token: string | null, puzzle_id: number, answer: unknown) =>
-    api("/game/submit", { method: "POST", token: token ?? undefined, body: { puzzle_id, answer } }),
+  // authentifié, et refusé (403) sans session de jeu active : cf. useGame().ensureSession
+  submitAnswer: (token: string, puzzle_id: number, answer: unknown) =>
+    api("/game/submit", { method: "POST", token, body: { puzzle_id, answer } }),
 };
@@ -3,6 +3,7 @@ import { useEffect, useMemo, useState } from "react";
 import { useNavigate, useParams } from "react-router-dom";
 import { endpoints } from "../lib/api";
 import { useAuth } from "../store/auth";
+import { useGame } from "../store/game";
 import type { Puzzle, MediaSpec } from "../types";
 
 // Lottie pour les animations JSON (npm i lottie-react)
@@ -15,6 +16,7 @@ export default function PuzzlePage() {
   const pid = Number(id);
   const nav = useNavigate();
   const { token } = useAuth();
+  const ensureSession = useGame((s) => s.ensureSession);
 
   const [puzzle, setPuzzle] = useState<Puzzle | null>(null);
   const [all, setAll] = useState<Puzzle[]>([]);
@@ -36,6 +38,11 @@ export default function PuzzlePage() {
     })();
   }, [pid, nav]);
 
+  // Session de jeu (timer) : exigée par /game/submit
+  useEffect(() => {
+    if (token) ensureSession(token).catch(() => {});
+  }, [token, ensureSession]);
+
   // Navigation
   const idx = useMemo(() => all.findIndex((p) => p.id === pid), [all, pid]);
   const prevId = idx > 0 ? all[idx - 1]?.id : undefined;
@@ -44,12 +51,20 @@ export default function PuzzlePage() {
 
   async function handleSubmit(answer: unknown) {
     if (!puzzle) return;
+    if (!token) {
+      nav("/login");
+      return;
+    }
     try {
-      const res = await endpoints.submitAnswer(
-        token ?? null,
-        puzzle.id,
-        answer
-      );
+      let res;
+      try {
+        res = await endpoints.submitAnswer(token, puzzle.id, answer);
+      } catch (e: any) {
+        if (e?.status !== 403) throw e;
+        // session expirée (ou pas encore créée) : on relance le compte à rebours
+        await ensureSession(token);
+        res = await endpoints.submitAnswer(token, puzzle.id, answer);
+      }
       alert(
         `${res?.correct ? "✅ Correct" : "❌ Incorrect"} — Score: ${
           res?.earned_score
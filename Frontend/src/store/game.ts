@@ -1,4 +1,6 @@
 import { create } from "zustand";
+import { endpoints } from "../lib/api";
+import type { GameSession } from "../types";
 
 type GameState = {
   /** Valeur de départ (en secondes), affichée quand le timer n'est pas lancé */
@@ -12,6 +14,8 @@ type GameState = {
   setInitial: (seconds: number) => void;
   /** Réinitialise à l'état "non lancé" (figé sur initialSeconds) */
   reset: () => void;
+  /** Session serveur active (créée si absente ou expirée) ; le timer suit son échéance */
+  ensureSession: (token: string) => Promise<GameSession>;
 };
 
 export const useGame = create<GameState>((set, get) => ({
@@ -27,6 +31,22 @@ export const useGame = create<GameState>((set, get) => ({
   setInitial: (seconds) => set({ initialSeconds: seconds }),
 
   reset: () => set({ endAt: null }),
+
+  ensureSession: async (token) => {
+    let session: GameSession | null = null;
+    try {
+      session = (await endpoints.getSessionCurrent(token)) as GameSession;
+    } catch (e: any) {
+      if (e?.status !== 404) throw e; // 404 = aucune session encore
+    }
+    if (!session || Date.parse(session.expires_at) <= Date.now()) {
+      session = (await endpoints.startSession(token, get().initialSeconds)) as GameSession;
+    }
+    const endAt = Date.parse(session.expires_at);
+    sessionStorage.setItem("mv_endAt", String(endAt));
+    set({ endAt });
+    return session;
+  },
 }));
 
 /** Calcule le temps restant (ms) */
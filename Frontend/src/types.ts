@@ -44,3 +44,9 @@ export interface Puzzle {
   created_at?: string;
 }
 
+export interface GameSession {
+  id: number;
+  user_id: number;
+  started_at: string;
+  expires_at: string;        // ISO8601 (UTC, suffixe Z)
+}
@@ -0,0 +1,105 @@
+# benchmarks/bench_grading.py
+# Micro-benchmark : corrections/s avant (json.loads + sets reconstruits à
+# chaque soumission), après (correcteurs compilés + cache LRU) et en lot
+# (grade_many : toutes les réponses d'une classe à un puzzle, NumPy).
+#   python -m benchmarks.bench_grading [--n 200000] [--class-size 500]
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from types import SimpleNamespace
+
+from Backend.game.grading import GraderCache
+
+PUZZLES = [
+    SimpleNamespace(id=1, type="QUIZ", max_score=100, solution=json.dumps({"correct": [0, 2, 3]})),
+    SimpleNamespace(id=2, type="CODE", max_score=100, solution=json.dumps(
+        {"text": "100", "accepted": ["100", "100 ml", "100mL", "100 ML"], "case_insensitive": True})),
+    SimpleNamespace(id=3, type="DND", max_score=100, solution=json.dumps({"mapping": {
+        "Gouttelettes": "Masque chirurgical", "Aérosols": "FFP2",
+        "Sang et liquides": "Gants", "Risque de projection": "Lunettes/Visière"}})),
+    SimpleNamespace(id=4, type="SCHEMA", max_score=100, solution=json.dumps({"edges": [
+        ["Collecte", "Tri"], ["Tri", "Conditionnement (DASRI)"],
+        ["Conditionnement (DASRI)", "Stockage temporaire"],
+        ["Stockage temporaire", "Transport"], ["Transport", "Traitement"]]})),
+    SimpleNamespace(id=5, type="IMG_RECON", max_score=100, solution=json.dumps({"order": [2, 0, 1, 3, 4, 5]})),
+]
+
+ANSWERS = {
+    1: {"selected": [0, 3]},
+    2: {"text": " 100 mL "},
+    3: {"targets": {"Gouttelettes": "Masque chirurgical", "Aérosols": "Gants"}},
+    4: {"edges": [["Tri", "Collecte"], ["Transport", "Traitement"], ["Tri", "Transport"]]},
+    5: {"order": [2, 0, 1, 3, 5, 4]},
+}
+
+
+def legacy_grade(p, answer: dict) -> tuple[bool, int]:
+    # reproduction du chemin historique : décodage + structures à chaque appel
+    sol = json.loads(p.solution)
+    if p.type in ("QUIZ", "IMG_QUIZ"):
+        correct_set, sel_set = set(sol.get("correct", [])), set(answer.get("selected", []))
+        good, bad = len(correct_set & sel_set), len(sel_set - correct_set)
+        score = max(0, int(p.max_score * (good / max(1, len(correct_set))) - bad * (p.max_score * 0.2)))
+        return sel_set == correct_set, score
+    if p.type == "CODE":
+        acc = [a.lower() for a in [sol.get("text", "").strip(), *(sol.get("accepted") or [])]]
+        ok = str(answer.get("text", "")).strip().lower() in acc
+        return ok, (p.max_score if ok else 0)
+    if p.type == "DND":
+        mapping, ans = sol.get("mapping", {}), answer.get("targets", {})
+        good = sum(1 for k, v in mapping.items() if ans.get(k) == v)
+        return good == len(mapping), int(p.max_score * good / max(1, len(mapping)))
+    if p.type == "SCHEMA":
+        sol_edges = {tuple(sorted(e)) for e in sol.get("edges", [])}
+        ans_edges = {tuple(sorted(e)) for e in answer.get("edges", [])}
+        good = len(sol_edges & ans_edges)
+        return good == len(sol_edges), int(p.max_score * good / max(1, len(sol_edges)))
+    ok = sol.get("order", []) == answer.get("order", [])
+    return ok, (p.max_score if ok else 0)
+
+
+def _run(label: str, n: int, grade) -> float:
+    work = [(p, ANSWERS[p.id]) for p in PUZZLES]
+    start = time.perf_counter()
+    for i in range(n):
+        p, ans = work[i % len(work)]
+        grade(p, ans)
+    elapsed = time.perf_counter() - start
+    rate = n / elapsed
+    print(f"{label:<10} {n:>9} corrections  {elapsed:8.3f}s  {rate:12,.0f} corrections/s")
+    return rate
+
+
+def _run_batch(n: int, class_size: int, cache: GraderCache) -> float:
+    # n corrections découpées en lots de class_size réponses au même puzzle
+    batches = [(cache.get(p), [ANSWERS[p.id]] * class_size) for p in PUZZLES]
+    rounds = max(1, n // (class_size * len(batches)))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for grader, answers in batches:
+            grader.grade_many(answers)
+    elapsed = time.perf_counter() - start
+    done = rounds * class_size * len(batches)
+    rate = done / elapsed
+    print(f"{'lot':<10} {done:>9} corrections  {elapsed:8.3f}s  {rate:12,.0f} corrections/s")
+    return rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark du moteur de correction")
+    parser.add_argument("--n", type=int, default=200_000)
+    parser.add_argument("--class-size", type=int, default=500, help="réponses par appel à grade_many")
+    args = parser.parse_args()
+
+    cache = GraderCache()
+    before = _run("avant", args.n, legacy_grade)
+    after = _run("après", args.n, lambda p, ans: cache.get(p).grade(ans))
+    print(f"gain x{after / before:.2f}  (cache: {cache.hits} hits / {cache.misses} misses)")
+    batch = _run_batch(args.n, args.class_size, cache)
+    print(f"lot vs après x{batch / after:.2f}")
+
+
+if __name__ == "__main__":
+    main()
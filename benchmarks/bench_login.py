@@ -0,0 +1,78 @@
+# benchmarks/bench_login.py
+# Tempête de connexions : N logins simultanés contre l'app en process (base
+# SQLite temporaire), latence p50/p99 des logins et d'un GET léger en parallèle.
+#   python -m benchmarks.bench_login [--users 200] [--executor process|thread] [--rounds 12]
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def _pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def _storm(n_users: int) -> None:
+    import httpx
+    from Backend.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            creds = [{"username": f"eleve{i:04d}", "password": "motdepasse"} for i in range(n_users)]
+            await asyncio.gather(*(client.post("/users/register", json=c) for c in creds))
+
+            login_lat: list[float] = []
+            probe_lat: list[float] = []
+            done = asyncio.Event()
+
+            async def login(c):
+                t0 = time.perf_counter()
+                r = await client.post("/users/login", json=c)
+                login_lat.append(time.perf_counter() - t0)
+                assert r.status_code == 200, r.text
+
+            async def probe():
+                # requête légère servie pendant la tempête : mesure le blocage
+                while not done.is_set():
+                    t0 = time.perf_counter()
+                    await client.get("/")
+                    probe_lat.append(time.perf_counter() - t0)
+                    await asyncio.sleep(0.01)
+
+            probe_task = asyncio.create_task(probe())
+            t0 = time.perf_counter()
+            await asyncio.gather(*(login(c) for c in creds))
+            elapsed = time.perf_counter() - t0
+            done.set()
+            await probe_task
+
+    print(f"{n_users} logins en {elapsed:.2f}s ({n_users / elapsed:.1f}/s)")
+    print(f"login   p50 {_pct(login_lat, 50) * 1000:8.1f} ms   p99 {_pct(login_lat, 99) * 1000:8.1f} ms")
+    if probe_lat:
+        print(f"GET /   p50 {_pct(probe_lat, 50) * 1000:8.1f} ms   p99 {_pct(probe_lat, 99) * 1000:8.1f} ms"
+              f"   (moyenne {statistics.mean(probe_lat) * 1000:.1f} ms, {len(probe_lat)} sondes)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark tempête de logins")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # configuration lue à l'import de Backend : à fixer avant
+        os.environ["MV_DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["MV_HASH_EXECUTOR"] = args.executor
+        os.environ["MV_BCRYPT_ROUNDS"] = str(args.rounds)
+        asyncio.run(_storm(args.users))
+
+
+if __name__ == "__main__":
+    main()
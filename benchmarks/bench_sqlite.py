@@ -0,0 +1,96 @@
+# benchmarks/bench_sqlite.py
+# Débit lecture/écriture concurrent : profil SQLite historique vs profil réglé
+# (WAL, synchronous=NORMAL, busy_timeout, cache/mmap, pool lecture seule).
+#   python -m benchmarks.bench_sqlite [--seconds 5] [--writers 4] [--readers 8]
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from Backend import migrations, models
+from Backend.database import Base, EngineProfile, make_engine
+from Backend.utils import leaderboard
+from Backend.utils.progress import upsert_progress_stmt
+
+
+def _run(label: str, profile: EngineProfile, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        write_engine = make_engine(url, profile)
+        read_engine = make_engine(url, profile, readonly=True)
+        Base.metadata.create_all(bind=write_engine)
+        migrations.upgrade(write_engine)
+        Writer = sessionmaker(bind=write_engine)
+        Reader = sessionmaker(bind=read_engine)
+
+        with Writer() as db:
+            db.add_all(models.Mission(id=m, title=f"bench {m}") for m in range(1, 51))
+            db.add_all(models.User(id=i, username=f"u{i}", password_hash="x") for i in range(1, 201))
+            db.commit()
+            leaderboard.rebuild(db)
+
+        counts = {"writes": 0, "reads": 0, "locked": 0}
+        lock = threading.Lock()
+        stop = time.perf_counter() + args.seconds
+
+        def writer(n: int):
+            i = 0
+            while time.perf_counter() < stop:
+                i += 1
+                uid = 1 + (n * 7919 + i) % 200
+                try:
+                    with Writer() as db:
+                        db.execute(upsert_progress_stmt([
+                            {"user_id": uid, "mission_id": 1 + i % 50, "score": i % 100, "completed": 1}
+                        ]))
+                        db.commit()
+                    key = "writes"
+                except OperationalError:
+                    key = "locked"
+                with lock:
+                    counts[key] += 1
+
+        def reader():
+            while time.perf_counter() < stop:
+                try:
+                    with Reader() as db:
+                        leaderboard.top(db, 50)
+                    key = "reads"
+                except OperationalError:
+                    key = "locked"
+                with lock:
+                    counts[key] += 1
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+        threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        write_engine.dispose()
+        read_engine.dispose()
+
+    print(f"{label:<8} écritures {counts['writes'] / args.seconds:9.0f}/s   "
+          f"lectures {counts['reads'] / args.seconds:9.0f}/s   verrous {counts['locked']}")
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark des profils moteur SQLite")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    args = parser.parse_args()
+
+    _run("default", EngineProfile.legacy(), args)
+    _run("tuned", EngineProfile(), args)
+
+
+if __name__ == "__main__":
+    main()
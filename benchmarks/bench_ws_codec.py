@@ -0,0 +1,66 @@
+# benchmarks/bench_ws_codec.py
+# Micro-benchmark du protocole WebSocket collab : octets par message et
+# messages/s (encodage + décodage) pour le chemin historique (json + ts ISO
+# recalculé à chaque message), le JSON texte actuel (orjson, ts en ms converti
+# à l'encodage) et MessagePack ("mv.msgpack.v1", types internés).
+#   python -m benchmarks.bench_ws_codec [--n 200000]
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+
+from Backend.utils.ws_codec import CODECS, JSON, now_ms
+
+# mélange représentatif : surtout des "state" (DnD / SCHEMA) au tick
+STATE_DND = {"pos": {"Gouttelettes": [120, 48], "Aérosols": [310, 52], "Sang et liquides": [96, 210],
+                     "Risque de projection": [402, 188]}, "dragging": "Aérosols"}
+STATE_SCHEMA = {"edges": [["Collecte", "Tri"], ["Tri", "Conditionnement (DASRI)"],
+                          ["Conditionnement (DASRI)", "Stockage temporaire"]], "cursor": [512, 300]}
+MESSAGES = [
+    {"type": "state", "from": "alice", "role": "labo", "puzzle_id": 3, "version": 42, "state": STATE_DND},
+    {"type": "state", "from": "bob", "role": "it", "puzzle_id": 4, "version": 17, "state": STATE_SCHEMA},
+    {"type": "state", "from": "alice", "role": "labo", "puzzle_id": 3, "version": 43, "state": STATE_DND},
+    {"type": "chat", "from": "bob", "role": "it", "text": "je prends le tri"},
+    {"type": "lock_acquired", "puzzle_id": 4, "by_user": "bob", "token": 1289, "ttl": 30.0},
+    {"type": "presence_join", "user": "chloé", "role": "pharmacie"},
+]
+
+
+def legacy_encode(message: dict) -> str:
+    # chemin historique : horodatage ISO recalculé + json.dumps (send_json)
+    return json.dumps({**message, "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")}, separators=(",", ":"), ensure_ascii=False)
+
+
+def _run(label: str, n: int, encode, decode) -> tuple[float, float]:
+    size = sum(len(f.encode() if isinstance(f, str) else f) for f in map(encode, MESSAGES)) / len(MESSAGES)
+    start = time.perf_counter()
+    for i in range(n):
+        decode(encode(MESSAGES[i % len(MESSAGES)]))
+    elapsed = time.perf_counter() - start
+    rate = n / elapsed
+    print(f"{label:<10} {size:8.1f} octets/msg  {n:>9} msgs  {elapsed:8.3f}s  {rate:12,.0f} msgs/s")
+    return size, rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark des encodages WebSocket")
+    parser.add_argument("--n", type=int, default=200_000)
+    args = parser.parse_args()
+
+    for m in MESSAGES:
+        m["ts"] = now_ms()
+    before_size, before = _run("avant", args.n, legacy_encode, json.loads)
+    json_size, after = _run("json", args.n, JSON.encode, JSON.decode)
+    print(f"json vs avant : x{after / before:.2f} msgs/s, {json_size / before_size:.0%} des octets")
+    codec = CODECS.get("mv.msgpack.v1")
+    if codec is None:
+        print("msgpack non installé : sous-protocole binaire indisponible")
+        return
+    pack_size, packed = _run("msgpack", args.n, codec.encode, codec.decode)
+    print(f"msgpack vs avant : x{packed / before:.2f} msgs/s, {pack_size / before_size:.0%} des octets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+# benchmarks/suite.py
+# Suite de benchmarks en process : l'app FastAPI de Backend/main.py sur une
+# base SQLite temporaire, pilotée par httpx (HTTP) et un client ASGI minimal
+# (WebSocket), le tout sur une seule boucle asyncio.
+#   auth         tempête register / login
+#   submit       débit de /game/submit et /game/submit/batch
+#   leaderboard  lectures du classement pendant des écritures de progression
+#   ws           salles /collab/ws/{code} : N membres qui s'envoient des "state"
+# Débit + p50/p95/p99, résultats en JSON, comparaison à une référence.
+# Dépendances : pip install -r requirements-dev.txt (httpx).
+#   python -m benchmarks.suite [--scenarios auth,submit,leaderboard,ws]
+#       [--out benchmarks/results/latest.json] [--baseline benchmarks/baseline.json]
+#       [--threshold 0.2] [--save-baseline] [--ws-protocol msgpack]
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from Backend.utils.ws_codec import CODECS, JSON  # sans effet sur la config (pas de base)
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_OUT = HERE / "results" / "latest.json"
+DEFAULT_BASELINE = HERE / "baseline.json"
+
+
+# -------- Mesures --------
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+@dataclass
+class Metric:
+    name: str
+    latencies: list[float] = field(default_factory=list)  # secondes
+    seconds: float = 0.0
+    count: Optional[int] = None  # par défaut len(latencies)
+
+    def summary(self) -> dict:
+        n = self.count if self.count is not None else len(self.latencies)
+        return {
+            "count": n,
+            "seconds": round(self.seconds, 4),
+            "throughput": round(n / self.seconds, 2) if self.seconds > 0 else 0.0,
+            "p50_ms": round(_pct(self.latencies, 50) * 1000, 3),
+            "p95_ms": round(_pct(self.latencies, 95) * 1000, 3),
+            "p99_ms": round(_pct(self.latencies, 99) * 1000, 3),
+        }
+
+
+async def _timed(lat: list[float], coro: Awaitable):
+    t0 = time.perf_counter()
+    result = await coro
+    lat.append(time.perf_counter() - t0)
+    return result
+
+
+def _check(r, *codes: int):
+    if r.status_code not in (codes or (200,)):
+        raise RuntimeError(f"{r.request.method} {r.request.url.path} -> {r.status_code}: {r.text[:200]}")
+    return r
+
+
+# -------- Client WebSocket ASGI (sans réseau) --------
+class AsgiWebSocket:
+    def __init__(self, app, path: str, query: str = "", codec=JSON):
+        self.app = app
+        self.path = path
+        self.query = query
+        self.codec = codec
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self._from_app: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "http_version": "1.1",
+            "path": self.path, "raw_path": self.path.encode(), "query_string": self.query.encode(),
+            "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 0), "server": ("bench", 80),
+            "subprotocols": [self.codec.subprotocol] if self.codec.subprotocol else [], "state": {},
+        }
+        self._task = asyncio.create_task(self.app(scope, self._to_app.get, self._from_app.put))
+        await self._to_app.put({"type": "websocket.connect"})
+        msg = await self._from_app.get()
+        if msg["type"] != "websocket.accept":
+            raise RuntimeError(f"websocket refusée: {msg}")
+
+    async def send(self, message: dict) -> None:
+        frame = self.codec.encode(message)
+        await self._to_app.put({"type": "websocket.receive", ("bytes" if self.codec.binary else "text"): frame})
+
+    async def receive(self) -> dict:
+        msg = await self._from_app.get()
+        if msg["type"] == "websocket.close":
+            raise ConnectionError(f"fermée ({msg.get('code')})")
+        return self.codec.decode(msg["text"] if msg.get("text") is not None else msg.get("bytes"))
+
+    async def close(self) -> None:
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        if self._task is not None:
+            await asyncio.wait_for(self._task, 5)
+
+
+# -------- Jeux de données --------
+SOLUTIONS = [
+    ("QUIZ", {"correct": [0, 2, 3]}, {"selected": [0, 3]}),
+    ("CODE", {"text": "100", "accepted": ["100 ml"], "case_insensitive": True}, {"text": " 100 mL "}),
+    ("DND", {"mapping": {"Gouttelettes": "Masque", "Aérosols": "FFP2"}}, {"targets": {"Gouttelettes": "Masque"}}),
+    ("SCHEMA", {"edges": [["Collecte", "Tri"], ["Tri", "Transport"]]}, {"edges": [["Tri", "Collecte"]]}),
+    ("IMG_RECON", {"order": [2, 0, 1, 3]}, {"order": [2, 0, 3, 1]}),
+]
+
+
+async def _users(client, prefix: str, n: int) -> list[dict]:
+    creds = [{"username": f"{prefix}{i:04d}", "password": "motdepasse"} for i in range(n)]
+    await asyncio.gather(*(client.post("/users/register", json=c) for c in creds))
+    tokens = await asyncio.gather(*(client.post("/users/login", json=c) for c in creds))
+    return [{"Authorization": f"Bearer {_check(r).json()['access_token']}"} for r in tokens]
+
+
+async def _puzzles(client) -> list[tuple[int, dict]]:
+    mission = _check(await client.post("/missions/", json={"title": "bench"}), 201).json()
+    out = []
+    for kind, solution, answer in SOLUTIONS:
+        p = _check(await client.post("/game/puzzles", json={
+            "title": f"bench {kind}", "type": kind, "mission_id": mission["id"], "payload": {}, "solution": solution,
+        })).json()
+        out.append((p["id"], answer))
+    return out
+
+
+async def _workers(n: int, total: int, job: Callable[[int], Awaitable]) -> float:
+    # n coroutines se partagent total requêtes ; retourne la durée
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            await job(i)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(n)))
+    return time.perf_counter() - t0
+
+
+# -------- Scénarios --------
+async def bench_auth(client, app, args) -> list[Metric]:
+    creds = [{"username": f"auth{i:04d}", "password": "motdepasse"} for i in range(args.users)]
+    register, login = Metric("auth.register"), Metric("auth.login")
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_timed(register.latencies, client.post("/users/register", json=c)) for c in creds))
+    register.seconds = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(_timed(login.latencies, client.post("/users/login", json=c)) for c in creds))
+    login.seconds = time.perf_counter() - t0
+    for r in results:
+        _check(r)
+    return [register, login]
+
+
+async def bench_submit(client, app, args) -> list[Metric]:
+    puzzles = await _puzzles(client)
+    # /game/submit exige un token et une session active (progression enregistrée)
+    headers = await _users(client, "sub", args.concurrency)
+    for h in headers:
+        _check(await client.post("/game/session", json={"duration_seconds": 3600}, headers=h), 200, 201)
+    single = Metric("submit.single")
+
+    async def one(i: int):
+        pid, answer = puzzles[i % len(puzzles)]
+        h = headers[i % len(headers)]
+        _check(await _timed(single.latencies, client.post("/game/submit", json={"puzzle_id": pid, "answer": answer}, headers=h)))
+
+    single.seconds = await _workers(args.concurrency, args.requests, one)
+
+    batch = Metric("submit.batch")
+    body = [{"puzzle_id": pid, "answer": answer} for pid, answer in puzzles] * 2
+
+    async def many(i: int):
+        h = headers[i % len(headers)]
+        _check(await _timed(batch.latencies, client.post("/game/submit/batch", json=body, headers=h)))
+
+    batch.seconds = await _workers(args.concurrency, max(1, args.requests // len(body)), many)
+    batch.count = len(batch.latencies) * len(body)  # débit en soumissions/s
+    return [single, batch]
+
+
+async def bench_leaderboard(client, app, args) -> list[Metric]:
+    puzzles = await _puzzles(client)
+    headers = await _users(client, "lb", args.concurrency)
+    for h in headers:
+        _check(await client.post("/game/session", json={"duration_seconds": 3600}, headers=h), 200, 201)
+    read, write = Metric("leaderboard.read"), Metric("leaderboard.write")
+    stop = time.perf_counter() + args.seconds
+
+    async def reader():
+        while time.perf_counter() < stop:
+            _check(await _timed(read.latencies, client.get("/users/leaderboard", params={"limit": 50})))
+
+    async def writer(h: dict):
+        while time.perf_counter() < stop:
+            body = [{"puzzle_id": pid, "answer": answer} for pid, answer in puzzles]
+            _check(await _timed(write.latencies, client.post("/game/submit/batch", json=body, headers=h)))
+
+    t0 = time.perf_counter()
+    n_readers = max(1, args.concurrency // 2)
+    await asyncio.gather(*(reader() for _ in range(n_readers)), *(writer(h) for h in headers[:n_readers]))
+    read.seconds = write.seconds = time.perf_counter() - t0
+    return [read, write]
+
+
+async def bench_ws(client, app, args) -> list[Metric]:
+    owners = await _users(client, "own", args.rooms)
+    members = await _users(client, "mem", args.rooms * args.members)
+    codec = JSON if args.ws_protocol == "json" else CODECS["mv.msgpack.v1"]
+    prefix = "ws" if codec is JSON else f"ws.{args.ws_protocol}"
+    delivered = Metric(f"{prefix}.state")
+    sent = 0
+    rooms = []
+    for r, owner in enumerate(owners):
+        # débit mesuré sans la limitation par joueur (MV_WS_RATE_LIMITS)
+        limits = {"state": {"rate": 1e6, "burst": 1e6}}
+        room = _check(await client.post("/collab/rooms", json={"duration_seconds": 3600, "rate_limits": limits},
+                                        headers=owner), 201).json()
+        sockets = []
+        for h in members[r * args.members:(r + 1) * args.members]:
+            _check(await client.post(f"/collab/rooms/{room['code']}/join", json={}, headers=h))
+            token = h["Authorization"].split()[1]
+            ws = AsgiWebSocket(app, f"/collab/ws/{room['code']}", f"token={token}", codec)
+            await ws.connect()
+            sockets.append(ws)
+        rooms.append(sockets)
+
+    done = asyncio.Event()
+
+    async def listen(ws: AsgiWebSocket):
+        while True:
+            try:
+                msg = await asyncio.wait_for(ws.receive(), 0.2)
+            except asyncio.TimeoutError:
+                if done.is_set():
+                    return
+                continue
+            if msg.get("type") == "state" and isinstance(msg.get("state"), dict):
+                delivered.latencies.append(time.perf_counter() - msg["state"].get("t", 0))
+
+    async def talk(ws: AsgiWebSocket, puzzle_id: int):
+        nonlocal sent
+        for seq in range(args.messages):
+            await ws.send({"type": "state", "puzzle_id": puzzle_id, "state": {"seq": seq, "t": time.perf_counter()}})
+            sent += 1
+            await asyncio.sleep(args.interval)
+
+    listeners = [asyncio.create_task(listen(ws)) for sockets in rooms for ws in sockets]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(talk(ws, i % 4 + 1) for sockets in rooms for i, ws in enumerate(sockets)))
+    await asyncio.sleep(0.3)  # dernier tick de diffusion
+    delivered.seconds = time.perf_counter() - t0
+    done.set()
+    await asyncio.gather(*listeners)
+    for sockets in rooms:
+        for ws in sockets:
+            await ws.close()
+    accepted = Metric(f"{prefix}.sent", seconds=delivered.seconds, count=sent)
+    return [accepted, delivered]
+
+
+SCENARIOS: dict[str, Callable] = {
+    "auth": bench_auth,
+    "submit": bench_submit,
+    "leaderboard": bench_leaderboard,
+    "ws": bench_ws,
+}
+
+
+async def _run(names: list[str], args) -> dict:
+    import httpx
+    from Backend.main import app
+
+    results: dict[str, dict] = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for name in names:
+                for metric in await SCENARIOS[name](client, app, args):
+                    results[metric.name] = metric.summary()
+                    _print_metric(metric.name, results[metric.name])
+    return results
+
+
+# -------- Rapport / référence --------
+def _print_metric(name: str, m: dict) -> None:
+    print(f"{name:<20} {m['count']:>7}  {m['throughput']:>10,.1f}/s  "
+          f"p50 {m['p50_ms']:>8.2f} ms  p95 {m['p95_ms']:>8.2f} ms  p99 {m['p99_ms']:>8.2f} ms")
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Régressions : débit en baisse ou p95/p99 en hausse de plus de threshold."""
+    regressions = []
+    for name, base in baseline.items():
+        cur = current.get(name)
+        if cur is None:
+            continue
+        if base["throughput"] > 0 and cur["throughput"] < base["throughput"] * (1 - threshold):
+            regressions.append(f"{name}: débit {cur['throughput']:.1f}/s < {base['throughput']:.1f}/s")
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] > 0 and cur[key] > base[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {cur[key]:.2f} > {base[key]:.2f}")
+    return regressions
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Suite de benchmarks HTTP / WebSocket en process")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"parmi {', '.join(SCENARIOS)}")
+    parser.add_argument("--users", type=int, default=50, help="auth : comptes créés puis connectés")
+    parser.add_argument("--requests", type=int, default=2000, help="submit : requêtes")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=3.0, help="leaderboard : durée")
+    parser.add_argument("--rooms", type=int, default=2)
+    parser.add_argument("--members", type=int, default=4, help="ws : membres par salle")
+    parser.add_argument("--messages", type=int, default=100, help="ws : 'state' envoyés par membre")
+    parser.add_argument("--interval", type=float, default=0.005, help="ws : pause entre deux envois (s)")
+    parser.add_argument("--ws-protocol", choices=["json", "msgpack"], default="json",
+                        help="ws : encodage négocié (msgpack = sous-protocole mv.msgpack.v1)")
+    parser.add_argument("--rounds", type=int, default=6, help="coût bcrypt (MV_BCRYPT_ROUNDS)")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.2, help="écart toléré (0.2 = 20 %%)")
+    parser.add_argument("--save-baseline", action="store_true", help="enregistre ces résultats comme référence")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"scénario(s) inconnu(s): {unknown}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # configuration lue à l'import de Backend : à fixer avant
+        os.environ["MV_DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["MV_HASH_EXECUTOR"] = args.executor
+        os.environ["MV_BCRYPT_ROUNDS"] = str(args.rounds)
+        results = asyncio.run(_run(names, args))
+
+    report = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        },
+        "results": results,
+    }
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"résultats -> {args.out}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"référence -> {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"pas de référence ({args.baseline}) : --save-baseline pour en créer une")
+        return 0
+    regressions = compare(results, json.loads(args.baseline.read_text())["results"], args.threshold)
+    for r in regressions:
+        print(f"RÉGRESSION  {r}")
+    print("aucune régression" if not regressions else f"{len(regressions)} régression(s) (seuil {args.threshold:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
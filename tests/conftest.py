@@ -0,0 +1,37 @@
+# tests/conftest.py
+# Application complète sur une base temporaire : la configuration (MV_*) est
+# lue à l'import de Backend, elle est donc fixée ici, avant tout test.
+import itertools
+import os
+import tempfile
+
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="mv-tests-")
+os.environ["MV_DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'app.db')}"
+os.environ["MV_WS_BROKER"] = "memory"
+os.environ.setdefault("MV_HASH_EXECUTOR", "thread")
+os.environ.setdefault("MV_BCRYPT_ROUNDS", "4")
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    # un seul TestClient (une seule boucle) pour toute la session
+    from fastapi.testclient import TestClient
+    from Backend.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def auth(client):
+    """Crée un joueur et retourne ses en-têtes Authorization."""
+    def make(username=None):
+        username = username or f"joueur{next(_names)}"
+        client.post("/users/register", json={"username": username, "password": "secret12"})
+        r = client.post("/users/login", json={"username": username, "password": "secret12"})
+        return {"Authorization": f"Bearer {r.json()['access_token']}"}
+    return make
@@ -0,0 +1,55 @@
+# tests/test_catalog_cache.py
+# Catalogue servi avec ETag : 304 sur If-None-Match, nouvel ETag après une
+# écriture (PUT puzzle, import de pack) sur ce worker.
+import json
+
+QUIZ = {"mission_id": 1, "title": "q", "type": "QUIZ", "payload": {"question": "?"},
+        "solution": {"correct": [0]}, "max_score": 10}
+
+
+def _revalidate(client, url, etag):
+    return client.get(url, headers={"If-None-Match": etag})
+
+
+def test_puzzle_etag_304_and_put(client):
+    pid = client.post("/game/puzzles", json=QUIZ).json()["id"]
+    url = f"/game/puzzles/{pid}"
+    first = client.get(url)
+    etag = first.headers["ETag"]
+
+    r = _revalidate(client, url, etag)
+    assert r.status_code == 304 and r.headers["ETag"] == etag and not r.content
+    assert _revalidate(client, url, f'W/{etag}, "autre"').status_code == 304
+    assert _revalidate(client, url, '"autre"').status_code == 200
+
+    list_url = f"/game/puzzles?mission_id={QUIZ['mission_id']}"
+    list_etag = client.get(list_url).headers["ETag"]
+    client.put(url, json={**QUIZ, "title": "q (modifié)"})
+
+    r = _revalidate(client, url, etag)
+    assert r.status_code == 200 and r.headers["ETag"] != etag
+    assert r.json()["title"] == "q (modifié)"
+    assert _revalidate(client, list_url, list_etag).status_code == 200
+
+
+def test_missions_etag_changes_after_import(client, auth):
+    etag = client.get("/missions/").headers["ETag"]
+    assert _revalidate(client, "/missions/", etag).status_code == 304
+
+    pack = {"missions": [{"key": "etag-test", "title": "Importée", "puzzles": [{**QUIZ, "key": "etag-test-1"}]}]}
+    r = client.post("/missions/import", content=json.dumps(pack), headers=auth())
+    assert r.status_code == 200, r.text
+
+    r = _revalidate(client, "/missions/", etag)
+    assert r.status_code == 200 and r.headers["ETag"] != etag
+    assert "Importée" in [m["title"] for m in r.json()]
+
+
+def test_ttl_bounds_staleness():
+    from Backend.utils.catalog_cache import CatalogCache
+
+    fresh, uncached = CatalogCache(ttl=60), CatalogCache(ttl=0)
+    for cache in (fresh, uncached):
+        cache.put(("missions",), b"[]", cache.generation)
+    assert fresh.get(("missions",)) is not None
+    assert uncached.get(("missions",)) is None
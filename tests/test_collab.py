@@ -0,0 +1,36 @@
+# tests/test_collab.py
+# Socket collab : un message mal formé reçoit une trame "error", sans
+# couper la connexion.
+import pytest
+
+
+def _receive(ws, mtype):
+    while True:
+        msg = ws.receive_json()
+        if msg["type"] == mtype:
+            return msg
+
+
+@pytest.fixture
+def room_socket(client, auth):
+    headers = auth()
+    code = client.post("/collab/rooms", json={}, headers=headers).json()["code"]
+    token = headers["Authorization"].split()[1]
+    with client.websocket_connect(f"/collab/ws/{code}?token={token}") as ws:
+        _receive(ws, "state_snapshot")
+        yield ws
+
+
+@pytest.mark.parametrize("mtype", ["state", "state_patch", "lock", "unlock"])
+@pytest.mark.parametrize("pid", ["abc", None, [], {"a": 1}, True])
+def test_invalid_puzzle_id_gets_error_frame(room_socket, mtype, pid):
+    room_socket.send_json({"type": mtype, "puzzle_id": pid, "state": {}, "ops": []})
+    assert _receive(room_socket, "error")["message"] == "puzzle_id invalide"
+    room_socket.send_json({"type": "ping"})
+    assert _receive(room_socket, "pong")
+
+
+def test_numeric_string_puzzle_id_still_accepted(room_socket):
+    room_socket.send_json({"type": "state", "puzzle_id": "4", "state": {"x": 1}})
+    room_socket.send_json({"type": "lock", "puzzle_id": "4"})
+    assert _receive(room_socket, "lock_acquired")["puzzle_id"] == 4
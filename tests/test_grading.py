@@ -0,0 +1,96 @@
+# tests/test_grading.py
+# grade_many (vectoriel) doit rendre exactement [grade(a) for a in answers],
+# pour chaque type enregistré, réponses mal formées comprises ; le cache des
+# correcteurs suit la révision de la ligne puzzles.
+from types import SimpleNamespace
+
+import pytest
+
+from Backend.game.grading import REGISTRY, GraderCache, compile_grader
+
+SOLUTIONS = {
+    "QUIZ": {"correct": [0, 2]},
+    "IMG_QUIZ": {"correct": ["a"]},
+    "CODE": {"text": "180", "accepted": ["cent quatre-vingts"], "case_insensitive": True},
+    "DND": {"mapping": {"s1": "A", "s2": "B", "s3": ["x"]}},
+    "SCHEMA": {"edges": [["A", "B"], ["C", "B"]]},
+    "IMG_RECON": {"order": [0, 1, 2, 3]},
+}
+
+# réponses justes, partielles, vides et mal formées (valeurs non hachables,
+# types inattendus, clés d'un autre type de puzzle)
+ANSWERS = [
+    {},
+    {"selected": [0, 2]}, {"selected": [2, 0, 0]}, {"selected": [0]}, {"selected": [0, 1, 2]},
+    {"selected": ["a"]}, {"selected": ["a", "b", [1], {"k": 1}]}, {"selected": None}, {"selected": "a"},
+    {"text": "180"}, {"text": " 180 "}, {"text": "Cent Quatre-Vingts"}, {"text": 180}, {"text": None}, {"text": ["180"]},
+    {"targets": {"s1": "A", "s2": "B", "s3": ["x"]}}, {"targets": {"s1": "B"}}, {"targets": {"s1": ["A"], "zz": 1}},
+    {"targets": None},
+    {"edges": [["A", "B"], ["B", "C"]]}, {"edges": [["B", "A"], ["A", "B"]]}, {"edges": []}, {"edges": None},
+    {"order": [0, 1, 2, 3]}, {"order": [1, 0, 2, 3]}, {"order": [0, 1, 2, 3, 4]}, {"order": [0, 1]},
+    {"order": [[0], None, "2", 3.0]}, {"order": None},
+    {"selected": 5}, {"selected": {"a": 1}}, {"targets": ["s1"]}, {"targets": "A"},
+    {"edges": [5, ["A"], ["A", 1], [[1], "B"], "AB"]}, {"order": 5}, {"order": "0123"}, {"order": {"a": 1}},
+]
+
+
+def _puzzle(ptype, solution=None, max_score=10, pid=1, revision=0):
+    return SimpleNamespace(id=pid, type=ptype, solution=solution if solution is not None else SOLUTIONS[ptype],
+                           max_score=max_score, revision=revision)
+
+
+def test_every_registered_type_has_a_case():
+    assert set(REGISTRY) == set(SOLUTIONS)
+
+
+@pytest.mark.parametrize("ptype", sorted(SOLUTIONS))
+@pytest.mark.parametrize("max_score", [10, 7, 0])
+def test_grade_many_matches_grade(ptype, max_score):
+    grader = compile_grader(_puzzle(ptype, max_score=max_score))
+    expected = [grader.grade(a)[:2] for a in ANSWERS]
+    ok, scores = grader.grade_many(ANSWERS)
+    assert list(zip(ok.tolist(), scores.tolist())) == expected
+
+
+@pytest.mark.parametrize("ptype", sorted(SOLUTIONS))
+def test_grade_many_empty_batch_and_solution(ptype):
+    assert [len(x) for x in compile_grader(_puzzle(ptype)).grade_many([])] == [0, 0]
+    grader = compile_grader(_puzzle(ptype, solution="not json"))
+    expected = [grader.grade(a)[:2] for a in ANSWERS]
+    ok, scores = grader.grade_many(ANSWERS)
+    assert list(zip(ok.tolist(), scores.tolist())) == expected
+
+
+def test_cache_follows_revision():
+    cache = GraderCache(maxsize=4)
+    v0 = cache.get(_puzzle("QUIZ", {"correct": [1]}))
+    assert cache.get(_puzzle("QUIZ", {"correct": [1]})) is v0
+    # même id, révision suivante : nouveau correcteur, l'ancienne entrée est évincée
+    v1 = cache.get(_puzzle("QUIZ", {"correct": [2]}, revision=1))
+    assert v1 is not v0 and v1.grade({"selected": [2]})[0]
+    assert cache.stats()["size"] == 1
+
+
+def test_put_puzzle_bumps_revision_and_regrades(client, auth):
+    from Backend.game.grading import graders
+
+    created = client.post("/game/puzzles", json={
+        "mission_id": 1, "title": "q", "type": "QUIZ", "payload": {}, "solution": {"correct": [0]}, "max_score": 10,
+    }).json()
+    pid = created["id"]
+    headers = auth()
+    client.post("/game/session", json={"duration_seconds": 600}, headers=headers)
+
+    def submit():
+        return client.post("/game/submit", json={"puzzle_id": pid, "answer": {"selected": [1]}}, headers=headers).json()
+
+    assert submit()["correct"] is False
+    assert [k for k in graders._data if k[0] == pid] == [(pid, 0)]
+
+    r = client.put(f"/game/puzzles/{pid}", json={
+        "mission_id": 1, "title": "q", "type": "QUIZ", "payload": {}, "solution": {"correct": [1]}, "max_score": 10,
+    })
+    assert r.status_code == 200
+    assert not [k for k in graders._data if k[0] == pid]
+    assert submit()["correct"] is True
+    assert [k for k in graders._data if k[0] == pid] == [(pid, 1)]
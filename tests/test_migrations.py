@@ -0,0 +1,13 @@
+# tests/test_migrations.py
+# Base migrée de zéro (comme au démarrage) : aucune requête chaude en scan complet.
+from Backend import migrations, models  # noqa: F401  (enregistre les tables)
+from Backend.database import Base, EngineProfile, make_engine
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'plans.db'}", EngineProfile())
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    with engine.connect() as conn:
+        assert migrations.current_version(conn) == migrations.MIGRATIONS[-1][0]
+    assert migrations.check_query_plans(engine) == []
@@ -0,0 +1,60 @@
+# tests/test_pagination.py
+# Listes paginées par curseur (limit + after_id, X-Next-After-Id) ; sans limit
+# ni curseur, la liste reste complète comme avant la pagination.
+import pytest
+from sqlalchemy import func, select
+
+from Backend import models
+from Backend.database import SessionLocal
+from Backend.utils.leaderboard import ensure_user_row
+
+
+@pytest.fixture(scope="module")
+def many_users(client):
+    # plus que l'ancienne page par défaut (100)
+    with SessionLocal() as db:
+        users = [models.User(username=f"page{i}", password_hash="x") for i in range(120)]
+        db.add_all(users)
+        db.flush()
+        for u in users:
+            ensure_user_row(db, u.id)
+        db.commit()
+        return db.scalar(select(func.count(models.User.id)))
+
+
+def _walk(client, url, key):
+    seen, after = [], None
+    while True:
+        r = client.get(url, params={"limit": 7, **({"after_id": after} if after else {})})
+        page = r.json()
+        assert len(page) <= 7
+        seen += page
+        after = r.headers.get("X-Next-After-Id")
+        if after is None:
+            return seen
+        assert int(after) == page[-1][key]
+
+
+@pytest.mark.parametrize("url, key", [("/users", "id"), ("/users/leaderboard", "user_id")])
+def test_full_list_without_limit(client, many_users, url, key):
+    r = client.get(url)
+    assert len(r.json()) == many_users
+    assert "X-Next-After-Id" not in r.headers
+    assert _walk(client, url, key) == r.json()
+
+
+def test_catalog_lists_without_limit(client):
+    for i in range(3):
+        client.post("/missions/", json={"title": f"mission {i}"})
+    with SessionLocal() as db:
+        missions = db.scalar(select(func.count(models.Mission.id)))
+    full = client.get("/missions/").json()
+    assert len(full) == missions
+    assert [m["id"] for m in full] == sorted((m["id"] for m in full), reverse=True)
+    assert _walk(client, "/missions/", "id") == full
+
+
+def test_cursor_alone_gets_a_default_page(client, many_users):
+    top = client.get("/users", params={"limit": 1}).json()[0]["id"]
+    r = client.get("/users", params={"after_id": top})
+    assert len(r.json()) == 100 and r.headers["X-Next-After-Id"]
@@ -0,0 +1,56 @@
+# tests/test_progress.py
+# Progression : l'upsert garde le meilleur score, et user_totals (triggers de
+# la migration 3) reste égal au recalcul de leaderboard.verify() après
+# insertions, mises à jour et re-correction.
+import time
+
+from Backend.database import SessionLocal
+from Backend.utils import leaderboard
+
+QUIZ = {"mission_id": 1, "title": "q", "type": "QUIZ", "payload": {}, "max_score": 10}
+
+
+def _drift():
+    with SessionLocal() as db:
+        return leaderboard.verify(db)
+
+
+def _total(client, headers):
+    return client.get("/users/score_total", headers=headers).json()["total_score"]
+
+
+def test_best_score_and_totals_survive_resubmit_and_rescore(client, auth):
+    p1 = client.post("/game/puzzles", json={**QUIZ, "solution": {"correct": [0]}}).json()["id"]
+    p2 = client.post("/game/puzzles", json={**QUIZ, "solution": {"correct": [0, 1]}}).json()["id"]
+    alice, bob = auth(), auth()
+    for h in (alice, bob):
+        client.post("/game/session", json={"duration_seconds": 600}, headers=h)
+
+    def submit(headers, pid, selected):
+        r = client.post("/game/submit", json={"puzzle_id": pid, "answer": {"selected": selected}}, headers=headers)
+        assert r.status_code == 200, r.text
+        return r.json()["earned_score"]
+
+    assert submit(alice, p1, [0]) == 10
+    assert submit(alice, p1, [1]) == 0          # resoumission plus faible : 10 conservé
+    assert _total(client, alice) == 10
+    assert submit(bob, p1, [1]) == 0
+    r = client.post("/game/submit/batch", headers=bob, json=[
+        {"puzzle_id": p2, "answer": {"selected": [0]}},
+        {"puzzle_id": p2, "answer": {"selected": [0, 1]}},
+    ])
+    assert [s["earned_score"] for s in r.json()] == [5, 10]
+    assert _total(client, bob) == 10
+    assert _drift() == []
+
+    # nouvelle solution : la re-correction (tâche de fond) remonte le [1] de chacun
+    r = client.put(f"/game/puzzles/{p1}", json={**QUIZ, "solution": {"correct": [1]}})
+    job_id = r.headers["X-Rescore-Job"]
+    deadline = time.monotonic() + 10
+    while client.get(f"/game/rescore/{job_id}").json()["status"] != "done":
+        assert time.monotonic() < deadline, "re-correction non terminée"
+        time.sleep(0.05)
+
+    assert _total(client, alice) == 10
+    assert _total(client, bob) == 20
+    assert _drift() == []
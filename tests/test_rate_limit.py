@@ -0,0 +1,80 @@
+# tests/test_rate_limit.py
+# Seaux à jetons (horloge simulée) : limites par type, types non listés
+# partageant le seau "*", et réponse rate_limited sans déconnexion.
+import pytest
+
+from Backend.utils import rate_limit
+from Backend.utils.rate_limit import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+def _limiter(**overrides):
+    limiter = RateLimiter()
+    limiter.configure("R", overrides)
+    return limiter
+
+
+def test_per_type_buckets_and_refill(clock):
+    limiter = _limiter(chat={"rate": 2, "burst": 3}, lock={"rate": 1})
+    assert [limiter.allow("R", 1, "chat")[0] for _ in range(4)] == [1, 1, 1, 0]
+    assert limiter.allow("R", 1, "lock")[0] == 1          # seau distinct
+    assert limiter.allow("R", 2, "chat")[0] == 1          # autre joueur
+    clock.now += 0.5                                      # 2/s -> 1 jeton
+    assert limiter.allow("R", 1, "chat", n=3)[0] == 1
+
+
+def test_unlisted_types_share_star_bucket(clock):
+    limiter = _limiter(**{"*": {"rate": 1, "burst": 4}})
+    granted = [limiter.allow("R", 1, f"type{i}")[0] for i in range(10)]
+    assert granted == [1] * 4 + [0] * 6
+    assert list(limiter.buckets[("R", 1)]) == ["*"]
+
+    # une seule réponse rate_limited tant que le seau reste vide
+    limiter = _limiter(**{"*": {"rate": 1, "burst": 1}})
+    replies = [limiter.allow("R", 1, f"x{i}")[1] for i in range(4)]
+    assert replies[0] is None and replies[2:] == [None, None]
+    assert replies[1]["type"] == "rate_limited" and replies[1]["message_type"] == "x1"
+    assert replies[1]["retry_after_ms"] == 1000
+    clock.now += 1
+    assert limiter.allow("R", 1, "x9") == (1, None)
+
+
+def _receive(ws, mtype):
+    while True:
+        msg = ws.receive_json()
+        if msg["type"] == mtype:
+            return msg
+
+
+def test_limited_socket_gets_frame_not_disconnect(client, auth, clock):
+    headers = auth()
+    room = client.post("/collab/rooms", headers=headers,
+                       json={"rate_limits": {"*": {"rate": 1, "burst": 2}}}).json()
+    token = headers["Authorization"].split()[1]
+    with client.websocket_connect(f"/collab/ws/{room['code']}?token={token}") as ws:
+        _receive(ws, "state_snapshot")
+        for i in range(3):
+            ws.send_json({"type": f"inconnu{i}"})
+        assert _receive(ws, "error")["message"] == "type inconnu"
+        assert _receive(ws, "error")["message"] == "type inconnu"
+        limited = _receive(ws, "rate_limited")
+        assert limited["message_type"] == "inconnu2" and limited["dropped"] == 1
+
+        ws.send_json({"type": "ping"})                    # "*" aussi : ignoré, sans réponse
+        clock.now += 1
+        ws.send_json({"type": "ping"})
+        assert _receive(ws, "pong")
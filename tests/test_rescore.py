@@ -0,0 +1,67 @@
+# tests/test_rescore.py
+# Un lot de re-correction est une transaction d'écriture (BEGIN IMMEDIATE) :
+# un écrivain concurrent attend la fin du lot, sans SQLITE_BUSY ni écriture perdue.
+import threading
+
+from sqlalchemy import insert, select
+
+from Backend import models
+from Backend.database import Base, EngineProfile, make_engine
+from Backend.game import rescore
+
+
+def _engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'rescore.db'}", EngineProfile())
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Puzzle.__table__).values(
+            id=1, mission_id=1, title="quiz", type="QUIZ", payload={}, solution={"correct": ["b"]},
+            max_score=10, revision=1))
+        conn.execute(insert(models.PuzzleAnswer.__table__), [
+            {"user_id": uid, "puzzle_id": 1, "answer_hash": f"h{uid}", "answer": {"selected": ["b"]},
+             "score": 0, "completed": 0}
+            for uid in range(1, 11)
+        ])
+        conn.execute(insert(models.PlayerMission.__table__), [
+            {"user_id": uid, "mission_id": 1, "score": 0, "completed": 0} for uid in range(1, 11)
+        ])
+    return engine
+
+
+def test_run_chunk_with_concurrent_writer(tmp_path, monkeypatch):
+    engine = _engine(tmp_path)
+    job_id = rescore.create_job(engine, 1)
+    threads, writer_errors = [], []
+
+    def cancel_job():
+        # autre connexion (route /rescore/{id}/cancel d'un autre worker)
+        try:
+            rescore.set_status(engine, job_id, "cancelled", rescore.ACTIVE)
+        except Exception as e:
+            writer_errors.append(e)
+
+    compile_grader = rescore.compile_grader
+
+    def compile_during_tx(puzzle):
+        # au milieu du premier lot, après la lecture du job : l'écrivain passe
+        if not threads:
+            writer = threading.Thread(target=cancel_job)
+            threads.append(writer)
+            writer.start()
+            writer.join(0.3)
+        return compile_grader(puzzle)
+
+    monkeypatch.setattr(rescore, "compile_grader", compile_during_tx)
+
+    while rescore.run_chunk(engine, job_id, chunk=4):
+        for t in threads:
+            t.join()  # la pause entre deux lots laisse passer l'écrivain
+
+    # l'annulation attend la fin du lot (pas de SQLITE_BUSY) et n'est pas écrasée
+    assert not writer_errors
+    job = rescore.get_job(engine, job_id)
+    assert job["status"] == "cancelled"
+    assert job["processed"] == 4 and job["changed"] == 4
+    with engine.connect() as conn:
+        scores = conn.execute(select(models.PlayerMission.score).order_by(models.PlayerMission.user_id)).scalars().all()
+    assert scores == [10] * 4 + [0] * 6
@@ -0,0 +1,55 @@
+# tests/test_room_state.py
+# Deltas d'état des salles : une opération mal formée lève PatchError (état
+# inchangé) et le client reçoit un state_resync au lieu d'être déconnecté.
+import pytest
+
+from Backend.utils.room_state import PatchError, apply_patch
+
+
+def test_apply_patch():
+    doc = {"cards": ["a"], "pos": {"a": 1}}
+    out = apply_patch(doc, [
+        {"op": "add", "path": "/cards/-", "value": "b"},
+        {"op": "replace", "path": "/pos/a", "value": 2},
+        {"op": "remove", "path": "/pos/a"},
+    ])
+    assert out == {"cards": ["a", "b"], "pos": {}}
+    assert doc == {"cards": ["a"], "pos": {"a": 1}}
+
+
+@pytest.mark.parametrize("ops", [
+    ["x"],
+    {"op": "add", "path": "/a", "value": 1},
+    "add",
+    [None],
+    [{"op": "add", "path": 3, "value": 1}],
+    [{"op": 1, "path": "/a"}],
+    [{"path": "/a", "value": 1}],
+    [{"op": "add", "path": "/a/b/c", "value": 1}],
+    [{"op": "move", "path": "/a"}],
+])
+def test_malformed_ops(ops):
+    with pytest.raises(PatchError):
+        apply_patch({"a": 1}, ops)
+
+
+def _receive(ws, mtype):
+    while True:
+        msg = ws.receive_json()
+        if msg["type"] == mtype:
+            return msg
+
+
+def test_malformed_patch_resyncs_socket(client, auth):
+    headers = auth()
+    code = client.post("/collab/rooms", json={}, headers=headers).json()["code"]
+    token = headers["Authorization"].split()[1]
+    with client.websocket_connect(f"/collab/ws/{code}?token={token}") as ws:
+        _receive(ws, "state_snapshot")
+        ws.send_json({"type": "state", "puzzle_id": 7, "state": {"a": 1}})
+        for ops in (["x"], {"op": "add"}, [{"op": "add", "path": 3}]):
+            ws.send_json({"type": "state_patch", "puzzle_id": 7, "ops": ops})
+            resync = _receive(ws, "state_resync")
+            assert resync["version"] == 1 and resync["state"] == {"a": 1}
+        ws.send_json({"type": "ping"})
+        assert _receive(ws, "pong")
@@ -0,0 +1,74 @@
+# tests/test_sessions.py
+# Session de jeu : le cache ne garde jamais une session au-delà de son
+# expires_epoch (retour à la base), et _latest_session départage deux
+# sessions de même échéance par id.
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from Backend import models
+from Backend.database import Base, EngineProfile, make_async_engine, make_engine
+from Backend.routes import gameplay
+from Backend.utils.session_cache import ActiveSessionCache, CachedSession
+
+USER = 4242
+
+
+def _session(sid, expires_epoch):
+    return models.GameSession(id=sid, user_id=USER, started_at=datetime(2025, 1, 1),
+                              expires_at="2025-01-01T00:00:00Z", expires_epoch=expires_epoch)
+
+
+@pytest.fixture
+def db_factory(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'sessions.db'}"
+    Base.metadata.create_all(bind=make_engine(url, EngineProfile()))
+    monkeypatch.setattr(gameplay, "active_sessions", ActiveSessionCache())
+    engine = make_async_engine(url, EngineProfile())
+
+    async def run(rows, fn):
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            db.add_all(rows)
+            await db.commit()
+            try:
+                return await fn(db)
+            finally:
+                await engine.dispose()
+    return run
+
+
+def test_cached_session_dies_at_expiry():
+    cache = ActiveSessionCache()
+    cache.put(CachedSession(1, USER, datetime(2025, 1, 1), "", time.time() + 0.05))
+    assert cache.get(USER) is not None
+    time.sleep(0.1)
+    assert cache.get(USER) is None and cache.stats()["size"] == 0
+
+
+def test_latest_session_tie_break_by_id(db_factory):
+    expiry = time.time() + 600
+    rows = [_session(3, expiry), _session(5, expiry), _session(4, expiry), _session(1, expiry - 1)]
+    s = asyncio.run(db_factory(rows, lambda db: gameplay._latest_session(db, USER, active_only=True)))
+    assert s.id == 5
+    assert gameplay.active_sessions.get(USER).id == 5
+
+
+def test_expired_cache_falls_back_to_database(db_factory):
+    async def check(db):
+        # session en cache expirée, remplacée en base (par un autre worker)
+        gameplay.active_sessions.put(CachedSession(1, USER, datetime(2025, 1, 1), "", time.time() + 0.05))
+        assert (await gameplay._require_active_session(db, USER)).id == 1
+        await asyncio.sleep(0.1)
+        assert (await gameplay._require_active_session(db, USER)).id == 2
+        gameplay.active_sessions.evict(USER)
+        await db.delete(await db.get(models.GameSession, 2))
+        await db.commit()
+        with pytest.raises(HTTPException) as e:
+            await gameplay._require_active_session(db, USER)
+        assert e.value.status_code == 403
+
+    asyncio.run(db_factory([_session(1, time.time() - 10), _session(2, time.time() + 600)], check))
@@ -0,0 +1,50 @@
+# tests/test_token_cache.py
+# Révocations partagées : un worker relit celles des autres par curseur d'id,
+# y compris après une purge des plus récentes (ids jamais réattribués).
+import time
+
+from sqlalchemy import text
+
+from Backend import migrations
+from Backend.database import Base, EngineProfile, make_engine
+from Backend.utils.token_cache import RevocationSync, VerifiedTokenCache, store_revocation
+
+
+def _engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'tokens.db'}", EngineProfile())
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    return engine
+
+
+def test_revocation_after_purge_reaches_other_workers(tmp_path):
+    engine = _engine(tmp_path)
+    here, other = RevocationSync(engine, VerifiedTokenCache()), RevocationSync(engine, VerifiedTokenCache())
+
+    store_revocation(engine, b"\x01" * 16, time.time() + 0.2)
+    assert other.sync() == 1
+    time.sleep(0.3)
+    here.purge()  # supprime la ligne la plus récente (expirée)
+
+    store_revocation(engine, b"\x02" * 16, time.time() + 60)
+    assert other.sync() == 1
+    assert other.cache.is_revoked(b"\x02" * 16)
+
+
+def test_migration_rebuilds_table_without_autoincrement(tmp_path):
+    engine = _engine(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE revoked_tokens"))
+        conn.execute(text("CREATE TABLE revoked_tokens (id INTEGER NOT NULL PRIMARY KEY, "
+                          "digest VARCHAR NOT NULL, exp FLOAT NOT NULL)"))
+        conn.execute(text("INSERT INTO revoked_tokens (id, digest, exp) VALUES (3, 'ab', 1e12)"))
+        conn.execute(text("PRAGMA user_version = 6"))
+    assert migrations.upgrade(engine) == [7]
+
+    with engine.begin() as conn:
+        sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'revoked_tokens'")).scalar()
+        assert "AUTOINCREMENT" in sql
+        conn.execute(text("DELETE FROM revoked_tokens"))
+        conn.execute(text("INSERT INTO revoked_tokens (digest, exp) VALUES ('cd', 1e12)"))
+        assert conn.execute(text("SELECT id FROM revoked_tokens")).scalar() == 4
+    assert migrations.check_query_plans(engine) == []